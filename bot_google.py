@@ -1,46 +1,51 @@
 
 """
 Telegram бот для перевода с русского на белорусский через Google Translate API
-Совместим с python-telegram-bot==13.15
+Совместим с python-telegram-bot>=20 (asyncio)
 """
 
 import os
 import sys
-import threading
+import asyncio
+import functools
+import importlib
+import importlib.util
+import inspect
+import subprocess
 import time
 import re
 import sqlite3
 import argparse
-from datetime import datetime
-from typing import Optional, Dict, List
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, AsyncIterator, Awaitable, Callable
 
 from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
-from telegram.ext import Updater, CommandHandler, MessageHandler, InlineQueryHandler, Filters, CallbackContext
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import Application, CommandHandler, MessageHandler, InlineQueryHandler, filters, ContextTypes
 from uuid import uuid4
 
-# Google Translate API
-try:
-    from googletrans import Translator
-    GOOGLE_LIBRARY_AVAILABLE = True
-except ImportError:
-    GOOGLE_LIBRARY_AVAILABLE = False
-    print("❌ googletrans не установлен. Установите: pip install googletrans==4.0.0rc1")
-
-# Gemini API
-try:
-    import google.generativeai as genai
-    GEMINI_API_AVAILABLE = True
-except ImportError:
-    GEMINI_API_AVAILABLE = False
-    print("❌ google-generativeai не установлен. Установите: pip install google-generativeai")
-
-# DeepSeek API
-try:
-    import openai
-    DEEPSEEK_API_AVAILABLE = True
-except ImportError:
-    DEEPSEEK_API_AVAILABLE = False
-    print("❌ openai не установлен. Установите: pip install openai")
+from phrase_matcher import PhraseMatcher
+from compact_dict import open_fallback_dictionary
+from fuzzy_index import SymSpellIndex, open_fuzzy_index
+from prefix_index import PrefixIndex
+from mention_matcher import mention_matcher
+from send_queue import SendQueue
+from client_pool import ClientPool, DEFAULT_POOL_SIZE
+from profiler import parse_profile_args, running_profile, send_profile
+from translation_result import TranslationResult, TranslationStatus, CacheStatus, timed
+from negative_cache import NegativeCache
+from state_snapshot import (
+    ShutdownDrain, SnapshotApplication, add_snapshot_arguments, snapshot_path,
+    load_snapshot, save_snapshot, DEFAULT_SHUTDOWN_DEADLINE,
+)
+from webhook_server import add_webhook_arguments, read_env_setting, run_webhook
+from worker_pool import add_worker_arguments, run_supervisor
+from rate_limit import (
+    AdmissionController, add_rate_limit_arguments,
+    COALESCE, DROP, DROP_NOTIFY, THROTTLED_NOTICE,
+)
 
 ENV_PATH = ".env"
 
@@ -140,175 +145,516 @@ def load_admins_from_env() -> List[int]:
     print("📋 Админы не настроены. Добавьте ADMIN_USER_IDS в .env файл")
     return admins
 
+# Реестр бэкендов перевода. SDK бэкенда импортируется только тогда,
+# когда бэкенд выбран, поэтому неиспользуемые SDK не замедляют запуск
+# и не занимают память.
+TRANSLATOR_BACKENDS: Dict[str, dict] = {}
+DEFAULT_BACKEND = "googletrans"
+
+def register_backend(name: str, module: str, pip_name: str, title: str, emoji: str, api_key_loader=None,
+                     cost: float = 1.0):
+    """Регистрирует класс переводчика под именем name; cost ужесточает лимиты запросов для платных API"""
+    def decorator(cls):
+        TRANSLATOR_BACKENDS[name] = {
+            'class': cls,
+            'module': module,
+            'pip_name': pip_name,
+            'title': title,
+            'emoji': emoji,
+            'api_key_loader': api_key_loader,
+            'cost': cost,
+        }
+        return cls
+    return decorator
+
+def is_backend_available(name: str) -> bool:
+    """Проверяет, установлен ли SDK бэкенда, не импортируя его"""
+    try:
+        return importlib.util.find_spec(TRANSLATOR_BACKENDS[name]['module']) is not None
+    except ImportError:
+        return False
+
+def load_backend_module(name: str):
+    """Импортирует SDK бэкенда при первом обращении"""
+    backend = TRANSLATOR_BACKENDS[name]
+    try:
+        return importlib.import_module(backend['module'])
+    except ImportError:
+        raise ImportError(f"{backend['pip_name']} не установлен")
+
+def get_rss_kb() -> Optional[int]:
+    """Возвращает текущий объем памяти процесса (RSS) в КБ"""
+    # Linux: текущий RSS из /proc (ru_maxrss — пиковое значение и наследуется от родителя)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # На macOS ru_maxrss в байтах, на Linux — в килобайтах
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+# Скрипт для замера импорта в чистом интерпретаторе. Сам бот не импортируется,
+# чтобы telegram не попал в базовую линию, поэтому get_rss_kb передается исходником.
+PROFILE_IMPORT_SCRIPT = """
+import os, sys, time
+from typing import Optional
+{rss_source}
+rss_before = get_rss_kb() or 0
+start = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+print(time.perf_counter() - start, (get_rss_kb() or 0) - rss_before)
+"""
+
+def measure_import(modules: List[str]) -> Optional[tuple]:
+    """Импортирует модули в чистом интерпретаторе и возвращает (секунды, КБ)"""
+    script = PROFILE_IMPORT_SCRIPT.format(rss_source=inspect.getsource(get_rss_kb), modules=modules)
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    seconds, rss_kb = result.stdout.split()[-2:]
+    return float(seconds), int(rss_kb)
+
+def profile_startup(backend_name: str):
+    """Печатает время импорта и прирост памяти для каждого модуля запуска
+
+    Каждый модуль импортируется в отдельном чистом процессе, поэтому
+    цифры соответствуют холодному старту.
+    """
+    rows = [("telegram + telegram.ext", ["telegram", "telegram.ext"])]
+    for name, backend in TRANSLATOR_BACKENDS.items():
+        marker = " ← выбран" if name == backend_name else ""
+        rows.append((f"{backend['module']} ({name}){marker}", [backend['module']]))
+    selected = TRANSLATOR_BACKENDS[backend_name]['module']
+    rows.append((f"Итого для запуска с {backend_name}", ["telegram", "telegram.ext", selected]))
+    
+    print(f"⏱️ Профиль запуска (бэкенд: {backend_name})\n")
+    print(f"{'Модуль':<50} {'Время, мс':>10} {'Память, МБ':>11}")
+    for title, modules in rows:
+        measurement = measure_import(modules)
+        if measurement is None:
+            print(f"{title:<50} {'не установлен':>22}")
+            continue
+        seconds, rss_kb = measurement
+        print(f"{title:<50} {seconds * 1000:>10.1f} {rss_kb / 1024:>11.1f}")
+    
+    rss_kb = get_rss_kb()
+    if rss_kb is not None:
+        print(f"\n📦 Память текущего процесса (без SDK бэкендов): {rss_kb / 1024:.1f} МБ")
+
+# Префиксы, которые LLM иногда добавляет перед переводом
+LLM_RESPONSE_PREFIXES = ("Перевод:", "Белорусский перевод:", "Беларускі пераклад:")
+
+def build_translation_prompt(text: str) -> str:
+    """Формирует промпт для перевода через LLM"""
+    # Пачка текстов: номера «[1]» нужны, чтобы разделить перевод обратно по текстам
+    segments = " Сохрани номера в квадратных скобках в начале строк и разбиение на строки." if SEGMENT_PATTERN.search(text) else ""
+    return f"""Переведи следующий текст с русского языка на белорусский язык. Отвечай ТОЛЬКО переводом, без дополнительных объяснений, без кавычек, без префиксов.{segments}
+
+Текст для перевода: {text}
+
+Перевод:"""
+
+def clean_llm_translation(translation: str, partial: bool = False) -> str:
+    """Очищает ответ LLM от префиксов и кавычек
+
+    partial=True используется для незавершенного потокового ответа:
+    закрывающей кавычки еще может не быть, поэтому снимаем только открывающую.
+    """
+    translation = translation.strip()
+    
+    # Очищаем ответ от возможных префиксов
+    for prefix in LLM_RESPONSE_PREFIXES:
+        if translation.startswith(prefix):
+            translation = translation[len(prefix):].strip()
+    
+    # Убираем кавычки если есть
+    if partial:
+        return translation.lstrip("\"'")
+    if translation.startswith('"') and translation.endswith('"'):
+        translation = translation[1:-1]
+    if translation.startswith("'") and translation.endswith("'"):
+        translation = translation[1:-1]
+    return translation
+
+CYRILLIC_PATTERN = re.compile(r"[а-яёА-ЯЁ]")
+
+def is_untranslated(text: str, translation: str) -> bool:
+    """Переводчик вернул текст без русских букв (эмодзи, латиница, числа) как есть — переводить нечего"""
+    return not CYRILLIC_PATTERN.search(text) and translation.strip().lower() == text.strip().lower()
+
+def is_partial_llm_prefix(raw_text: str) -> bool:
+    """Проверяет, что начало потокового ответа пока может оказаться служебным префиксом"""
+    raw_text = raw_text.lstrip()
+    return any(prefix.startswith(raw_text) for prefix in LLM_RESPONSE_PREFIXES)
+
+# Тексты пачки склеиваются в один запрос с номерами «[1] текст» в начале строки.
+# По номерам перевод делится обратно; если переводчик объединил, разбил или
+# переставил тексты, номера или число строк не совпадут
+SEGMENT_MARK = "[{}] "
+SEGMENT_PATTERN = re.compile(r"^[ \t]*\[\s*(\d+)\s*\][ \t]*", re.MULTILINE)
+
+def join_segments(texts: List[str]) -> str:
+    """Склеивает тексты в один запрос, помечая начало каждого номером"""
+    return "\n".join(SEGMENT_MARK.format(i) + text for i, text in enumerate(texts, 1))
+
+def split_segments(texts: List[str], batch: TranslationResult) -> List[Optional[TranslationResult]]:
+    """Делит перевод склеенных текстов обратно по номерам
+
+    Перевод текста принимается, только если его номер встречается один раз,
+    соседние номера — предыдущий и следующий по порядку (для первого — начало
+    ответа без лишнего текста, для последнего — конец полного ответа) и число
+    строк не изменилось. Для остальных текстов возвращается None.
+    """
+    if not batch.found:
+        return [None] * len(texts)
+    parts = SEGMENT_PATTERN.split(batch.text)
+    numbers = [int(number) for number in parts[1::2]]
+    segments = [part.strip() for part in parts[2::2]]
+    # Обрезанный по длине ответ мог оборвать и последний текст
+    complete = batch.status is TranslationStatus.OK
+    results: List[Optional[TranslationResult]] = [None] * len(texts)
+    for k, (number, segment) in enumerate(zip(numbers, segments)):
+        if not 1 <= number <= len(texts) or numbers.count(number) != 1:
+            continue
+        before = numbers[k - 1] == number - 1 if k else number == 1 and not parts[0].strip()
+        after = numbers[k + 1] == number + 1 if k + 1 < len(numbers) else number == len(texts) and complete
+        text = texts[number - 1]
+        if not (before and after) or segment.count("\n") != text.count("\n"):
+            continue
+        # Каждый текст ждал весь запрос: время и попытки у всех общие
+        if segment and not is_untranslated(text, segment):
+            results[number - 1] = TranslationResult(segment, TranslationStatus.OK, batch.backend, batch.cache,
+                                                    batch.attempts, dict(batch.timings))
+        else:
+            results[number - 1] = TranslationResult(f"Пераклад не знойдзены для: {text}", TranslationStatus.NOT_FOUND,
+                                                    batch.backend, batch.cache, batch.attempts, dict(batch.timings))
+    return results
+
+async def translate_segments(translate: Callable[[str], Awaitable[TranslationResult]],
+                             texts: List[str]) -> List[TranslationResult]:
+    """Переводит тексты одним запросом с номерами
+
+    Тексты, перевод которых не разделился по номерам, переводятся еще одним
+    общим запросом (не по отдельности: всплеск сообщений стоит не больше двух
+    запросов). Что не разделилось и во второй раз, возвращается как ERROR.
+    """
+    results = split_segments(texts, await translate(join_segments(texts)))
+    missing = [i for i, result in enumerate(results) if result is None]
+    if not missing:
+        print(f"📦 {len(texts)} текстов переведены одним запросом")
+        return results
+    
+    print(f"⚠️ {len(missing)} из {len(texts)} текстов не разделились по номерам, перевожу их еще одним запросом")
+    retry_texts = [texts[i] for i in missing]
+    if len(retry_texts) == 1:
+        retried = [await translate(retry_texts[0])]
+    else:
+        retry = await translate(join_segments(retry_texts))
+        retried = split_segments(retry_texts, retry)
+        error = retry.error or "пакетный перевод не разделился по номерам"
+        retried = [
+            result or TranslationResult(f"Памылка перакладу: {error}", TranslationStatus.ERROR, retry.backend,
+                                        retry.cache, retry.attempts, dict(retry.timings), error)
+            for result in retried
+        ]
+    for i, result in zip(missing, retried):
+        results[i] = result
+    return results
+
+def close_googletrans_client(client):
+    """Закрывает HTTP-клиент googletrans (в версиях 4.x это httpx.AsyncClient)"""
+    http_client = getattr(client, "client", None)
+    if http_client is not None and hasattr(http_client, "aclose"):
+        return http_client.aclose()
+
 # Переводчик через Google Translate Library (googletrans)
+@register_backend("googletrans", module="googletrans", pip_name="googletrans>=4.0.2",
+                  title="Google Translate Library", emoji="📚")
 class GoogleLibraryTranslator:
-    def __init__(self):
-        if not GOOGLE_LIBRARY_AVAILABLE:
-            raise ImportError("googletrans не установлен")
+    def __init__(self, pool_size: Optional[int] = None):
+        googletrans = load_backend_module("googletrans")
         
-        self.translator = Translator()
-        print("✅ Google Translate Library переводчик инициализирован")
+        # У клиента googletrans одно соединение и свое состояние (токены, cookies):
+        # одновременные переводы берут разные клиенты из пула
+        self.pool = ClientPool(googletrans.Translator, pool_size or googletrans_pool_size,
+                               close=close_googletrans_client)
+        print(f"✅ Google Translate Library переводчик инициализирован (пул до {self.pool.size} клиентов)")
 
-    def translate_ru_to_be(self, text: str, max_len: int = 512) -> str:
+    async def close(self):
+        await self.pool.close()
+
+    async def translate_ru_to_be(self, text: str, max_len: int = 512) -> TranslationResult:
         text = text.strip()
+        timings = {}
         if not text:
-            return ""
+            return TranslationResult("", TranslationStatus.NOT_FOUND, "googletrans")
         
         try:
             print(f"🔍 Перевожу через Google Library: '{text}'")
             
-            # Google Translate Library
-            result = self.translator.translate(text, src='ru', dest='be')
+            # Google Translate Library: свободный клиент из пула
+            started = time.perf_counter()
+            async with self.pool.client() as client:
+                timings["queue"] = time.perf_counter() - started
+                with timed(timings, "network"):
+                    result = await client.translate(text, src='ru', dest='be')
             
-            if result and result.text:
+            if result and result.text and not is_untranslated(text, result.text):
                 translation = result.text.strip()
                 print(f"✅ Google Library перевод: '{text}' → '{translation}'")
-                return translation
+                return TranslationResult(translation, TranslationStatus.OK, "googletrans", attempts=1, timings=timings)
             else:
                 print(f"❌ Google Library не вернул перевод для: '{text}'")
-                return f"Пераклад не знойдзены для: {text}"
+                return TranslationResult(f"Пераклад не знойдзены для: {text}", TranslationStatus.NOT_FOUND,
+                                         "googletrans", attempts=1, timings=timings)
                 
         except Exception as e:
             print(f"❌ Ошибка Google Library: {e}")
-            return f"Памылка перакладу: {e}"
+            return TranslationResult(f"Памылка перакладу: {e}", TranslationStatus.ERROR, "googletrans",
+                                     attempts=1, timings=timings, error=str(e))
+
+    async def translate_many(self, texts: List[str]) -> List[TranslationResult]:
+        """Переводит список текстов одним запросом, склеив их с номерами (см. translate_segments)"""
+        return await translate_segments(self.translate_ru_to_be, [text.strip() for text in texts])
 
 # Переводчик через DeepSeek API
+@register_backend("deepseek", module="openai", pip_name="openai",
+                  title="DeepSeek API", emoji="🧠", api_key_loader=load_deepseek_api_key, cost=3.0)
 class DeepSeekAPITranslator:
     def __init__(self, api_key: str):
-        if not DEEPSEEK_API_AVAILABLE:
-            raise ImportError("openai не установлен")
+        openai = load_backend_module("deepseek")
         
-        # Настраиваем DeepSeek API
-        self.client = openai.OpenAI(
+        # Настраиваем DeepSeek API. Один асинхронный клиент на процесс:
+        # соединения переиспользуются из его пула, потоки на запрос не нужны
+        self.client = openai.AsyncOpenAI(
             api_key=api_key,
             base_url="https://api.deepseek.com"
         )
         print("✅ DeepSeek API переводчик инициализирован")
 
-    def translate_ru_to_be(self, text: str, max_len: int = 512) -> str:
+    async def translate_ru_to_be(self, text: str, max_len: int = 512) -> TranslationResult:
         text = text.strip()
+        timings = {}
         if not text:
-            return ""
+            return TranslationResult("", TranslationStatus.NOT_FOUND, "deepseek")
         
         try:
             print(f"🔍 Перевожу через DeepSeek API: '{text}'")
             
             # Формируем промпт для перевода
-            prompt = f"""Переведи следующий текст с русского языка на белорусский язык. Отвечай ТОЛЬКО переводом, без дополнительных объяснений, без кавычек, без префиксов.
-
-Текст для перевода: {text}
-
-Перевод:"""
+            prompt = build_translation_prompt(text)
             
             # Отправляем запрос к DeepSeek
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": "Ты - эксперт по переводу с русского на белорусский язык."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=max_len,
-                temperature=0.1
-            )
+            with timed(timings, "network"):
+                response = await self.client.chat.completions.create(
+                    model="deepseek-chat",
+                    messages=[
+                        {"role": "system", "content": "Ты - эксперт по переводу с русского на белорусский язык."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=max_len,
+                    temperature=0.1
+                )
             
             if response and response.choices and response.choices[0].message.content:
-                translation = response.choices[0].message.content.strip()
-                
-                # Очищаем ответ от возможных префиксов
-                if translation.startswith("Перевод:"):
-                    translation = translation[8:].strip()
-                if translation.startswith("Белорусский перевод:"):
-                    translation = translation[20:].strip()
-                if translation.startswith("Беларускі пераклад:"):
-                    translation = translation[19:].strip()
-                
-                # Убираем кавычки если есть
-                if translation.startswith('"') and translation.endswith('"'):
-                    translation = translation[1:-1]
-                if translation.startswith("'") and translation.endswith("'"):
-                    translation = translation[1:-1]
+                with timed(timings, "parse"):
+                    translation = clean_llm_translation(response.choices[0].message.content)
                 
+                if is_untranslated(text, translation):
+                    print(f"❌ DeepSeek API вернул текст без перевода: '{text}'")
+                    return TranslationResult(f"Пераклад не знойдзены для: {text}", TranslationStatus.NOT_FOUND,
+                                             "deepseek", attempts=1, timings=timings)
+                if response.choices[0].finish_reason == "length":
+                    # Ответ обрезан по max_tokens: часть перевода потеряна
+                    print(f"⚠️ DeepSeek API обрезал перевод по длине ответа: '{text[:50]}...'")
+                    return TranslationResult(translation, TranslationStatus.PARTIAL, "deepseek", attempts=1,
+                                             timings=timings, error="ответ обрезан по max_tokens")
                 print(f"✅ DeepSeek API перевод: '{text}' → '{translation}'")
-                return translation
+                return TranslationResult(translation, TranslationStatus.OK, "deepseek", attempts=1, timings=timings)
             else:
                 print(f"❌ DeepSeek API не вернул перевод для: '{text}'")
-                return f"Пераклад не знойдзены для: {text}"
+                return TranslationResult(f"Пераклад не знойдзены для: {text}", TranslationStatus.NOT_FOUND,
+                                         "deepseek", attempts=1, timings=timings)
                 
         except Exception as e:
             print(f"❌ Ошибка DeepSeek API: {e}")
-            return f"Памылка перакладу: {e}"
+            return TranslationResult(f"Памылка перакладу: {e}", TranslationStatus.ERROR, "deepseek",
+                                     attempts=1, timings=timings, error=str(e))
+
+    async def translate_ru_to_be_stream(self, text: str, max_len: int = 512) -> AsyncIterator[str]:
+        """Переводит текст потоково: отдает накопленный перевод по мере прихода токенов"""
+        text = text.strip()
+        if not text:
+            return
+        
+        print(f"🔍 Потоково перевожу через DeepSeek API: '{text}'")
+        stream = await self.client.chat.completions.create(
+            model="deepseek-chat",
+            messages=[
+                {"role": "system", "content": "Ты - эксперт по переводу с русского на белорусский язык."},
+                {"role": "user", "content": build_translation_prompt(text)}
+            ],
+            max_tokens=max_len,
+            temperature=0.1,
+            stream=True
+        )
+        
+        raw_text = ""
+        truncated = False
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            if chunk.choices[0].finish_reason == "length":
+                truncated = True
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            raw_text += delta
+            # Не показываем пользователю недописанный служебный префикс
+            if is_partial_llm_prefix(raw_text):
+                continue
+            yield clean_llm_translation(raw_text, partial=True)
+        
+        if raw_text:
+            translation = clean_llm_translation(raw_text)
+            print(f"✅ DeepSeek API потоковый перевод: '{text}' → '{translation}'")
+            yield translation
+        if truncated:
+            # Ответ обрезан по max_tokens: вызывающий покажет перевод как неполный
+            raise RuntimeError("ответ обрезан по max_tokens")
+
+def gemini_truncated(response) -> bool:
+    """Ответ Gemini закончился из-за лимита длины (finish_reason MAX_TOKENS)"""
+    candidates = getattr(response, "candidates", None) or []
+    finish_reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+    return getattr(finish_reason, "name", finish_reason) == "MAX_TOKENS"
 
 # Переводчик через Gemini API
+@register_backend("gemini", module="google.generativeai", pip_name="google-generativeai",
+                  title="Gemini API", emoji="🤖", api_key_loader=load_gemini_api_key, cost=3.0)
 class GeminiAPITranslator:
+    # Модели в порядке предпочтения
+    MODEL_NAMES = ['gemini-2.0-flash', 'gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
+
     def __init__(self, api_key: str):
-        if not GEMINI_API_AVAILABLE:
-            raise ImportError("google-generativeai не установлен")
+        self.genai = load_backend_module("gemini")
         
-        # Настраиваем Gemini API
-        genai.configure(api_key=api_key)
+        # Настраиваем Gemini API (асинхронный клиент работает через общий gRPC-канал)
+        self.genai.configure(api_key=api_key)
         
-        # Пробуем разные модели в порядке предпочтения
-        model_names = ['gemini-2.0-flash', 'gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
         self.model = None
-        
-        for model_name in model_names:
+        self.model_name = None
+
+    def use_model(self, model_name: str):
+        """Выбирает модель без пробного запроса (модель уже проверена ранее)"""
+        self.model = self.genai.GenerativeModel(model_name)
+        self.model_name = model_name
+        print(f"✅ Gemini API переводчик инициализирован с сохраненной моделью: {model_name}")
+
+    async def select_model(self) -> str:
+        """Перебирает модели пробными запросами и выбирает первую доступную"""
+        for model_name in self.MODEL_NAMES:
             try:
-                self.model = genai.GenerativeModel(model_name)
+                model = self.genai.GenerativeModel(model_name)
                 # Тестируем модель простым запросом
-                test_response = self.model.generate_content("тест")
+                await model.generate_content_async("тест")
+                self.model = model
+                self.model_name = model_name
                 print(f"✅ Gemini API переводчик инициализирован с моделью: {model_name}")
-                break
+                return model_name
             except Exception as e:
                 print(f"⚠️ Модель {model_name} недоступна: {e}")
                 continue
         
-        if self.model is None:
-            raise Exception("Не удалось инициализировать ни одну модель Gemini")
+        raise Exception("Не удалось инициализировать ни одну модель Gemini")
 
-    def translate_ru_to_be(self, text: str, max_len: int = 512) -> str:
+    async def health_check(self) -> bool:
+        """Проверяет текущую модель и при ошибке выбирает другую"""
+        try:
+            await self.model.generate_content_async("тест")
+            return True
+        except Exception as e:
+            print(f"⚠️ Модель {self.model_name} не отвечает: {e}")
+        
+        try:
+            await self.select_model()
+            return True
+        except Exception as e:
+            print(f"❌ {e}")
+            return False
+
+    async def translate_ru_to_be(self, text: str, max_len: int = 512) -> TranslationResult:
         text = text.strip()
+        timings = {}
         if not text:
-            return ""
+            return TranslationResult("", TranslationStatus.NOT_FOUND, "gemini")
         
         try:
             print(f"🔍 Перевожу через Gemini API: '{text}'")
             
             # Формируем промпт для перевода
-            prompt = f"""Переведи следующий текст с русского языка на белорусский язык. Отвечай ТОЛЬКО переводом, без дополнительных объяснений, без кавычек, без префиксов.
-
-Текст для перевода: {text}
-
-Перевод:"""
+            prompt = build_translation_prompt(text)
             
             # Отправляем запрос к Gemini
-            response = self.model.generate_content(prompt)
+            with timed(timings, "network"):
+                response = await self.model.generate_content_async(prompt)
             
             if response and response.text:
-                translation = response.text.strip()
-                
-                # Очищаем ответ от возможных префиксов
-                if translation.startswith("Перевод:"):
-                    translation = translation[8:].strip()
-                if translation.startswith("Белорусский перевод:"):
-                    translation = translation[20:].strip()
-                if translation.startswith("Беларускі пераклад:"):
-                    translation = translation[19:].strip()
-                
-                # Убираем кавычки если есть
-                if translation.startswith('"') and translation.endswith('"'):
-                    translation = translation[1:-1]
-                if translation.startswith("'") and translation.endswith("'"):
-                    translation = translation[1:-1]
+                with timed(timings, "parse"):
+                    translation = clean_llm_translation(response.text)
                 
+                if is_untranslated(text, translation):
+                    print(f"❌ Gemini API вернул текст без перевода: '{text}'")
+                    return TranslationResult(f"Пераклад не знойдзены для: {text}", TranslationStatus.NOT_FOUND,
+                                             "gemini", attempts=1, timings=timings)
+                if gemini_truncated(response):
+                    print(f"⚠️ Gemini API обрезал перевод по длине ответа: '{text[:50]}...'")
+                    return TranslationResult(translation, TranslationStatus.PARTIAL, "gemini", attempts=1,
+                                             timings=timings, error="ответ обрезан по max_output_tokens")
                 print(f"✅ Gemini API перевод: '{text}' → '{translation}'")
-                return translation
+                return TranslationResult(translation, TranslationStatus.OK, "gemini", attempts=1, timings=timings)
             else:
                 print(f"❌ Gemini API не вернул перевод для: '{text}'")
-                return f"Пераклад не знойдзены для: {text}"
+                return TranslationResult(f"Пераклад не знойдзены для: {text}", TranslationStatus.NOT_FOUND,
+                                         "gemini", attempts=1, timings=timings)
                 
         except Exception as e:
             print(f"❌ Ошибка Gemini API: {e}")
-            return f"Памылка перакладу: {e}"
+            return TranslationResult(f"Памылка перакладу: {e}", TranslationStatus.ERROR, "gemini",
+                                     attempts=1, timings=timings, error=str(e))
+
+    async def translate_ru_to_be_stream(self, text: str, max_len: int = 512) -> AsyncIterator[str]:
+        """Переводит текст потоково: отдает накопленный перевод по мере генерации"""
+        text = text.strip()
+        if not text:
+            return
+        
+        print(f"🔍 Потоково перевожу через Gemini API: '{text}'")
+        response = await self.model.generate_content_async(build_translation_prompt(text), stream=True)
+        
+        raw_text = ""
+        last_chunk = None
+        async for chunk in response:
+            last_chunk = chunk
+            if not chunk.text:
+                continue
+            raw_text += chunk.text
+            if is_partial_llm_prefix(raw_text):
+                continue
+            yield clean_llm_translation(raw_text, partial=True)
+        
+        if raw_text:
+            translation = clean_llm_translation(raw_text)
+            print(f"✅ Gemini API потоковый перевод: '{text}' → '{translation}'")
+            yield translation
+        if last_chunk is not None and gemini_truncated(last_chunk):
+            raise RuntimeError("ответ обрезан по max_output_tokens")
 
 # Fallback переводчик с базовым словарем
 class FallbackTranslator:
@@ -397,41 +743,126 @@ class FallbackTranslator:
             "юность": "юнацтва",
             "зрелость": "сталасць"
         }
+        # Словарь компилируется в автомат один раз: поиск фраз линеен по длине текста
+        self.matcher = PhraseMatcher(self.translations)
+        # Большой словарь на диске (собирается compact_dict.py), общий для всех процессов
+        self.dictionary = open_fallback_dictionary()
+        # Индекс опечаток: встроенные слова в памяти, большой словарь — с диска (если собран с --fuzzy)
+        self.fuzzy = SymSpellIndex(self.matcher.single_words, disk_index=open_fuzzy_index())
     
-    def translate_ru_to_be(self, text: str, max_len: int = 512) -> str:
-        text = text.strip().lower()
+    def translate_ru_to_be(self, text: str, max_len: int = 512) -> TranslationResult:
+        text = text.strip()
+        timings = {}
         if not text:
-            return ""
-        
-        # Ищем точные совпадения
-        if text in self.translations:
-            return self.translations[text]
+            return TranslationResult("", TranslationStatus.NOT_FOUND, "fallback")
         
-        # Ищем частичные совпадения
-        for ru, be in self.translations.items():
-            if ru in text:
-                return f"Частковы пераклад: {be} (для '{ru}')"
-        
-        return "Пераклад не знойдзены ў базе. Паспрабуйце іншы тэкст."
+        # Самые длинные фразы словаря в предложении, ненайденные слова помечены
+        with timed(timings, "parse"):
+            result, matched_words, total_words = self.matcher.translate(text, self.dictionary, self.fuzzy)
+        if matched_words == 0:
+            return TranslationResult("Пераклад не знойдзены ў базе. Паспрабуйце іншы тэкст.",
+                                     TranslationStatus.NOT_FOUND, "fallback", attempts=1, timings=timings)
+        if matched_words < total_words:
+            return TranslationResult(f"Частковы пераклад: {result}", TranslationStatus.PARTIAL, "fallback",
+                                     attempts=1, timings=timings)
+        return TranslationResult(result, TranslationStatus.OK, "fallback", attempts=1, timings=timings)
 
 # Глобальные переменные для переводчиков
 translator = None
 fallback_translator: Optional[FallbackTranslator] = None
-translator_lock = threading.Lock()
-use_gemini_api = False  # Флаг для выбора между API и библиотекой
-use_deepseek_api = False  # Флаг для выбора DeepSeek API
+translator_ready = False  # Основной переводчик инициализирован и готов
+translator_starting = False  # Идет инициализация основного переводчика
+translator_health_task: Optional[asyncio.Task] = None  # Прогрев и периодическая проверка
+
+GEMINI_MODEL_SETTING = "gemini_model"
+GEMINI_MODEL_TTL = 24 * 3600  # Сколько секунд доверяем сохраненной модели Gemini
+HEALTH_CHECK_INTERVAL = 30 * 60  # Интервал проверки переводчика в секундах
+translator_backend = DEFAULT_BACKEND  # Имя выбранного бэкенда из TRANSLATOR_BACKENDS
+googletrans_pool_size = DEFAULT_POOL_SIZE  # Сколько клиентов googletrans работают одновременно
+use_streaming = False  # Флаг потоковой выдачи перевода через редактирование сообщения
+
+# Интервалы между редактированиями потокового ответа (лимиты Telegram:
+# около 1 сообщения в секунду в личном чате и 20 в минуту в группе)
+STREAM_EDIT_INTERVAL_PRIVATE = 1.0
+STREAM_EDIT_INTERVAL_GROUP = 3.0
+STREAM_INCOMPLETE_NOTE = "⚠️ Пераклад перарваны, паказана толькі яго частка"
+
+# Разбиение длинных сообщений на предложения
+TELEGRAM_MESSAGE_LIMIT = 4096  # Максимальная длина сообщения в Telegram
+LONG_TEXT_THRESHOLD = 500  # С этой длины текст переводится по предложениям
+CHUNK_TRANSLATION_WORKERS = 4  # Сколько предложений одного сообщения переводится одновременно
+SENTENCE_CACHE_SIZE = 2000  # Сколько переводов предложений держим в памяти
+SENTENCE_SPLIT_PATTERN = re.compile(r'((?<=[.!?…])\s+|\n+)')
+
+sentence_cache: "OrderedDict[str, str]" = OrderedDict()
+
+# Кэш переводов коротких сообщений, упоминаний и инлайн-запросов основным переводчиком
+TRANSLATION_CACHE_SIZE = 5000
+translation_cache: "OrderedDict[str, str]" = OrderedDict()
+translation_cache_stats = {"hits": 0, "misses": 0, "warmed": 0}
 
-# Таймеры для задержки перевода
-translation_timers: Dict[int, threading.Timer] = {}
-translation_lock = threading.Lock()
+# Подсказки в инлайн-режиме: переведенные фразы и заголовки словаря
+inline_index = PrefixIndex()
 
-# Таймеры для инлайн-режима
-inline_timers: Dict[str, threading.Timer] = {}
-inline_lock = threading.Lock()
+# Тексты, которые основной переводчик недавно не перевел (эмодзи, набор букв):
+# повторные запросы к googletrans/LLM не отправляются, сразу отвечает fallback
+MISSING_CACHE_FILE = "translation_missing.bin"
+missing_translations: Optional[NegativeCache] = None
+
+# Прогрев кэша самыми частыми запросами из истории (параметры --warmup-*)
+DEFAULT_WARMUP_TOP = 200        # Сколько самых частых текстов перевести заранее (0 — не прогревать)
+DEFAULT_WARMUP_DAYS = 7.0       # За сколько последних дней считать частоту
+DEFAULT_WARMUP_RATE = 1.0       # Запросов к переводчику в секунду во время прогрева
+DEFAULT_WARMUP_BUDGET = 300.0   # Секунд на один прогрев
+DEFAULT_WARMUP_INTERVAL = 0.0   # Часов между повторными прогревами (0 — только при запуске)
+WARMUP_CANDIDATES_FACTOR = 4    # Запас строк из БД: разные варианты одного текста сливаются после нормализации
+warmup_args: Optional[argparse.Namespace] = None
+warmup_task: Optional[asyncio.Task] = None
+
+# Отложенные переводы (задачи asyncio) для обычных сообщений, по chat_id.
+# Все сообщения чата за паузу во вводе копятся в пачку и переводятся вместе
+TRANSLATION_DELAY = 2.0
+MAX_BATCH_MESSAGES = 10   # С таким числом сообщений пачка переводится, не дожидаясь паузы
+MAX_BATCH_WAIT = 6.0      # Дольше стольких секунд от первого сообщения пачка не ждет
+BATCH_TEXT_LIMIT = 2000   # Больше стольких символов в один запрос к googletrans не склеиваем
+# Ответ LLM ограничен max_tokens (512): пачка для DeepSeek/Gemini не длиннее одного
+# «короткого» текста, иначе перевод обрезается
+LLM_BATCH_TEXT_LIMIT = LONG_TEXT_THRESHOLD
+translation_tasks: Dict[int, asyncio.Task] = {}
+# chat_id → [(update, text, is_mention, word_to_translate), ...] и время первого сообщения пачки
+pending_batches: Dict[int, list] = {}
+batch_started: Dict[int, float] = {}
+# chat_id → {user_id: индекс в пачке}: сообщение сверх лимита (COALESCE) заменяет
+# предыдущее такое же сообщение пользователя, а не добавляется к пачке
+batch_coalesced: Dict[int, Dict[int, int]] = {}
+batch_reply = "each"  # each — ответ на каждое сообщение, combined — один общий ответ
+
+# Отложенные переводы для инлайн-режима, по user_id
+INLINE_TRANSLATION_DELAY = 1.0
+inline_tasks: Dict[int, asyncio.Task] = {}
+
+# Снимок состояния при перезапуске: кэши и не успевшие до остановки переводы
+STATE_FILE = "bot_google_state.json"
+RESUME_TRANSLATOR_WAIT = 30.0  # Сколько восстановленные переводы ждут основной переводчик, секунд
+shutdown_drain = ShutdownDrain()
+state_file: Optional[str] = None
+shutdown_deadline = DEFAULT_SHUTDOWN_DEADLINE
+unfinished_translations: list = []  # (update, text, is_mention, word_to_translate) из пачек, отмененных при остановке
+restored_translations: list = []    # Переводы из снимка, ждущие запуска приложения
+
+# Ограничение частоты входящих запросов (создается в build_application)
+admission: Optional[AdmissionController] = None
 
 # Система базы данных SQLite
 DB_FILE = "bot_stats.db"
-db_lock = threading.Lock()
+# Все обращения к SQLite выполняются в одном отдельном потоке, чтобы не
+# блокировать цикл событий и не получать "database is locked" при записи
+db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+async def run_db(func, *args):
+    """Выполняет блокирующую функцию работы с БД в потоке БД"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(func, *args))
 
 def init_database():
     """Инициализирует базу данных"""
@@ -439,6 +870,9 @@ def init_database():
         with sqlite3.connect(DB_FILE) as conn:
             cursor = conn.cursor()
             
+            # WAL позволяет воркерам (--workers) писать статистику, не блокируя чтение
+            cursor.execute('PRAGMA journal_mode=WAL')
+            
             # Таблица пользователей
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS users (
@@ -468,6 +902,27 @@ def init_database():
                 )
             ''')
             
+            # Прогрев кэша выбирает частые запросы за последние дни
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_requests_timestamp ON requests (timestamp)')
+            
+            # Таблица переводов: какой переводчик ответил и за сколько
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS translations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    request_type TEXT,
+                    backend TEXT,
+                    status TEXT,
+                    cache TEXT,
+                    attempts INTEGER,
+                    queue_ms REAL,
+                    network_ms REAL,
+                    parse_ms REAL,
+                    total_ms REAL,
+                    timestamp TEXT
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_translations_timestamp ON translations (timestamp)')
+            
             # Таблица админов
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS admins (
@@ -477,6 +932,15 @@ def init_database():
                 )
             ''')
             
+            # Таблица настроек (сохраненное состояние между перезапусками)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    updated_at TEXT
+                )
+            ''')
+            
             conn.commit()
             print("✅ База данных инициализирована")
             
@@ -545,6 +1009,47 @@ def log_user_request(user_id: int, username: str, first_name: str, last_name: st
     except Exception as e:
         print(f"❌ Ошибка записи в БД: {e}")
 
+def log_translation_result(request_type: str, result: TranslationResult):
+    """Записывает в БД, какой переводчик ответил на запрос и сколько длилась каждая фаза"""
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            timings = result.timings
+            conn.execute('''
+                INSERT INTO translations (request_type, backend, status, cache, attempts,
+                                          queue_ms, network_ms, parse_ms, total_ms, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                request_type, result.backend, result.status.value, result.cache.value, result.attempts,
+                timings.get("queue", 0.0) * 1000, timings.get("network", 0.0) * 1000,
+                timings.get("parse", 0.0) * 1000, result.total_time * 1000,
+                datetime.now().isoformat()
+            ))
+            conn.commit()
+    except Exception as e:
+        print(f"❌ Ошибка записи перевода в БД: {e}")
+
+def get_frequent_requests(days: float, limit: int) -> List[str]:
+    """Самые частые тексты запросов за последние days дней, по убыванию частоты"""
+    try:
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        with sqlite3.connect(DB_FILE) as conn:
+            cursor = conn.cursor()
+            # Длинные тексты переводятся по предложениям и кэшируются отдельно
+            cursor.execute('''
+                SELECT text, COUNT(*) AS hits FROM requests
+                WHERE timestamp >= ? AND text != '' AND text_length <= ?
+                GROUP BY text ORDER BY hits DESC LIMIT ?
+            ''', (since, LONG_TEXT_THRESHOLD, limit * WARMUP_CANDIDATES_FACTOR))
+            counts = Counter()
+            for text, hits in cursor.fetchall():
+                key = normalize_request_text(text)
+                if key:
+                    counts[key] += hits
+            return [text for text, _ in counts.most_common(limit)]
+    except Exception as e:
+        print(f"❌ Ошибка чтения частых запросов: {e}")
+        return []
+
 def get_user_stats_summary():
     """Возвращает сводку статистики пользователей"""
     try:
@@ -627,6 +1132,39 @@ def get_user_personal_stats(user_id: int):
         print(f"❌ Ошибка получения личной статистики: {e}")
         return None
 
+def get_setting(key: str, max_age: Optional[float] = None) -> Optional[str]:
+    """Возвращает сохраненную настройку, если она не старше max_age секунд"""
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT value, updated_at FROM settings WHERE key = ?", (key,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            
+            value, updated_at = row
+            if max_age is not None:
+                age = (datetime.now() - datetime.fromisoformat(updated_at)).total_seconds()
+                if age > max_age:
+                    return None
+            return value
+    except Exception as e:
+        print(f"❌ Ошибка чтения настройки {key}: {e}")
+        return None
+
+def set_setting(key: str, value: str):
+    """Сохраняет настройку в БД"""
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO settings (key, value, updated_at)
+                VALUES (?, ?, ?)
+            ''', (key, value, datetime.now().isoformat()))
+            conn.commit()
+    except Exception as e:
+        print(f"❌ Ошибка сохранения настройки {key}: {e}")
+
 def is_admin(user_id: int) -> bool:
     """Проверяет, является ли пользователь админом"""
     try:
@@ -653,6 +1191,39 @@ def add_admin(user_id: int, username: str = None):
         print(f"❌ Ошибка добавления админа: {e}")
         return False
 
+def export_users_csv(path: str = "users_export.csv"):
+    """Экспортирует пользователей в CSV файл"""
+    with sqlite3.connect(DB_FILE) as conn:
+        cursor = conn.cursor()
+        
+        # Экспорт пользователей
+        cursor.execute('''
+            SELECT user_id, username, first_name, last_name, total_requests, 
+                   inline_requests, message_requests, mention_requests, 
+                   first_seen, last_activity
+            FROM users ORDER BY total_requests DESC
+        ''')
+        users_data = cursor.fetchall()
+        
+        csv_content = "user_id,username,first_name,last_name,total_requests,inline_requests,message_requests,mention_requests,first_seen,last_activity\n"
+        for row in users_data:
+            csv_content += ",".join(str(x) if x is not None else "" for x in row) + "\n"
+        
+        # Сохраняем в файл
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(csv_content)
+
+def get_admins_list():
+    """Возвращает список админов (user_id, username, added_date)"""
+    with sqlite3.connect(DB_FILE) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT user_id, username, added_date
+            FROM admins ORDER BY added_date
+        ''')
+        return cursor.fetchall()
+
 def get_detailed_stats():
     """Возвращает детальную статистику для админов"""
     try:
@@ -690,6 +1261,20 @@ def get_detailed_stats():
             ''')
             top_users = cursor.fetchall()
             
+            # Переводчики за последние сутки: доля удачных, попадания в кэш, задержка
+            since = (datetime.now() - timedelta(days=1)).isoformat()
+            cursor.execute('''
+                SELECT backend, COUNT(*),
+                       SUM(status IN ('ok', 'partial')),
+                       SUM(cache = 'hit'),
+                       AVG(total_ms), AVG(network_ms), MAX(total_ms)
+                FROM translations
+                WHERE timestamp > ?
+                GROUP BY backend
+                ORDER BY COUNT(*) DESC
+            ''', (since,))
+            backends = cursor.fetchall()
+            
             return {
                 'total_users': total_users,
                 'total_requests': total_requests,
@@ -697,152 +1282,645 @@ def get_detailed_stats():
                 'total_messages': total_messages,
                 'total_mentions': total_mentions,
                 'requests_today': requests_today,
-                'top_users': top_users
+                'top_users': top_users,
+                'backends': backends
             }
             
     except Exception as e:
         print(f"❌ Ошибка получения детальной статистики: {e}")
         return None
 
-def ensure_translator():
-    global translator, fallback_translator, use_gemini_api, use_deepseek_api
+async def init_translator():
+    """Инициализирует основной переводчик (выполняется в фоне при запуске)"""
+    global translator, translator_ready, translator_starting
     
     if translator is None:
-        with translator_lock:
-            if translator is None:
-                try:
-                    if use_deepseek_api:
-                        # Используем DeepSeek API
-                        api_key = load_deepseek_api_key()
-                        if not api_key:
-                            print("❌ DeepSeek API ключ не найден в .env файле")
-                            print("💡 Добавьте DEEPSEEK_API_KEY=your_api_key в .env файл")
-                            raise ValueError("DeepSeek API ключ не найден")
-                        
-                        if not DEEPSEEK_API_AVAILABLE:
-                            print("❌ DeepSeek API не установлен")
-                            print("💡 Установите: pip install openai")
-                            raise ImportError("openai не установлен")
-                        
-                        translator = DeepSeekAPITranslator(api_key)
-                        print("🧠 Использую DeepSeek API")
-                    elif use_gemini_api:
-                        # Используем Gemini API
-                        api_key = load_gemini_api_key()
-                        if not api_key:
-                            print("❌ Gemini API ключ не найден в .env файле")
-                            print("💡 Добавьте GEMINI_API_KEY=your_api_key в .env файл")
-                            raise ValueError("Gemini API ключ не найден")
-                        
-                        if not GEMINI_API_AVAILABLE:
-                            print("❌ Gemini API не установлен")
-                            print("💡 Установите: pip install google-generativeai")
-                            raise ImportError("google-generativeai не установлен")
-                        
-                        translator = GeminiAPITranslator(api_key)
-                        print("🤖 Использую Gemini API")
-                    else:
-                        # Используем Google Translate Library
-                        if not GOOGLE_LIBRARY_AVAILABLE:
-                            print("❌ Google Translate Library не установлен")
-                            print("💡 Установите: pip install googletrans==4.0.0rc1")
-                            raise ImportError("googletrans не установлен")
-                        
-                        translator = GoogleLibraryTranslator()
-                        print("📚 Использую Google Translate Library")
-                    
-                    fallback_translator = FallbackTranslator()
-                except Exception as e:
-                    print(f"Не удалось инициализировать переводчик: {e}")
-                    print("Использую fallback переводчик...")
-                    translator = None
-                    fallback_translator = FallbackTranslator()
+        translator_starting = True
+        try:
+            backend = TRANSLATOR_BACKENDS[translator_backend]
+            
+            if not is_backend_available(translator_backend):
+                print(f"❌ {backend['title']} не установлен")
+                print(f"💡 Установите: pip install {backend['pip_name']}")
+                raise ImportError(f"{backend['pip_name']} не установлен")
+            
+            api_key = None
+            if backend['api_key_loader']:
+                api_key = backend['api_key_loader']()
+                if not api_key:
+                    key_name = f"{translator_backend.upper()}_API_KEY"
+                    print(f"❌ {backend['title']} ключ не найден в .env файле")
+                    print(f"💡 Добавьте {key_name}=your_api_key в .env файл")
+                    raise ValueError(f"{backend['title']} ключ не найден")
+            
+            # Импорт SDK и создание клиента могут занять заметное время — не блокируем цикл событий
+            if api_key:
+                new_translator = await asyncio.to_thread(backend['class'], api_key)
+            else:
+                new_translator = await asyncio.to_thread(backend['class'])
+            
+            if translator_backend == "gemini":
+                # Используем модель, выбранную при прошлом запуске, если она не устарела
+                saved_model = await run_db(get_setting, GEMINI_MODEL_SETTING, GEMINI_MODEL_TTL)
+                if saved_model:
+                    new_translator.use_model(saved_model)
+                else:
+                    await run_db(set_setting, GEMINI_MODEL_SETTING, await new_translator.select_model())
+            
+            translator = new_translator
+            translator_ready = True
+            print(f"{backend['emoji']} Использую {backend['title']}")
+        except Exception as e:
+            print(f"Не удалось инициализировать переводчик: {e}")
+            print("Использую fallback переводчик...")
+            translator = None
+        finally:
+            translator_starting = False
     
+    return translator
+
+def load_fallback_translator() -> FallbackTranslator:
+    """Создает fallback переводчик и добавляет его словарь в инлайн-подсказки"""
+    fallback = FallbackTranslator()
+    for phrase, be in fallback.translations.items():
+        inline_index.add(phrase, be, weight=0)
+    return fallback
+
+def ensure_translator():
+    """Возвращает основной и fallback переводчики, не дожидаясь инициализации
+
+    Пока основной переводчик прогревается в фоне, вместо него возвращается None
+    и запросы обслуживает fallback переводчик.
+    """
+    global fallback_translator
+    
+    if fallback_translator is None:
+        fallback_translator = load_fallback_translator()
+    
+    if not translator_ready:
+        return None, fallback_translator
     return translator, fallback_translator
 
-def delayed_translation(update: Update, context: CallbackContext, text: str, is_mention: bool = False, word_to_translate: str = ""):
-    """Выполняет перевод с задержкой"""
-    chat_id = update.message.chat_id
+async def translator_health_loop():
+    """Прогревает переводчик, затем периодически проверяет его и повторяет инициализацию при сбое"""
+    await init_translator()
     
-    # Очищаем таймер после выполнения
-    with translation_lock:
-        if chat_id in translation_timers:
-            del translation_timers[chat_id]
+    while True:
+        await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+        try:
+            if translator is None:
+                print("🔄 Повторная инициализация переводчика...")
+                await init_translator()
+                continue
+            
+            health_check = getattr(translator, "health_check", None)
+            if health_check is None:
+                continue
+            
+            if await health_check():
+                if isinstance(translator, GeminiAPITranslator):
+                    await run_db(set_setting, GEMINI_MODEL_SETTING, translator.model_name)
+                print("💚 Переводчик прошел проверку")
+            else:
+                print("❌ Переводчик не прошел проверку")
+        except Exception as e:
+            print(f"❌ Ошибка проверки переводчика: {e}")
+
+def start_translator_warmup():
+    """Запускает фоновую инициализацию переводчика и периодическую проверку"""
+    global fallback_translator, translator_health_task
     
-    try:
-        google_tr, fallback_tr = ensure_translator()
+    fallback_translator = load_fallback_translator()
+    translator_health_task = asyncio.create_task(translator_health_loop(), name="translator-health")
+    print("⏳ Переводчик прогревается в фоне, до готовности работает fallback")
+
+def add_warmup_arguments(parser: argparse.ArgumentParser):
+    """Добавляет параметры прогрева кэша; значения по умолчанию берутся из WARMUP_* в окружении/.env"""
+    group = parser.add_argument_group('cache warm-up', 'Перевод самых частых запросов заранее, в фоне')
+    group.add_argument('--warmup-top', type=int,
+                       default=int(read_env_setting("WARMUP_TOP") or DEFAULT_WARMUP_TOP),
+                       help=f'Сколько самых частых текстов перевести (WARMUP_TOP, по умолчанию {DEFAULT_WARMUP_TOP}, 0 — выключить)')
+    group.add_argument('--warmup-days', type=float,
+                       default=float(read_env_setting("WARMUP_DAYS") or DEFAULT_WARMUP_DAYS),
+                       help=f'За сколько последних дней считать частоту (WARMUP_DAYS, по умолчанию {DEFAULT_WARMUP_DAYS:g})')
+    group.add_argument('--warmup-rate', type=float,
+                       default=float(read_env_setting("WARMUP_RATE") or DEFAULT_WARMUP_RATE),
+                       help=f'Запросов к переводчику в секунду (WARMUP_RATE, по умолчанию {DEFAULT_WARMUP_RATE:g})')
+    group.add_argument('--warmup-budget', type=float,
+                       default=float(read_env_setting("WARMUP_BUDGET") or DEFAULT_WARMUP_BUDGET),
+                       help=f'Секунд на один прогрев (WARMUP_BUDGET, по умолчанию {DEFAULT_WARMUP_BUDGET:g})')
+    group.add_argument('--warmup-interval', type=float,
+                       default=float(read_env_setting("WARMUP_INTERVAL_HOURS") or DEFAULT_WARMUP_INTERVAL),
+                       help='Часов между повторными прогревами (WARMUP_INTERVAL_HOURS, по умолчанию 0 — только при запуске)')
+
+async def warm_translation_cache(args: argparse.Namespace) -> int:
+    """Переводит самые частые запросы из истории в кэш переводов; возвращает число новых записей
+
+    Прогрев идет с низким приоритетом: не чаще warmup_rate запросов в секунду
+    (делится между воркерами), пауза, пока есть запланированные переводы
+    пользователей, и остановка по истечении warmup_budget секунд.
+    """
+    deadline = time.monotonic() + args.warmup_budget
+    
+    # Прогревать имеет смысл только основной переводчик
+    while not translator_ready:
+        if time.monotonic() > deadline:
+            print("⚠️ Прогрев кэша пропущен: переводчик не готов")
+            return 0
+        await asyncio.sleep(1)
+    
+    texts = await run_db(get_frequent_requests, args.warmup_days, args.warmup_top)
+    interval = max(1, getattr(args, "workers", 0)) / args.warmup_rate if args.warmup_rate > 0 else 0
+    print(f"🔥 Прогрев кэша: {len(texts)} частых запросов за {args.warmup_days:g} дн.")
+    
+    warmed = 0
+    started = time.monotonic()
+    for text in texts:
+        if text in translation_cache:
+            continue
+        # Запросы пользователей важнее: ждем, пока их отложенные переводы выполнятся
+        while translation_tasks or inline_tasks:
+            if time.monotonic() > deadline:
+                break
+            await asyncio.sleep(max(interval, 0.5))
+        if time.monotonic() > deadline:
+            print(f"⏱ Время прогрева истекло, переведено {warmed}")
+            break
         
-        if is_mention and word_to_translate:
-            # Перевод одного слова при упоминании
-            print(f"🔍 Обрабатываю упоминание: '{word_to_translate}'")
-            
-            if google_tr:
-                be = google_tr.translate_ru_to_be(word_to_translate)
-                if be and not be.startswith("Памылка") and not be.startswith("Пераклад не знойдзены"):
-                    update.message.reply_text(f"'{word_to_translate}' → '{be}'")
-                    return
+        try:
+            result = await translator.translate_ru_to_be(text)
+        except Exception as e:
+            print(f"❌ Ошибка прогрева '{text[:50]}': {e}")
+            result = None
+        if result and result.found:
+            store_translation(text, result)
+            warmed += 1
+        await asyncio.sleep(interval)
+    
+    translation_cache_stats["warmed"] += warmed
+    print(f"✅ Кэш прогрет: +{warmed} переводов за {time.monotonic() - started:.0f} с, всего {len(translation_cache)}")
+    return warmed
+
+async def cache_warmup_loop(args: argparse.Namespace):
+    """Прогревает кэш при запуске и затем раз в warmup_interval часов"""
+    while True:
+        try:
+            await warm_translation_cache(args)
+        except Exception as e:
+            print(f"❌ Ошибка прогрева кэша: {e}")
+        if args.warmup_interval <= 0:
+            return
+        await asyncio.sleep(args.warmup_interval * 3600)
+
+async def edit_stream_message(message, text: str) -> bool:
+    """Редактирует сообщение потокового перевода, возвращает False при превышении лимита"""
+    try:
+        await message.edit_text(text)
+    except RetryAfter as e:
+        print(f"🚫 Лимит редактирования, ждем {e.retry_after}с...")
+        await asyncio.sleep(e.retry_after)
+        return False
+    except BadRequest as e:
+        # Текст не изменился — это не ошибка
+        if "not modified" not in str(e).lower():
+            raise
+    return True
+
+async def stream_translation_reply(update: Update, stream_translator, text: str) -> Optional[TranslationResult]:
+    """Отправляет перевод по мере генерации, дописывая его в одно сообщение
+
+    Первый фрагмент отправляется сразу, остальные добавляются редактированием
+    не чаще, чем позволяют лимиты Telegram. Возвращает результат, если ответ
+    отправлен, и None, если ничего отправить не удалось. Если поток оборвался
+    после первого фрагмента, ответ помечается как неполный, а результат — PARTIAL.
+    """
+    if update.message.chat.type == "private":
+        edit_interval = STREAM_EDIT_INTERVAL_PRIVATE
+    else:
+        edit_interval = STREAM_EDIT_INTERVAL_GROUP
+    
+    sent_message = None
+    shown_text = ""
+    latest_text = ""
+    last_edit = 0.0
+    timings = {}
+    error = None
+    started = time.perf_counter()
+    
+    try:
+        async for partial in stream_translator.translate_ru_to_be_stream(text):
+            if not partial:
+                continue
+            latest_text = partial
             
-            # Если Google не сработал, используем fallback
-            be = fallback_tr.translate_ru_to_be(word_to_translate)
-            if not be or be.startswith("Пераклад не знойдзены"):
-                be = "пераклад не знойдзены"
+            if sent_message is None:
+                timings["network"] = time.perf_counter() - started  # До первого фрагмента
+                sent_message = await update.message.reply_text(partial)
+                shown_text = partial
+                last_edit = time.monotonic()
+                print(f"⚡ Первый фрагмент перевода отправлен: '{partial[:50]}'")
+                continue
             
-            update.message.reply_text(f"'{word_to_translate}' → '{be}'")
+            if partial != shown_text and time.monotonic() - last_edit >= edit_interval:
+                if await edit_stream_message(sent_message, partial):
+                    shown_text = partial
+                last_edit = time.monotonic()
+    except Exception as e:
+        print(f"❌ Ошибка потокового перевода: {e}")
+        if sent_message is None:
+            return None
+        error = str(e)
+    
+    if sent_message is None:
+        return None
+    timings["stream"] = time.perf_counter() - started - timings["network"]
+    
+    # Финальное редактирование с полным переводом (или с пометкой, что он оборван)
+    final_text = latest_text if error is None else f"{latest_text}…\n\n{STREAM_INCOMPLETE_NOTE}"
+    if final_text != shown_text:
+        wait = edit_interval - (time.monotonic() - last_edit)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        if not await edit_stream_message(sent_message, final_text):
+            await edit_stream_message(sent_message, final_text)
+    status = TranslationStatus.OK if error is None else TranslationStatus.PARTIAL
+    return TranslationResult(latest_text, status, translator_backend, CacheStatus.MISS,
+                             attempts=1, timings=timings, error=error)
+
+async def record_translation(request_type: str, result: TranslationResult):
+    """Пишет в лог и статистику, какой переводчик ответил и за сколько"""
+    print(f"⏱ {request_type}: {result.describe()}")
+    await run_db(log_translation_result, request_type, result)
+
+def split_into_sentences(text: str) -> List[str]:
+    """Делит текст на предложения, сохраняя разделители между ними
+
+    Возвращает чередующийся список [предложение, разделитель, предложение, ...],
+    поэтому "".join(result) == text.
+    """
+    return SENTENCE_SPLIT_PATTERN.split(text)
+
+async def translate_sentence(google_tr, sentence: str, semaphore: asyncio.Semaphore) -> Optional[str]:
+    """Переводит одно предложение с использованием кэша предложений"""
+    cached = sentence_cache.get(sentence)
+    if cached is not None:
+        sentence_cache.move_to_end(sentence)
+        return cached
+    
+    async with semaphore:
+        result = await google_tr.translate_ru_to_be(sentence)
+    if not result.found:
+        return None
+    if result.status is not TranslationStatus.OK:
+        # Частичный или обрезанный перевод показываем, но не кэшируем, как в store_translation
+        return result.text
+    
+    be = result.text
+    sentence_cache[sentence] = be
+    if len(sentence_cache) > SENTENCE_CACHE_SIZE:
+        sentence_cache.popitem(last=False)
+    return be
+
+def normalize_request_text(text: str) -> str:
+    """Ключ кэша переводов: текст без лишних пробелов (регистр влияет на перевод)"""
+    return " ".join(text.split())
+
+def get_cached_translation(text: str) -> Optional[str]:
+    """Перевод из кэша переводов или None"""
+    key = normalize_request_text(text)
+    cached = translation_cache.get(key)
+    if cached is None:
+        translation_cache_stats["misses"] += 1
+        return None
+    translation_cache.move_to_end(key)
+    translation_cache_stats["hits"] += 1
+    inline_index.touch(key)
+    return cached
+
+def store_translation(text: str, result: TranslationResult):
+    """Сохраняет удачный перевод в кэш переводов (частичные и обрезанные — нет)"""
+    if result.status is not TranslationStatus.OK:
+        return
+    key = normalize_request_text(text)
+    translation_cache[key] = result.text
+    translation_cache.move_to_end(key)
+    inline_index.add(key, result.text)
+    if len(translation_cache) > TRANSLATION_CACHE_SIZE:
+        translation_cache.popitem(last=False)
+
+def cached_result(text: str) -> Optional[TranslationResult]:
+    """Перевод из кэша переводов в виде результата или None"""
+    timings = {}
+    with timed(timings, "cache"):
+        be = get_cached_translation(text)
+    if be is None:
+        return None
+    return TranslationResult(be, TranslationStatus.OK, translator_backend, CacheStatus.HIT, timings=timings)
+
+def open_missing_cache() -> Optional[NegativeCache]:
+    """Кэш непереведенных текстов из TRANSLATION_MISSING_CACHE (по умолчанию translation_missing.bin; off — без кэша)"""
+    path = read_env_setting("TRANSLATION_MISSING_CACHE") or MISSING_CACHE_FILE
+    if path.lower() == "off":
+        return None
+    return NegativeCache(path)
+
+def missing_key(text: str) -> str:
+    # Текст, который не перевел googletrans, может перевести LLM: ключ включает бэкенд
+    return f"{translator_backend}:{text}"
+
+def negative_result(text: str) -> Optional[TranslationResult]:
+    """NOT_FOUND без запроса, если основной переводчик недавно не перевел этот текст"""
+    if missing_translations is None or not missing_translations.is_missing(missing_key(text)):
+        return None
+    print(f"🚫 '{text[:50]}' недавно не перевелся, не отправляю переводчику")
+    return TranslationResult(f"Пераклад не знойдзены для: {text}", TranslationStatus.NOT_FOUND,
+                             translator_backend, CacheStatus.NEGATIVE)
+
+def remember_missing(text: str, result: TranslationResult):
+    """Запоминает текст, который переводчик не перевел (ошибки сети не запоминаются)"""
+    if missing_translations is not None and result.status is TranslationStatus.NOT_FOUND:
+        missing_translations.add(missing_key(text))
+
+async def translate_uncached(google_tr, text: str) -> TranslationResult:
+    """Переводит основным переводчиком и сохраняет удачный перевод в кэш"""
+    result = negative_result(text)
+    if result is not None:
+        return result
+    result = await google_tr.translate_ru_to_be(text)
+    result.cache = CacheStatus.MISS
+    store_translation(text, result)
+    remember_missing(text, result)
+    return result
+
+async def translate_with_cache(google_tr, text: str) -> TranslationResult:
+    """Переводит основным переводчиком, сначала проверяя кэш переводов"""
+    result = cached_result(text)
+    if result is None:
+        result = await translate_uncached(google_tr, text)
+    return result
+
+async def translate_joined(google_tr, texts: List[str]) -> List[TranslationResult]:
+    """Переводит несколько коротких текстов одним запросом
+
+    Тексты склеиваются с номерами, перевод делится обратно по номерам
+    (у googletrans для этого есть translate_many). Тексты, которые не разделились,
+    переводятся еще одним общим запросом, а не по отдельности (translate_segments).
+    """
+    if hasattr(google_tr, "translate_many"):
+        results = await google_tr.translate_many(texts)
+    else:
+        results = await translate_segments(google_tr.translate_ru_to_be, texts)
+    
+    for text, result in zip(texts, results):
+        result.cache = CacheStatus.MISS
+        store_translation(text, result)
+        remember_missing(text, result)
+    return results
+
+async def translate_batch(google_tr, texts: List[str]) -> List[TranslationResult]:
+    """Переводит короткие тексты: известные — из кэша, остальные — склеенными запросами"""
+    results: List[Optional[TranslationResult]] = [cached_result(text) or negative_result(text) for text in texts]
+    missing = [i for i, result in enumerate(results) if result is None]
+    
+    # Запросы не длиннее BATCH_TEXT_LIMIT символов (для LLM — LLM_BATCH_TEXT_LIMIT)
+    limit = BATCH_TEXT_LIMIT if hasattr(google_tr, "translate_many") else LLM_BATCH_TEXT_LIMIT
+    chunks = []
+    length = 0
+    for i in missing:
+        # Номер и перевод строки тоже занимают место в запросе
+        text_length = len(SEGMENT_MARK.format(len(missing))) + len(texts[i]) + 1
+        if not chunks or length + text_length > limit:
+            chunks.append([])
+            length = 0
+        chunks[-1].append(i)
+        length += text_length
+    
+    for chunk in chunks:
+        if len(chunk) == 1:
+            chunk_results = [await translate_uncached(google_tr, texts[chunk[0]])]
         else:
-            # Перевод всего текста
-            print(f"🔍 Перевожу текст: '{text}'")
-            
-            if google_tr:
-                be = google_tr.translate_ru_to_be(text)
-                if be and not be.startswith("Памылка") and not be.startswith("Пераклад не знойдзены"):
-                    update.message.reply_text(be)
-                    return
-            
-            # Если Google не сработал, используем fallback
-            be = fallback_tr.translate_ru_to_be(text)
-            if not be or be.startswith("Пераклад не знойдзены"):
-                be = "Пераклад не атрымаўся. Паспрабуйце іншы тэкст."
+            chunk_results = await translate_joined(google_tr, [texts[i] for i in chunk])
+        for i, result in zip(chunk, chunk_results):
+            results[i] = result
+    return results
+
+async def translate_long_result(google_tr, text: str) -> Optional[TranslationResult]:
+    """Длинный текст по предложениям; результат или None, если не переведено ничего"""
+    timings = {}
+    with timed(timings, "network"):
+        be = await translate_long_text(google_tr, text)
+    if not be:
+        return None
+    return TranslationResult(be, TranslationStatus.OK, translator_backend, attempts=1, timings=timings)
+
+async def translate_long_text(google_tr, text: str) -> Optional[str]:
+    """Переводит длинный текст по предложениям параллельно
+
+    Одинаковые предложения переводятся один раз, перевод собирается
+    в исходном порядке. Непереведенные предложения остаются как есть.
+    Возвращает None, если не удалось перевести ни одного предложения.
+    """
+    parts = split_into_sentences(text)
+    sentences = list({part.strip(): None for part in parts[::2] if part.strip()})
+    print(f"🧩 Длинный текст: {len(parts[::2])} предложений, {len(sentences)} уникальных")
+    
+    semaphore = asyncio.Semaphore(CHUNK_TRANSLATION_WORKERS)
+    results = await asyncio.gather(
+        *(translate_sentence(google_tr, sentence, semaphore) for sentence in sentences),
+        return_exceptions=True
+    )
+    translations = {}
+    for sentence, result in zip(sentences, results):
+        if isinstance(result, Exception):
+            print(f"❌ Ошибка перевода предложения '{sentence[:50]}': {result}")
+            result = None
+        translations[sentence] = result
+    
+    if not any(translations.values()):
+        return None
+    
+    result = []
+    for i, part in enumerate(parts):
+        if i % 2 == 1 or not part.strip():
+            result.append(part)  # Разделитель между предложениями
+        else:
+            result.append(translations.get(part.strip()) or part.strip())
+    return "".join(result)
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """Делит текст на части не длиннее limit, по возможности по границам абзацев и предложений"""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            match = None
+            for match in SENTENCE_SPLIT_PATTERN.finditer(text, 0, limit):
+                pass
+            cut = match.start() if match and match.start() > 0 else -1
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text:
+        chunks.append(text)
+    return chunks
+
+async def reply_long_text(message, text: str):
+    """Отправляет ответ, при необходимости разбивая его на несколько сообщений"""
+    for chunk in split_message(text):
+        await message.reply_text(chunk)
+
+async def delayed_translation(context: ContextTypes.DEFAULT_TYPE, chat_id: int, delay: float):
+    """Переводит все сообщения чата, накопленные за паузу во вводе"""
+    # Ждем паузу во вводе: новое сообщение из этого чата перезапустит задачу во время ожидания
+    # (при остановке бота пауза заканчивается сразу)
+    await shutdown_drain.debounce(delay)
+    
+    # Дальше перевод уже не отменяется, новые сообщения чата начнут следующую пачку
+    if translation_tasks.get(chat_id) is asyncio.current_task():
+        del translation_tasks[chat_id]
+    items = pending_batches.pop(chat_id, [])
+    batch_started.pop(chat_id, None)
+    batch_coalesced.pop(chat_id, None)
+    if not items:
+        return
+    last_message = items[-1][0].message
+    
+    try:
+        google_tr, fallback_tr = ensure_translator()
+        # При упоминании переводится одно слово, иначе — весь текст
+        sources = [word_to_translate if is_mention else text for _, text, is_mention, word_to_translate in items]
+        results: List[Optional[TranslationResult]] = [None] * len(items)
+        print(f"🔍 Перевожу пачку из {len(items)} сообщений чата {chat_id}")
+        
+        if google_tr:
+            single_text = len(items) == 1 and not items[0][2] and len(sources[0]) <= LONG_TEXT_THRESHOLD
+            if single_text and use_streaming and hasattr(google_tr, "translate_ru_to_be_stream"):
+                # Одно сообщение можно показывать по мере генерации
+                # Как и в пачке: кэш переводов, затем кэш непереведенных текстов
+                results[0] = cached_result(sources[0]) or negative_result(sources[0])
+                if results[0] is None:
+                    streamed = await stream_translation_reply(items[0][0], google_tr, sources[0])
+                    if streamed:
+                        store_translation(sources[0], streamed)
+                        await record_translation("message", streamed)
+                        return
+                    results[0] = await translate_uncached(google_tr, sources[0])
             
-            update.message.reply_text(be)
+            # Длинные тексты — по предложениям, короткие — одним запросом на всю пачку
+            short = []
+            for i, source in enumerate(sources):
+                if results[i] is not None:
+                    continue
+                if len(source) > LONG_TEXT_THRESHOLD:
+                    results[i] = await translate_long_result(google_tr, source)
+                else:
+                    short.append(i)
+            if short:
+                for i, result in zip(short, await translate_batch(google_tr, [sources[i] for i in short])):
+                    results[i] = result
+        
+        replies = []
+        for i, (update, text, is_mention, word_to_translate) in enumerate(items):
+            result = results[i]
+            if result is None or not result.found:
+                # Если Google не сработал, используем fallback
+                result = results[i] = fallback_tr.translate_ru_to_be(sources[i])
+            if result.found:
+                be = result.text
+            else:
+                be = "пераклад не знойдзены" if is_mention else "Пераклад не атрымаўся. Паспрабуйце іншы тэкст."
+            replies.append(f"'{word_to_translate}' → '{be}'" if is_mention else be)
+        
+        if batch_reply == "combined" and len(items) > 1:
+            await reply_long_text(last_message, "\n\n".join(replies))
+        else:
+            for (update, _, _, _), reply in zip(items, replies):
+                await reply_long_text(update.message, reply)
+        
+        for (_, _, is_mention, _), result in zip(items, results):
+            await record_translation("mention" if is_mention else "message", result)
             
     except Exception as e:
         print(f"❌ Ошибка при переводе: {e}")
-        update.message.reply_text(f"Памылка перакладу: {e}")
+        await last_message.reply_text(f"Памылка перакладу: {e}")
+
+def schedule_translation(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, is_mention: bool = False,
+                         word_to_translate: str = "", coalesce: bool = False):
+    """Добавляет сообщение в пачку чата и перезапускает паузу перед переводом (2 секунды)
 
-def schedule_translation(update: Update, context: CallbackContext, text: str, is_mention: bool = False, word_to_translate: str = ""):
-    """Планирует перевод с задержкой 2 секунды"""
+    coalesce=True — пользователь превысил лимит (COALESCE): в пачке остается
+    только его последнее такое сообщение, нового перевода и ответа оно не добавляет.
+    """
     chat_id = update.message.chat_id
+    items = pending_batches.setdefault(chat_id, [])
+    item = (update, text, is_mention, word_to_translate)
+    coalesced = batch_coalesced.setdefault(chat_id, {})
+    user_id = update.message.from_user.id
+    if coalesce and user_id in coalesced:
+        print(f"🔁 Сообщение сверх лимита заменяет предыдущее в пачке чата {chat_id}")
+        items[coalesced[user_id]] = item
+    else:
+        if coalesce:
+            coalesced[user_id] = len(items)
+        items.append(item)
     
-    with translation_lock:
-        # Отменяем предыдущий таймер для этого чата
-        if chat_id in translation_timers:
-            print(f"🔄 Отменяю предыдущий таймер для чата {chat_id}")
-            translation_timers[chat_id].cancel()
-            del translation_timers[chat_id]
-        
-        # Создаем новый таймер
-        timer = threading.Timer(2.0, delayed_translation, args=(update, context, text, is_mention, word_to_translate))
-        translation_timers[chat_id] = timer
-        timer.start()
-        
-        print(f"⏰ Запланирован перевод через 2 секунды для чата {chat_id}: '{text[:50]}...'")
+    # Пачка не копится бесконечно: ограничены и число сообщений, и ожидание первого
+    now = time.monotonic()
+    started = batch_started.setdefault(chat_id, now)
+    if len(items) >= MAX_BATCH_MESSAGES:
+        delay = 0.0
+    else:
+        delay = max(0.0, min(TRANSLATION_DELAY, started + MAX_BATCH_WAIT - now))
+    
+    # Перезапускаем таймер пачки; ранние сообщения остаются в ней
+    previous_task = translation_tasks.pop(chat_id, None)
+    if previous_task:
+        print(f"🔄 Перезапускаю таймер для чата {chat_id}: в пачке {len(items)} сообщений")
+        previous_task.cancel()
+    
+    # Создаем новую задачу
+    translation_tasks[chat_id] = context.application.create_task(
+        delayed_translation(context, chat_id, delay),
+        update=update
+    )
+    shutdown_drain.track(translation_tasks[chat_id], items)
+    
+    print(f"⏰ Запланирован перевод через {delay:g} с для чата {chat_id}: '{text[:50]}...'")
 
-def delayed_inline_translation(update: Update, context: CallbackContext, query: str):
+def inline_completion_results(query: str, fallback_tr: Optional[FallbackTranslator]) -> list:
+    """Подсказки: продолжения запроса, перевод которых уже известен"""
+    dictionary = fallback_tr.dictionary if fallback_tr else None
+    return [
+        InlineQueryResultArticle(
+            id=str(uuid4()),
+            title=f"💡 {phrase}",
+            input_message_content=InputTextMessageContent(be),
+            description=be[:120]
+        )
+        for phrase, be in inline_index.complete(query, dictionary=dictionary)
+    ]
+
+async def delayed_inline_translation(update: Update, context: ContextTypes.DEFAULT_TYPE, query: str):
     """Выполняет инлайн-перевод с задержкой"""
     user_id = update.inline_query.from_user.id
     
-    # Очищаем таймер после выполнения
-    with inline_lock:
-        if user_id in inline_timers:
-            del inline_timers[user_id]
+    # Ждем паузу во вводе: следующий запрос пользователя отменит задачу во время ожидания
+    await shutdown_drain.debounce(INLINE_TRANSLATION_DELAY)
+    
+    if inline_tasks.get(user_id) is asyncio.current_task():
+        del inline_tasks[user_id]
     
     try:
         google_tr, fallback_tr = ensure_translator()
         
         if google_tr:
             # Пробуем Google Translate
-            be = google_tr.translate_ru_to_be(query)
-            if be and not be.startswith("Памылка") and not be.startswith("Пераклад не знойдзены"):
+            result = await translate_with_cache(google_tr, query)
+            if result.found:
+                be = result.text
                 results = [
                     InlineQueryResultArticle(
                         id=str(uuid4()),
@@ -850,14 +1928,14 @@ def delayed_inline_translation(update: Update, context: CallbackContext, query:
                         input_message_content=InputTextMessageContent(be),
                         description=be[:120]
                     )
-                ]
-                update.inline_query.answer(results, cache_time=0, is_personal=True)
+                ] + inline_completion_results(query, fallback_tr)
+                await update.inline_query.answer(results, cache_time=0, is_personal=True)
+                await record_translation("inline", result)
                 return
         
         # Если Google не сработал, используем fallback
-        be = fallback_tr.translate_ru_to_be(query)
-        if not be or be.startswith("Пераклад не знойдзены"):
-            be = "Пераклад не атрымаўся"
+        result = fallback_tr.translate_ru_to_be(query)
+        be = result.text if result.found else "Пераклад не атрымаўся"
         
         results = [
             InlineQueryResultArticle(
@@ -866,8 +1944,9 @@ def delayed_inline_translation(update: Update, context: CallbackContext, query:
                 input_message_content=InputTextMessageContent(be),
                 description=be[:120]
             )
-        ]
-        update.inline_query.answer(results, cache_time=0, is_personal=True)
+        ] + inline_completion_results(query, fallback_tr)
+        await update.inline_query.answer(results, cache_time=0, is_personal=True)
+        await record_translation("inline", result)
         
     except Exception as e:
         print(f"❌ Ошибка в инлайн-переводе: {e}")
@@ -879,28 +1958,30 @@ def delayed_inline_translation(update: Update, context: CallbackContext, query:
                 description="Праверце тэкст і паспрабуйце зноў"
             )
         ]
-        update.inline_query.answer(results, cache_time=0, is_personal=True)
+        await update.inline_query.answer(results, cache_time=0, is_personal=True)
 
-def schedule_inline_translation(update: Update, context: CallbackContext, query: str):
+def schedule_inline_translation(update: Update, context: ContextTypes.DEFAULT_TYPE, query: str):
     """Планирует инлайн-перевод с задержкой 1 секунда"""
     user_id = update.inline_query.from_user.id
     
-    with inline_lock:
-        # Отменяем предыдущий таймер для этого пользователя
-        if user_id in inline_timers:
-            print(f"🔄 Отменяю предыдущий таймер для пользователя {user_id}")
-            inline_timers[user_id].cancel()
-            del inline_timers[user_id]
-        
-        # Создаем новый таймер
-        timer = threading.Timer(1.0, delayed_inline_translation, args=(update, context, query))
-        inline_timers[user_id] = timer
-        timer.start()
-        
-        print(f"⏰ Запланирован инлайн-перевод через 1 секунду для пользователя {user_id}: '{query}'")
+    # Отменяем предыдущий отложенный перевод для этого пользователя
+    previous_task = inline_tasks.pop(user_id, None)
+    if previous_task:
+        print(f"🔄 Отменяю предыдущий таймер для пользователя {user_id}")
+        previous_task.cancel()
+    
+    # Создаем новую задачу
+    inline_tasks[user_id] = context.application.create_task(
+        delayed_inline_translation(update, context, query),
+        update=update
+    )
+    # Инлайн-запрос после перезапуска уже не ответить: при остановке его можно только доработать
+    shutdown_drain.track(inline_tasks[user_id], None)
+    
+    print(f"⏰ Запланирован инлайн-перевод через 1 секунду для пользователя {user_id}: '{query}'")
 
 # Команды
-def start(update: Update, context: CallbackContext):
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     bot_username = context.bot.username
     msg = (
         "Прывітанне! Я перакладаю з рускай на беларускую праз Google Translate 🌐\n\n"
@@ -922,13 +2003,14 @@ def start(update: Update, context: CallbackContext):
         "/adminstats - детальная статистика\n"
         "/addadmin <id> - добавить админа\n"
         "/listadmins - список админов\n"
-        "/export - экспорт в CSV"
+        "/export - экспорт в CSV\n"
+        "/profile cpu|mem [секунды] - профилирование процесса"
     )
-    update.message.reply_text(msg)
+    await update.message.reply_text(msg)
 
-def help_cmd(update: Update, context: CallbackContext):
+async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     bot_username = context.bot.username
-    update.message.reply_text(
+    await update.message.reply_text(
         "📝 Спосабы выкарыстання:\n\n"
         "1️⃣ Пераклад поўнага тэксту:\n"
         "Напішыце мне рускі тэкст — я адкажу перакладам праз 2 секунды.\n\n"
@@ -947,23 +2029,27 @@ def help_cmd(update: Update, context: CallbackContext):
         "/adminstats - детальная статистика\n"
         "/addadmin <id> - добавить админа\n"
         "/listadmins - список админов\n"
-        "/export - экспорт в CSV"
+        "/export - экспорт в CSV\n"
+        "/profile cpu|mem [секунды] - профилирование процесса"
     )
 
-def status_cmd(update: Update, context: CallbackContext):
+async def status_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Проверяет статус переводчика"""
-    global translator, use_gemini_api, use_deepseek_api
+    global translator
     
-    if translator:
-        if use_deepseek_api:
+    if translator_starting:
+        msg = "⏳ Перакладчык запускаецца\n💡 Пакуль выкарыстоўваецца fallback перакладчык"
+    elif translator:
+        if translator_backend == "deepseek":
             msg = "✅ DeepSeek API перакладчык працуе\n\n"
             msg += "🧠 Крыніца: DeepSeek API\n"
             msg += "⚡ Хуткасць: онлайн пераклад\n"
             msg += "🎯 Точнасць: высокая\n"
             msg += "💰 Кошт: платны API (танней за Gemini)"
-        elif use_gemini_api:
+        elif translator_backend == "gemini":
             msg = "✅ Gemini API перакладчык працуе\n\n"
             msg += "🤖 Крыніца: Google Gemini API\n"
+            msg += f"🧩 Мадэль: {translator.model_name}\n"
             msg += "⚡ Хуткасць: онлайн пераклад\n"
             msg += "🎯 Точнасць: высокая\n"
             msg += "💰 Кошт: платны API (але танней за Google Translate)"
@@ -976,23 +2062,28 @@ def status_cmd(update: Update, context: CallbackContext):
     else:
         msg = "❌ Перакладчык не даступны\n💡 Выкарыстоўваецца fallback перакладчык"
     
-    update.message.reply_text(msg)
+    lookups = translation_cache_stats["hits"] + translation_cache_stats["misses"]
+    if lookups:
+        hit_rate = translation_cache_stats["hits"] * 100 / lookups
+        msg += f"\n\n🗄 Кэш перакладаў: {len(translation_cache)} запісаў, трапленні {hit_rate:.0f}%"
+    
+    await update.message.reply_text(msg)
 
-def stats_cmd(update: Update, context: CallbackContext):
+async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает статистику пользователей"""
-    summary = get_user_stats_summary()
-    update.message.reply_text(summary, parse_mode='Markdown')
+    summary = await run_db(get_user_stats_summary)
+    await update.message.reply_text(summary, parse_mode='Markdown')
 
-def my_stats_cmd(update: Update, context: CallbackContext):
+async def my_stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает статистику текущего пользователя"""
     user_id = update.message.from_user.id
     username = update.message.from_user.username
     first_name = update.message.from_user.first_name
     last_name = update.message.from_user.last_name
     
-    stats = get_user_personal_stats(user_id)
+    stats = await run_db(get_user_personal_stats, user_id)
     if not stats:
-        update.message.reply_text("📊 У вас пока нет статистики. Сделайте несколько запросов!")
+        await update.message.reply_text("📊 У вас пока нет статистики. Сделайте несколько запросов!")
         return
     
     msg = f"📊 **Ваша статистика**\n\n"
@@ -1011,19 +2102,19 @@ def my_stats_cmd(update: Update, context: CallbackContext):
         for req_type, req_text, req_time in stats['recent_requests']:
             msg += f"• {req_type}: {req_text[:30]}{'...' if len(req_text) > 30 else ''}\n"
     
-    update.message.reply_text(msg, parse_mode='Markdown')
+    await update.message.reply_text(msg, parse_mode='Markdown')
 
-def admin_stats_cmd(update: Update, context: CallbackContext):
+async def admin_stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Детальная статистика для админов"""
     user_id = update.message.from_user.id
     
-    if not is_admin(user_id):
-        update.message.reply_text("❌ У вас нет прав администратора")
+    if not await run_db(is_admin, user_id):
+        await update.message.reply_text("❌ У вас нет прав администратора")
         return
     
-    stats = get_detailed_stats()
+    stats = await run_db(get_detailed_stats)
     if not stats:
-        update.message.reply_text("❌ Ошибка получения статистики")
+        await update.message.reply_text("❌ Ошибка получения статистики")
         return
     
     msg = f"📊 **Детальная статистика (Админ)**\n\n"
@@ -1041,103 +2132,112 @@ def admin_stats_cmd(update: Update, context: CallbackContext):
         last_seen = last_activity[:16] if last_activity else "неизвестно"
         msg += f"{i}. {name}: {requests} запросов (последняя активность: {last_seen})\n"
     
-    update.message.reply_text(msg, parse_mode='Markdown')
+    if stats['backends']:
+        msg += "\n⏱ **Переводчики за сутки:**\n"
+        for backend, count, found, hits, average, network, slowest in stats['backends']:
+            msg += (f"• {backend}: {count} переводов, удачных {found * 100 / count:.0f}%, "
+                    f"из кэша {hits * 100 / count:.0f}%, в среднем {average:.0f} мс "
+                    f"(сеть {network:.0f} мс, максимум {slowest:.0f} мс)\n")
+    
+    pool = getattr(translator, "pool", None)
+    if isinstance(pool, ClientPool):
+        msg += f"\n🧵 Пул googletrans: {pool.describe()}\n"
+    
+    send_queue = context.bot.rate_limiter
+    if isinstance(send_queue, SendQueue):
+        msg += f"\n📤 Очередь отправки: {send_queue.describe()}\n"
+    
+    await update.message.reply_text(msg, parse_mode='Markdown')
 
-def add_admin_cmd(update: Update, context: CallbackContext):
+async def add_admin_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Добавляет админа"""
     user_id = update.message.from_user.id
     
-    if not is_admin(user_id):
-        update.message.reply_text("❌ У вас нет прав администратора")
+    if not await run_db(is_admin, user_id):
+        await update.message.reply_text("❌ У вас нет прав администратора")
         return
     
     if not context.args:
-        update.message.reply_text("❌ Укажите ID пользователя: /addadmin <user_id>")
+        await update.message.reply_text("❌ Укажите ID пользователя: /addadmin <user_id>")
         return
     
     try:
         new_admin_id = int(context.args[0])
         username = update.message.from_user.username
         
-        if add_admin(new_admin_id, username):
-            update.message.reply_text(f"✅ Пользователь {new_admin_id} добавлен в админы")
+        if await run_db(add_admin, new_admin_id, username):
+            await update.message.reply_text(f"✅ Пользователь {new_admin_id} добавлен в админы")
         else:
-            update.message.reply_text("❌ Ошибка добавления админа")
+            await update.message.reply_text("❌ Ошибка добавления админа")
     except ValueError:
-        update.message.reply_text("❌ Неверный формат ID пользователя")
+        await update.message.reply_text("❌ Неверный формат ID пользователя")
 
-def export_stats_cmd(update: Update, context: CallbackContext):
+async def export_stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Экспортирует статистику в CSV"""
     user_id = update.message.from_user.id
     
-    if not is_admin(user_id):
-        update.message.reply_text("❌ У вас нет прав администратора")
+    if not await run_db(is_admin, user_id):
+        await update.message.reply_text("❌ У вас нет прав администратора")
         return
     
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            
-            # Экспорт пользователей
-            cursor.execute('''
-                SELECT user_id, username, first_name, last_name, total_requests, 
-                       inline_requests, message_requests, mention_requests, 
-                       first_seen, last_activity
-                FROM users ORDER BY total_requests DESC
-            ''')
-            users_data = cursor.fetchall()
-            
-            csv_content = "user_id,username,first_name,last_name,total_requests,inline_requests,message_requests,mention_requests,first_seen,last_activity\n"
-            for row in users_data:
-                csv_content += ",".join(str(x) if x is not None else "" for x in row) + "\n"
-            
-            # Сохраняем в файл
-            with open("users_export.csv", "w", encoding="utf-8") as f:
-                f.write(csv_content)
-            
-            update.message.reply_text("✅ Статистика экспортирована в users_export.csv")
-            
+        await run_db(export_users_csv, "users_export.csv")
+        await update.message.reply_text("✅ Статистика экспортирована в users_export.csv")
+        
     except Exception as e:
-        update.message.reply_text(f"❌ Ошибка экспорта: {e}")
+        await update.message.reply_text(f"❌ Ошибка экспорта: {e}")
 
-def list_admins_cmd(update: Update, context: CallbackContext):
+async def list_admins_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает список админов"""
     user_id = update.message.from_user.id
     
-    if not is_admin(user_id):
-        update.message.reply_text("❌ У вас нет прав администратора")
+    if not await run_db(is_admin, user_id):
+        await update.message.reply_text("❌ У вас нет прав администратора")
         return
     
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT user_id, username, added_date
-                FROM admins ORDER BY added_date
-            ''')
-            admins_data = cursor.fetchall()
-            
-            if not admins_data:
-                update.message.reply_text("📋 Список админов пуст")
-                return
-            
-            msg = "📋 **Список администраторов:**\n\n"
-            for i, (admin_id, username, added_date) in enumerate(admins_data, 1):
-                added = added_date[:16] if added_date else "неизвестно"
-                msg += f"{i}. ID: `{admin_id}`\n"
-                msg += f"   Username: @{username or 'не указан'}\n"
-                msg += f"   Добавлен: {added}\n\n"
-            
-            update.message.reply_text(msg, parse_mode='Markdown')
-            
+        admins_data = await run_db(get_admins_list)
+        
+        if not admins_data:
+            await update.message.reply_text("📋 Список админов пуст")
+            return
+        
+        msg = "📋 **Список администраторов:**\n\n"
+        for i, (admin_id, username, added_date) in enumerate(admins_data, 1):
+            added = added_date[:16] if added_date else "неизвестно"
+            msg += f"{i}. ID: `{admin_id}`\n"
+            msg += f"   Username: @{username or 'не указан'}\n"
+            msg += f"   Добавлен: {added}\n\n"
+        
+        await update.message.reply_text(msg, parse_mode='Markdown')
+        
     except Exception as e:
-        update.message.reply_text(f"❌ Ошибка получения списка админов: {e}")
+        await update.message.reply_text(f"❌ Ошибка получения списка админов: {e}")
+
+async def profile_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Профилирует процесс N секунд и присылает результат файлом"""
+    user_id = update.message.from_user.id
+    
+    if not await run_db(is_admin, user_id):
+        await update.message.reply_text("❌ У вас нет прав администратора")
+        return
+    
+    try:
+        kind, seconds = parse_profile_args(context.args)
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+    if running_profile():
+        await update.message.reply_text(f"⏳ Уже идет профилирование {running_profile()}, дождитесь результата")
+        return
+    
+    await update.message.reply_text(f"🔬 Профилирование {kind} на {seconds:g} с, результат придет файлом")
+    # Обработчик не ждет профилирования: обновления продолжают обрабатываться
+    context.application.create_task(send_profile(update.message, kind, seconds))
 
 # Перевод обычных сообщений
-def on_text(update: Update, context: CallbackContext):
+async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
-    bot_username = context.bot.username
     
     # Логируем пользователя
     user_id = update.message.from_user.id
@@ -1147,42 +2247,21 @@ def on_text(update: Update, context: CallbackContext):
     
     print(f"📨 ПОЛУЧЕНО СООБЩЕНИЕ: '{text}'")
     
-    # Проверяем, есть ли упоминание бота через entities (для групп)
-    is_mentioned = False
-    phrase_after_mention = ""
+    # Ограничение частоты: один спамер не должен занимать переводчик
+    chat_id = update.message.chat_id
+    decision = admission.admit(user_id, chat_id, has_pending=chat_id in translation_tasks) if admission else None
+    if decision in (DROP, DROP_NOTIFY):
+        print(f"🚦 Сообщение от {user_id} в чате {chat_id} пропущено из-за лимита")
+        if decision == DROP_NOTIFY:
+            await update.message.reply_text(THROTTLED_NOTICE)
+        return
+    # При COALESCE сообщение попадает в уже запланированную пачку чата, но только
+    # последнее сверх лимита: оно заменяет предыдущее и в статистику не пишется
+    log_request = decision != COALESCE
     
-    if update.message.entities:
-        for entity in update.message.entities:
-            if entity.type == "mention":
-                # Извлекаем текст упоминания
-                mention_text = text[entity.offset:entity.offset + entity.length]
-                print(f"🔍 Найдено упоминание: '{mention_text}'")
-                
-                if f"@{bot_username}" in mention_text.lower():
-                    # Находим текст после упоминания
-                    text_after_mention = text[entity.offset + entity.length:].strip()
-                    if text_after_mention:
-                        phrase_after_mention = text_after_mention
-                        is_mentioned = True
-                        print(f"🔍 Текст после упоминания: '{phrase_after_mention}'")
-                        break
-    
-    # Если не нашли через entities, проверяем через регулярные выражения
-    if not is_mentioned:
-        # Проверяем, есть ли упоминание бота в тексте
-        mention_pattern = f"@{bot_username}\\s+(.+)"
-        mention_match = re.search(mention_pattern, text, re.IGNORECASE)
-        
-        # Также проверяем, есть ли упоминание без @ (для личных чатов)
-        simple_mention_pattern = f"{bot_username}\\s+(.+)"
-        simple_mention_match = re.search(simple_mention_pattern, text, re.IGNORECASE)
-        
-        if mention_match:
-            phrase_after_mention = mention_match.group(1).strip()
-            is_mentioned = True
-        elif simple_mention_match:
-            phrase_after_mention = simple_mention_match.group(1).strip()
-            is_mentioned = True
+    # Упоминание бота: через entities (в группах) или по имени в тексте, одним проходом
+    phrase_after_mention = mention_matcher(context.bot.username).find(text, update.message.entities)
+    is_mentioned = phrase_after_mention is not None
     
     if is_mentioned:
         # Если есть упоминание, переводим только последнее слово из фразы
@@ -1192,22 +2271,25 @@ def on_text(update: Update, context: CallbackContext):
         print(f"🔍 Планирую перевод слова: '{word_to_translate}' через 2 секунды")
         
         # Логируем упоминание
-        log_user_request(user_id, username, first_name, last_name, "mention", word_to_translate)
+        if log_request:
+            await run_db(log_user_request, user_id, username, first_name, last_name, "mention", word_to_translate)
         
         # Планируем перевод с задержкой
-        schedule_translation(update, context, text, is_mention=True, word_to_translate=word_to_translate)
+        schedule_translation(update, context, text, is_mention=True, word_to_translate=word_to_translate,
+                             coalesce=decision == COALESCE)
     else:
         # Если нет упоминания, переводим весь текст с задержкой
         print(f"🔍 Планирую перевод текста: '{text}' через 2 секунды")
         
         # Логируем обычное сообщение
-        log_user_request(user_id, username, first_name, last_name, "message", text)
+        if log_request:
+            await run_db(log_user_request, user_id, username, first_name, last_name, "message", text)
         
         # Планируем перевод с задержкой
-        schedule_translation(update, context, text, is_mention=False)
+        schedule_translation(update, context, text, is_mention=False, coalesce=decision == COALESCE)
 
 # Инлайн-режим
-def on_inline_query(update: Update, context: CallbackContext):
+async def on_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = (update.inline_query.query or "").strip()
     print(f"🔍 ИНЛАЙН ЗАПРОС: '{query}'")
     
@@ -1226,56 +2308,241 @@ def on_inline_query(update: Update, context: CallbackContext):
                 description="Я перакладу на беларускую праз Google Translate"
             )
         ]
-        update.inline_query.answer(results, cache_time=0, is_personal=True)
+        await update.inline_query.answer(results, cache_time=0, is_personal=True)
+        return
+
+    # Ограничение частоты: пока инлайн-перевод запланирован, новые символы лишь заменяют его
+    decision = admission.admit(user_id, has_pending=user_id in inline_tasks) if admission else None
+    if decision in (DROP, DROP_NOTIFY):
+        print(f"🚦 Инлайн-запрос от {user_id} пропущен из-за лимита")
+        if decision == DROP_NOTIFY:
+            results = [
+                InlineQueryResultArticle(
+                    id=str(uuid4()),
+                    title="Занадта шмат запытаў",
+                    input_message_content=InputTextMessageContent(THROTTLED_NOTICE),
+                    description="Пачакайце крыху і паспрабуйце зноў"
+                )
+            ]
+            await update.inline_query.answer(results, cache_time=0, is_personal=True)
+        return
+
+    # Знакомый текст отвечается сразу из памяти вместе с подсказками, без задержки и переводчика
+    # (на один инлайн-запрос Telegram принимает только один ответ)
+    if translator_ready and normalize_request_text(query) in translation_cache:
+        started = time.perf_counter()
+        result = cached_result(query)
+        be = result.text
+        previous_task = inline_tasks.pop(user_id, None)
+        if previous_task:
+            previous_task.cancel()
+        results = [
+            InlineQueryResultArticle(
+                id=str(uuid4()),
+                title="Пераклад на беларускую (Google)",
+                input_message_content=InputTextMessageContent(be),
+                description=be[:120]
+            )
+        ] + inline_completion_results(query, fallback_translator)
+        print(f"⚡ Инлайн-ответ из памяти за {(time.perf_counter() - started) * 1000:.1f} мс: '{query}'")
+        await update.inline_query.answer(results, cache_time=0, is_personal=True)
+        if decision != COALESCE:
+            await run_db(log_user_request, user_id, username, first_name, last_name, "inline", query)
+        await record_translation("inline", result)
         return
 
     # Логируем инлайн-запрос
-    log_user_request(user_id, username, first_name, last_name, "inline", query)
+    if decision != COALESCE:
+        await run_db(log_user_request, user_id, username, first_name, last_name, "inline", query)
 
     # Планируем инлайн-перевод с задержкой 1 секунда
     print(f"🔍 Планирую инлайн-перевод: '{query}' через 1 секунду")
     schedule_inline_translation(update, context, query)
 
-def error_handler(update: Update, context: CallbackContext):
+async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик ошибок"""
     print(f"Ошибка при обработке обновления: {context.error}")
 
+def restore_state():
+    """Заполняет кэши из снимка прошлого запуска и запоминает невыполненные переводы"""
+    global restored_translations
+    if not state_file:
+        return
+    state = load_snapshot(state_file)
+    if not state:
+        return
+    translation_cache.update(state.get("translation_cache", []))
+    sentence_cache.update(state.get("sentence_cache", []))
+    inline_index.restore(state.get("inline_index", []))
+    restored_translations = state.get("pending", [])
+    print(f"♻️ Из снимка восстановлено: {len(translation_cache)} переводов, {len(sentence_cache)} предложений, "
+          f"{len(restored_translations)} отложенных переводов")
+
+def save_state():
+    """Записывает кэши и не успевшие переводы в снимок для следующего запуска"""
+    if not state_file:
+        return
+    pending = [
+        {"update": update.to_dict(), "text": text, "is_mention": is_mention, "word": word_to_translate}
+        for update, text, is_mention, word_to_translate in unfinished_translations
+    ]
+    save_snapshot(state_file, {
+        "translation_cache": list(translation_cache.items()),
+        "sentence_cache": list(sentence_cache.items()),
+        "inline_index": inline_index.snapshot(),
+        "pending": pending,
+    })
+
+async def run_restored_translations(application: Application, pending: list):
+    """Повторяет переводы, не выполненные до перезапуска, когда основной переводчик готов"""
+    deadline = time.monotonic() + RESUME_TRANSLATOR_WAIT
+    while not translator_ready and time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+    for item in pending:
+        update = Update.de_json(item["update"], application.bot)
+        context = application.context_types.context.from_update(update, application)
+        schedule_translation(update, context, item["text"], item["is_mention"], item["word"])
+
+async def resume_translations(application: Application):
+    """Вызывается после запуска приложения: ставит в очередь переводы из снимка"""
+    global restored_translations
+    if restored_translations:
+        pending, restored_translations = restored_translations, []
+        application.create_task(run_restored_translations(application, pending))
+
+async def drain_translations(application: Application):
+    """Вызывается перед остановкой: отложенные переводы выполняются сразу, не успевшие попадут в снимок"""
+    for items in await shutdown_drain.drain(shutdown_deadline):
+        if items is not None:
+            unfinished_translations.extend(items)
+
+async def post_init(application: Application):
+    """Запускается после инициализации приложения, внутри цикла событий"""
+    # Кэши прошлого запуска: популярные фразы не ждут переводчика и прогрева
+    restore_state()
+    global missing_translations
+    missing_translations = open_missing_cache()
+    
+    # Прогреваем переводчик в фоне, чтобы первые пользователи не ждали
+    start_translator_warmup()
+    
+    # Затем кэш: популярные фразы не должны после перезапуска идти к переводчику
+    global warmup_task
+    if warmup_args and warmup_args.warmup_top > 0:
+        warmup_task = asyncio.create_task(cache_warmup_loop(warmup_args), name="cache-warmup")
+
+async def post_stop(application: Application):
+    """Останавливает фоновые задачи после остановки приема обновлений"""
+    if translator_health_task:
+        translator_health_task.cancel()
+    if warmup_task:
+        warmup_task.cancel()
+    if translator is not None and hasattr(translator, "close"):
+        await translator.close()
+    if missing_translations is not None:
+        missing_translations.save()
+    save_state()
+    db_executor.shutdown(wait=True)
+
+def apply_args(args: argparse.Namespace):
+    """Устанавливает глобальные флаги из аргументов командной строки"""
+    global translator_backend, use_streaming, warmup_args, state_file, shutdown_deadline, batch_reply
+    global googletrans_pool_size
+    if args.backend:
+        translator_backend = args.backend
+    elif args.deepseek:
+        translator_backend = "deepseek"
+    elif args.google_api:
+        translator_backend = "gemini"
+    use_streaming = args.stream
+    batch_reply = args.batch_reply
+    googletrans_pool_size = args.pool_size
+    warmup_args = args
+    state_file = snapshot_path(args)
+    shutdown_deadline = args.shutdown_deadline
+
+def build_application(args: argparse.Namespace) -> Application:
+    """Создает приложение с обработчиками; вызывается и в основном процессе, и в каждом воркере"""
+    # Воркеры запускаются через spawn и не наследуют глобальные флаги
+    apply_args(args)
+    token = load_or_ask_token()
+    
+    # Лимиты запросов: для платных бэкендов строже
+    global admission
+    admission = AdmissionController(
+        args.user_rate, args.user_burst, args.chat_rate, args.chat_burst,
+        cost=TRANSLATOR_BACKENDS[translator_backend]['cost'],
+    )
+    
+    # Создаем асинхронное приложение
+    application = (
+        Application.builder()
+        .token(token)
+        .application_class(SnapshotApplication, {"on_start": resume_translations, "on_stop": drain_translations})
+        .rate_limiter(SendQueue(args.workers))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .build()
+    )
+    
+    # Добавляем обработчики
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_cmd))
+    application.add_handler(CommandHandler("status", status_cmd))
+    application.add_handler(CommandHandler("stats", stats_cmd))
+    application.add_handler(CommandHandler("mystats", my_stats_cmd))
+    application.add_handler(CommandHandler("adminstats", admin_stats_cmd))
+    application.add_handler(CommandHandler("addadmin", add_admin_cmd))
+    application.add_handler(CommandHandler("listadmins", list_admins_cmd))
+    application.add_handler(CommandHandler("export", export_stats_cmd))
+    application.add_handler(CommandHandler("profile", profile_cmd))
+    application.add_handler(InlineQueryHandler(on_inline_query))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, on_text))
+    
+    # Добавляем обработчик ошибок
+    application.add_error_handler(error_handler)
+    return application
+
 def main():
     # Парсинг аргументов командной строки
     parser = argparse.ArgumentParser(description='Telegram бот для перевода с русского на белорусский')
+    parser.add_argument('--backend', choices=sorted(TRANSLATOR_BACKENDS),
+                       help=f'Бэкенд перевода (по умолчанию {DEFAULT_BACKEND})')
     parser.add_argument('-google', '--google-api', action='store_true', 
-                       help='Использовать Gemini API вместо библиотеки googletrans')
+                       help='Использовать Gemini API вместо библиотеки googletrans (то же, что --backend gemini)')
     parser.add_argument('--deepseek', action='store_true',
-                       help='Использовать DeepSeek API вместо библиотеки googletrans')
+                       help='Использовать DeepSeek API вместо библиотеки googletrans (то же, что --backend deepseek)')
+    parser.add_argument('--stream', action='store_true',
+                       help='Показывать перевод DeepSeek/Gemini по мере генерации (редактированием сообщения)')
+    parser.add_argument('--pool-size', type=int,
+                       default=int(read_env_setting("GOOGLETRANS_POOL_SIZE") or DEFAULT_POOL_SIZE),
+                       help=f'Сколько клиентов googletrans переводят одновременно (GOOGLETRANS_POOL_SIZE, по умолчанию {DEFAULT_POOL_SIZE})')
+    parser.add_argument('--batch-reply', choices=['each', 'combined'], default=read_env_setting("BATCH_REPLY") or "each",
+                       help='Ответ на пачку сообщений за паузу во вводе: на каждое (each) или одним сообщением (combined); BATCH_REPLY')
+    parser.add_argument('--profile-startup', action='store_true',
+                       help='Показать время импорта и память по модулям и выйти')
+    add_webhook_arguments(parser)
+    add_worker_arguments(parser)
+    add_rate_limit_arguments(parser)
+    add_warmup_arguments(parser)
+    add_snapshot_arguments(parser, STATE_FILE, drain=True)
     args = parser.parse_args()
     
     # Устанавливаем глобальные флаги
-    global use_gemini_api, use_deepseek_api
-    use_gemini_api = args.google_api
-    use_deepseek_api = args.deepseek
-    
-    # Проверяем доступность нужных библиотек
-    if use_deepseek_api:
-        if not DEEPSEEK_API_AVAILABLE:
-            print("❌ DeepSeek API не доступен. Установите: pip install openai")
-            sys.exit(1)
-    elif use_gemini_api:
-        if not GEMINI_API_AVAILABLE:
-            print("❌ Gemini API не доступен. Установите: pip install google-generativeai")
-            sys.exit(1)
-    else:
-        if not GOOGLE_LIBRARY_AVAILABLE:
-            print("❌ Google Translate Library не доступен. Установите: pip install googletrans==4.0.0rc1")
-            sys.exit(1)
+    apply_args(args)
     
-    token = load_or_ask_token()
+    if args.profile_startup:
+        profile_startup(translator_backend)
+        return
     
-    # Создаем Updater для старой версии API
-    updater = Updater(token=token, use_context=True)
-    dispatcher = updater.dispatcher
+    # Проверяем доступность SDK выбранного бэкенда (без импорта)
+    backend = TRANSLATOR_BACKENDS[translator_backend]
+    if not is_backend_available(translator_backend):
+        print(f"❌ {backend['title']} не доступен. Установите: pip install {backend['pip_name']}")
+        sys.exit(1)
     
+    token = load_or_ask_token()
     print(f"🔧 Токен: {token[:10]}...")
-    print(f"🔧 Updater создан")
     
     # Инициализируем базу данных
     init_database()
@@ -1286,44 +2553,29 @@ def main():
         add_admin(admin_id, f"admin_{admin_id}")
         print(f"✅ Добавлен админ: {admin_id}")
     
-    # Добавляем обработчики
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(CommandHandler("help", help_cmd))
-    dispatcher.add_handler(CommandHandler("status", status_cmd))
-    dispatcher.add_handler(CommandHandler("stats", stats_cmd))
-    dispatcher.add_handler(CommandHandler("mystats", my_stats_cmd))
-    dispatcher.add_handler(CommandHandler("adminstats", admin_stats_cmd))
-    dispatcher.add_handler(CommandHandler("addadmin", add_admin_cmd))
-    dispatcher.add_handler(CommandHandler("listadmins", list_admins_cmd))
-    dispatcher.add_handler(CommandHandler("export", export_stats_cmd))
-    dispatcher.add_handler(InlineQueryHandler(on_inline_query))
-    dispatcher.add_handler(MessageHandler(Filters.text & ~Filters.command, on_text))
-    
-    # Добавляем обработчик ошибок
-    dispatcher.add_error_handler(error_handler)
-
     # Показываем информацию о режиме работы
-    if use_deepseek_api:
-        print("🧠 Бот перакладу праз DeepSeek API запущен. Наберите Ctrl+C для остановки.")
-        print("💡 Выкарыстоўваю DeepSeek API для перакладу...")
-    elif use_gemini_api:
-        print("🤖 Бот перакладу праз Gemini API запущен. Наберите Ctrl+C для остановки.")
-        print("💡 Выкарыстоўваю Gemini API для перакладу...")
-    else:
-        print("📚 Бот перакладу праз Google Translate Library запущен. Наберите Ctrl+C для остановки.")
-        print("💡 Выкарыстоўваю Google Translate Library для перакладу...")
+    print(f"{backend['emoji']} Бот перакладу праз {backend['title']} запущен. Наберите Ctrl+C для остановки.")
+    print(f"💡 Выкарыстоўваю {backend['title']} для перакладу...")
+    
+    # Многопроцессный режим: супервизор раздает обновления воркерам по chat_id
+    if args.workers > 0:
+        run_supervisor(build_application, args, token, allowed_updates=["message", "inline_query"])
+        return
     
-    # Запускаем бота
+    application = build_application(args)
+    print("🔧 Приложение создано")
+    
+    # Запускаем бота: webhook или long polling
     try:
-        updater.start_polling()
-        updater.idle()
+        if args.webhook:
+            run_webhook(application, args, allowed_updates=["message", "inline_query"])
+        else:
+            application.run_polling(allowed_updates=["message", "inline_query"])
     except KeyboardInterrupt:
+        # Статистика пишется в БД при каждом запросе, кэши — в снимок в post_stop
         print("\n🛑 Остановка бота...")
-        save_user_stats()
-        print("📊 Статистика сохранена")
     except Exception as e:
         print(f"Критическая ошибка: {e}")
-        save_user_stats()
 
 if __name__ == "__main__":
     main()
@@ -1,16 +1,38 @@
 import os
 import sys
+import asyncio
 import threading
+import sqlite3
 import requests
 import re
 import time
-from typing import Optional
+import argparse
+from typing import Optional, Tuple
 from urllib.parse import quote
+from email.utils import parsedate_to_datetime
 
 from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
+from telegram.constants import ChatAction
+from telegram.error import TelegramError
 from telegram.ext import Application, CommandHandler, MessageHandler, InlineQueryHandler, filters, ContextTypes
 from uuid import uuid4
 
+from phrase_matcher import PhraseMatcher, split_phrase
+from compact_dict import open_fallback_dictionary
+from fuzzy_index import SymSpellIndex, open_fuzzy_index
+from lemmatizer import lemma_candidates
+from prefix_index import PrefixIndex
+from mention_matcher import mention_matcher
+from send_queue import SendQueue
+from http_cache import PageCache, DEFAULT_CACHE_FILE, DEFAULT_TTL
+from negative_cache import NegativeCache, DEFAULT_CACHE_FILE as DEFAULT_MISSING_FILE
+from translation_result import TranslationResult, TranslationStatus, CacheStatus, timed
+from state_snapshot import add_snapshot_arguments, snapshot_path, load_snapshot, save_snapshot
+from webhook_server import add_webhook_arguments, read_env_setting, run_webhook
+from worker_pool import add_worker_arguments, run_supervisor
+from profiler import parse_profile_args, running_profile, send_profile
+from rate_limit import AdmissionController, add_rate_limit_arguments, DROP, DROP_NOTIFY, THROTTLED_NOTICE
+
 ENV_PATH = ".env"
 
 def load_or_ask_token() -> str:
@@ -40,7 +62,98 @@ def load_or_ask_token() -> str:
     os.environ["TELEGRAM_BOT_TOKEN"] = token
     return token
 
+# Общий лимит исходящих запросов к skarnik.by
+SKARNIK_MAX_RPS = 2.0          # Запросов в секунду на процесс
+SKARNIK_MAX_IN_FLIGHT = 4      # Одновременных запросов
+SKARNIK_QUEUE_DEADLINE = 20.0  # Сколько запрос может ждать своей очереди, секунд
+SKARNIK_DEFAULT_RETRY_AFTER = 5.0
+
+class OutboundLimiter:
+    """Лимит запросов к одному хосту, общий для всех потоков процесса.
+
+    Запросы стартуют не чаще rate в секунду и не больше max_in_flight
+    одновременно. Ответ 429 с Retry-After ставит на паузу всех, а не только
+    получившего его: остальные не добивают сайт во время блокировки.
+    """
+
+    def __init__(self, rate: float, max_in_flight: int):
+        self.interval = 1.0 / rate
+        self.max_in_flight = max_in_flight
+        self.condition = threading.Condition()
+        self.next_start = 0.0
+        self.paused_until = 0.0
+        self.in_flight = 0
+
+    def scale(self, factor: float):
+        """Делит лимит между процессами-воркерами"""
+        with self.condition:
+            self.interval /= factor
+            self.max_in_flight = max(1, int(self.max_in_flight * factor))
+
+    def acquire(self, deadline: float) -> bool:
+        """Ждет своей очереди до deadline (time.monotonic); False — не дождались"""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    return False
+                start_at = max(self.next_start, self.paused_until)
+                if self.in_flight < self.max_in_flight and now >= start_at:
+                    self.in_flight += 1
+                    # Равномерный темп вместо пачек: следующий старт не раньше чем через interval
+                    self.next_start = max(now, self.next_start) + self.interval
+                    return True
+                wake_at = deadline if self.in_flight >= self.max_in_flight else min(start_at, deadline)
+                self.condition.wait(wake_at - now)
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def pause(self, seconds: float):
+        """Останавливает все запросы к хосту на seconds секунд"""
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.condition.notify_all()
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    """Retry-After бывает числом секунд или HTTP-датой"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+skarnik_limiter = OutboundLimiter(SKARNIK_MAX_RPS, SKARNIK_MAX_IN_FLIGHT)
+
 # Переводчик через онлайн-словарь Skarnik
+def open_page_cache() -> Optional[PageCache]:
+    """Кэш страниц Skarnik из SKARNIK_CACHE (по умолчанию skarnik_cache.db; off — без кэша)"""
+    path = read_env_setting("SKARNIK_CACHE") or DEFAULT_CACHE_FILE
+    if path.lower() == "off":
+        return None
+    ttl_days = read_env_setting("SKARNIK_CACHE_TTL_DAYS")
+    try:
+        cache = PageCache(path, float(ttl_days) * 24 * 3600 if ttl_days else DEFAULT_TTL)
+    except (sqlite3.Error, ValueError) as e:
+        print(f"⚠️ Не удалось открыть кэш страниц {path}: {e}")
+        return None
+    print(f"🗄 Кэш страниц Skarnik {path}: {len(cache)} страниц")
+    return cache
+
+def open_negative_cache() -> Optional[NegativeCache]:
+    """Кэш отсутствующих слов из SKARNIK_MISSING_CACHE (по умолчанию skarnik_missing.bin; off — без кэша)"""
+    path = read_env_setting("SKARNIK_MISSING_CACHE") or DEFAULT_MISSING_FILE
+    if path.lower() == "off":
+        return None
+    return NegativeCache(path)
+
 class SkarnikTranslator:
     def __init__(self):
         self.base_url = "https://www.skarnik.by/search"
@@ -54,18 +167,97 @@ class SkarnikTranslator:
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
         })
+        # Скачанные страницы: повторный поиск слова не ходит в сеть
+        self.cache = open_page_cache()
+        # Слова, которых в словаре нет: повторный запрос не идет на сайт
+        self.missing = open_negative_cache()
         print("✅ Skarnik переводчик инициализирован")
 
-    def translate_ru_to_be(self, text: str, max_len: int = 512) -> str:
+    def translate_ru_to_be(self, text: str, max_len: int = 512) -> TranslationResult:
         text = text.strip()
         if not text:
-            return ""
+            return TranslationResult("", TranslationStatus.NOT_FOUND, "skarnik")
+        
+        # Skarnik знает только словарные формы: для одного слова после исходной
+        # формы пробуем начальные формы по убыванию вероятности, до первого попадания
+        candidates = [text]
+        if " " not in text:
+            candidates += lemma_candidates(text)
+        
+        # Время и попытки всех форм складываются: пользователь ждал их все
+        timings = {}
+        attempts = 0
+        cache = CacheStatus.NONE
+        for candidate in candidates:
+            if self.missing is not None and self.missing.is_missing(candidate):
+                print(f"🚫 '{candidate}' недавно не нашлось в Skarnik, не ищу снова")
+                cache = CacheStatus.NEGATIVE
+                continue
+            result = self._lookup(candidate)
+            attempts += result.attempts
+            for phase, seconds in result.timings.items():
+                timings[phase] = timings.get(phase, 0.0) + seconds
+            if result.status is not TranslationStatus.NOT_FOUND:
+                # Перевод найден или Skarnik недоступен: другие формы не ищем
+                if result.found and candidate != text:
+                    print(f"📖 Найдено по начальной форме: '{text}' → '{candidate}'")
+                result.attempts = attempts
+                result.timings = timings
+                return result
+            cache = result.cache
+            if self.missing is not None:
+                self.missing.add(candidate)
+        return TranslationResult(f"Пераклад не знойдзены для: {text}", TranslationStatus.NOT_FOUND,
+                                 "skarnik", cache, attempts, timings)
+
+    def _translation_from_page(self, html_content: str, text: str, cache: CacheStatus,
+                               attempts: int, timings: dict) -> TranslationResult:
+        with timed(timings, "parse"):
+            translation = self._parse_skarnik_response(html_content, text)
+        if translation:
+            return TranslationResult(translation, TranslationStatus.OK, "skarnik", cache, attempts, timings)
+        return TranslationResult(f"Пераклад не знойдзены для: {text}", TranslationStatus.NOT_FOUND,
+                                 "skarnik", cache, attempts, timings)
+
+    @staticmethod
+    def _failure(message: str, attempts: int, timings: dict, error: str) -> TranslationResult:
+        return TranslationResult(message, TranslationStatus.ERROR, "skarnik", CacheStatus.NONE,
+                                 attempts, timings, error)
+
+    def _lookup(self, text: str) -> TranslationResult:
+        """Один поиск на skarnik.by с повторами при сетевых ошибках"""
+        timings = {}
+        with timed(timings, "cache"):
+            cached = self.cache.get(text) if self.cache is not None else None
+        if cached and cached.fresh:
+            self.cache.stats["hits"] += 1
+            print(f"🗄 Страница из кэша: {text}")
+            return self._translation_from_page(cached.body, text, CacheStatus.HIT, 0, timings)
         
+        result = self._fetch(text, cached, timings)
+        if result.status is TranslationStatus.ERROR and cached:
+            # Сайт недоступен — устаревшая страница лучше ошибки
+            self.cache.stats["stale"] += 1
+            print(f"🗄 Skarnik недоступен, отдаю устаревшую страницу: {text}")
+            return self._translation_from_page(cached.body, text, CacheStatus.STALE, result.attempts, timings)
+        return result
+
+    def _fetch(self, text: str, cached, timings: dict) -> TranslationResult:
+        """Запрос к skarnik.by (условный, если есть устаревшая копия) с повторами при сетевых ошибках"""
         # Retry логика для сетевых запросов
         max_retries = 3
         retry_delay = 1
+        deadline = time.monotonic() + SKARNIK_QUEUE_DEADLINE
+        cache = CacheStatus.MISS if self.cache is not None else CacheStatus.NONE
         
         for attempt in range(max_retries):
+            # Ждем разрешения общего лимита; пока ждем, слот не занимаем
+            with timed(timings, "queue"):
+                admitted = skarnik_limiter.acquire(deadline)
+            if not admitted:
+                print(f"⏳ Skarnik перегружен, запрос '{text}' не дождался очереди")
+                return self._failure("Памылка: Skarnik перагружаны, паспрабуйце пазней", attempt, timings,
+                                     "очередь запросов к Skarnik")
             try:
                 # Кодируем текст для URL
                 encoded_text = quote(text)
@@ -78,53 +270,72 @@ class SkarnikTranslator:
                     print(f"📡 URL: {search_url}")
                 
                 # Отправляем запрос с увеличенным timeout
-                response = self.session.get(
-                    search_url, 
-                    timeout=15,  # Увеличиваем timeout
-                    allow_redirects=True
-                )
+                try:
+                    with timed(timings, "network"):
+                        response = self.session.get(
+                            search_url, 
+                            headers=PageCache.conditional_headers(cached),
+                            timeout=15,  # Увеличиваем timeout
+                            allow_redirects=True
+                        )
+                finally:
+                    skarnik_limiter.release()
+                
+                if response.status_code == 304 and cached:
+                    # Страница не изменилась: тело не передавалось
+                    self.cache.touch(text)
+                    self.cache.stats["revalidated"] += 1
+                    print(f"🗄 Страница не изменилась: {text}")
+                    return self._translation_from_page(cached.body, text, CacheStatus.REVALIDATED,
+                                                       attempt + 1, timings)
                 response.raise_for_status()
                 
-                # Парсим ответ
-                translation = self._parse_skarnik_response(response.text, text)
+                if self.cache is not None:
+                    self.cache.stats["misses"] += 1
+                    self.cache.store(text, response.url, response.text,
+                                     response.headers.get("ETag"), response.headers.get("Last-Modified"))
                 
-                if translation:
-                    return translation
-                else:
-                    return f"Пераклад не знойдзены для: {text}"
+                # Парсим ответ
+                return self._translation_from_page(response.text, text, cache, attempt + 1, timings)
                     
             except requests.exceptions.Timeout:
                 if attempt < max_retries - 1:
                     print(f"⏰ Таймаут, повторная попытка {attempt + 2}/{max_retries}...")
-                    time.sleep(retry_delay)
+                    # Пауза перед повтором — тоже ожидание, а не работа сети
+                    with timed(timings, "queue"):
+                        time.sleep(retry_delay)
                     retry_delay *= 2  # Экспоненциальная задержка
                     continue
-                return "Памылка: пераўзыход часу чакання"
+                return self._failure("Памылка: пераўзыход часу чакання", attempt + 1, timings, "таймаут")
                 
-            except requests.exceptions.ConnectionError:
+            except requests.exceptions.ConnectionError as e:
                 if attempt < max_retries - 1:
                     print(f"🌐 Ошибка подключения, повторная попытка {attempt + 2}/{max_retries}...")
-                    time.sleep(retry_delay)
+                    with timed(timings, "queue"):
+                        time.sleep(retry_delay)
                     retry_delay *= 2
                     continue
-                return "Памылка: няма злучэння з Skarnik"
+                return self._failure("Памылка: няма злучэння з Skarnik", attempt + 1, timings, str(e))
                 
             except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 429:  # Too Many Requests
+                if e.response.status_code in (429, 503):  # Too Many Requests / Service Unavailable
+                    # Пауза общая для всех запросов процесса; повтор сам дождется ее конца
+                    pause = parse_retry_after(e.response.headers.get("Retry-After"), SKARNIK_DEFAULT_RETRY_AFTER)
+                    skarnik_limiter.pause(pause)
                     if attempt < max_retries - 1:
-                        print(f"🚫 Слишком много запросов, ждем {retry_delay}с...")
-                        time.sleep(retry_delay)
-                        retry_delay *= 2
+                        print(f"🚫 Слишком много запросов, все запросы к Skarnik ждут {pause:.1f}с...")
                         continue
-                    return "Памылка: занадта шмат запытаў"
+                    return self._failure("Памылка: занадта шмат запытаў", attempt + 1, timings,
+                                         f"HTTP {e.response.status_code}")
                 else:
-                    return f"Памылка HTTP: {e.response.status_code}"
+                    return self._failure(f"Памылка HTTP: {e.response.status_code}", attempt + 1, timings,
+                                         f"HTTP {e.response.status_code}")
                     
             except Exception as e:
                 print(f"Ошибка перевода: {e}")
-                return f"Памылка перакладу: {e}"
+                return self._failure(f"Памылка перакладу: {e}", attempt + 1, timings, str(e))
         
-        return "Памылка: не ўдалося атрымаць пераклад"
+        return self._failure("Памылка: не ўдалося атрымаць пераклад", max_retries, timings, "повторы исчерпаны")
 
     def _parse_skarnik_response(self, html_content: str, original_text: str) -> str:
         """Парсит HTML ответ от Skarnik и извлекает перевод"""
@@ -227,27 +438,131 @@ class FallbackTranslator:
             "где ты": "дзе ты",
             "когда придешь": "калі прыйдзеш"
         }
+        # Словарь компилируется в автомат один раз: поиск фраз линеен по длине текста
+        self.matcher = PhraseMatcher(self.translations)
+        # Большой словарь на диске (собирается compact_dict.py), общий для всех процессов
+        self.dictionary = open_fallback_dictionary()
+        # Индекс опечаток: встроенные слова в памяти, большой словарь — с диска (если собран с --fuzzy)
+        self.fuzzy = SymSpellIndex(self.matcher.single_words, disk_index=open_fuzzy_index())
     
-    def translate_ru_to_be(self, text: str, max_len: int = 512) -> str:
-        text = text.strip().lower()
+    def translate_ru_to_be(self, text: str, max_len: int = 512) -> TranslationResult:
+        text = text.strip()
+        timings = {}
         if not text:
-            return ""
+            return TranslationResult("", TranslationStatus.NOT_FOUND, "fallback")
         
-        # Ищем точные совпадения
-        if text in self.translations:
-            return self.translations[text]
-        
-        # Ищем частичные совпадения
-        for ru, be in self.translations.items():
-            if ru in text:
-                return f"Частковы пераклад: {be} (для '{ru}')"
-        
-        return "Пераклад не знойдзены ў базе. Паспрабуйте іншы тэкст."
+        # Самые длинные фразы словаря в предложении, ненайденные слова помечены
+        with timed(timings, "parse"):
+            result, matched_words, total_words = self.matcher.translate(text, self.dictionary, self.fuzzy)
+        if matched_words == 0:
+            return TranslationResult("Пераклад не знойдзены ў базе. Паспрабуйте іншы тэкст.",
+                                     TranslationStatus.NOT_FOUND, "fallback", attempts=1, timings=timings)
+        if matched_words < total_words:
+            return TranslationResult(f"Частковы пераклад: {result}", TranslationStatus.PARTIAL, "fallback",
+                                     attempts=1, timings=timings)
+        return TranslationResult(result, TranslationStatus.OK, "fallback", attempts=1, timings=timings)
+    
+    def correct_term(self, term: str) -> str:
+        """Исправляет опечатку в одном слове, которое не нашлось в Skarnik"""
+        # Без большого словаря исправлять опасно: правильное слово, которого нет
+        # среди нескольких десятков встроенных, «исправилось» бы в соседнее
+        if self.fuzzy.disk_index is None:
+            return term
+        words = split_phrase(term)
+        if len(words) != 1:
+            return term
+        # Индекс опечаток знает только заголовки словаря: словоформа известного
+        # слова («кота», «стола») — не опечатка, а «кода» и «стала» — другие слова
+        if self.matcher.word_translation(words[0], self.dictionary) is not None:
+            return term
+        match = self.fuzzy.lookup(words[0])
+        if match is None or match[1] == 0:
+            return term
+        print(f"🔤 Исправляю опечатку: '{term}' → '{match[0]}'")
+        return match[0]
 
 translator: Optional[SkarnikTranslator] = None
 fallback_translator: Optional[FallbackTranslator] = None
 translator_lock = threading.Lock()
 
+# Ограничение частоты входящих запросов (создается в build_application)
+admission: Optional[AdmissionController] = None
+
+# Подсказки в инлайн-режиме: найденные в Skarnik слова и заголовки словаря
+inline_index = PrefixIndex()
+
+# Снимок состояния при перезапуске: найденные слова остаются мгновенными подсказками
+STATE_FILE = "bot_skarnik_state.json"
+state_file: Optional[str] = None
+
+# Админы (ADMIN_USER_IDS в окружении/.env): им доступна команда /profile
+admin_ids = set()
+
+def load_admin_ids() -> set:
+    value = read_env_setting("ADMIN_USER_IDS") or ""
+    try:
+        return {int(admin_id) for admin_id in value.split(",") if admin_id.strip()}
+    except ValueError as e:
+        print(f"❌ Ошибка парсинга ADMIN_USER_IDS: {e}")
+        return set()
+
+def is_admin(user_id: int) -> bool:
+    return user_id in admin_ids
+
+# Статистика переводов по переводчикам: бэкенд → [переводов, найдено, суммарное время]
+translation_stats = {}
+
+def record_translation(result: TranslationResult):
+    """Пишет в лог и статистику, какой переводчик ответил и за сколько"""
+    print(f"⏱ {result.describe()}")
+    stats = translation_stats.setdefault(result.backend, [0, 0, 0.0])
+    stats[0] += 1
+    stats[1] += result.found
+    stats[2] += result.total_time
+
+def load_fallback_translator() -> FallbackTranslator:
+    """Создает fallback переводчик и добавляет его словарь в инлайн-подсказки"""
+    fallback = FallbackTranslator()
+    for phrase, be in fallback.translations.items():
+        inline_index.add(phrase, be, weight=0)
+    return fallback
+
+def inline_completion_results(query: str, fallback_tr: Optional[FallbackTranslator]) -> list:
+    """Подсказки: продолжения запроса, перевод которых уже известен"""
+    dictionary = fallback_tr.dictionary if fallback_tr else None
+    return [
+        InlineQueryResultArticle(
+            id=str(uuid4()),
+            title=f"💡 {phrase}",
+            input_message_content=InputTextMessageContent(be),
+            description=be[:120]
+        )
+        for phrase, be in inline_index.complete(query, dictionary=dictionary)
+    ]
+
+def lookup_term(skarnik_tr: SkarnikTranslator, fallback_tr: FallbackTranslator,
+                term: str) -> Tuple[str, TranslationResult]:
+    """Ищет текст в Skarnik как есть и по начальным формам, опечатку исправляет только после промаха
+
+    Возвращает слово, перевод которого найден (исправленное или исходное), и результат.
+    Исправление идет по заголовкам словаря, поэтому правильная словоформа,
+    исправленная до поиска, превратилась бы в другое слово («кота» → «кода»).
+    """
+    result = skarnik_tr.translate_ru_to_be(term)
+    if result.status is not TranslationStatus.NOT_FOUND:
+        return term, result
+    corrected = fallback_tr.correct_term(term)
+    if corrected == term:
+        return term, result
+    corrected_result = skarnik_tr.translate_ru_to_be(corrected)
+    if not corrected_result.found:
+        return term, result
+    # Пользователь ждал оба поиска
+    corrected_result.attempts += result.attempts
+    for phase, seconds in result.timings.items():
+        corrected_result.timings[phase] = corrected_result.timings.get(phase, 0.0) + seconds
+    return corrected, corrected_result
+
 async def ensure_translator():
     global translator, fallback_translator
     
@@ -256,18 +571,79 @@ async def ensure_translator():
             if translator is None:
                 try:
                     translator = SkarnikTranslator()
-                    fallback_translator = FallbackTranslator()
+                    fallback_translator = load_fallback_translator()
                 except Exception as e:
                     print(f"Не удалось инициализировать Skarnik переводчик: {e}")
                     print("Использую fallback переводчик...")
                     translator = None
-                    fallback_translator = FallbackTranslator()
+                    fallback_translator = load_fallback_translator()
     
     return translator, fallback_translator
 
+# Заглушка «Шукаю пераклад...» показывается, только если перевод занимает дольше
+PLACEHOLDER_DELAY = 1.5
+
+class DeferredReply:
+    """Ответ на сообщение за один вызов Bot API, когда перевод быстрый
+
+    Сразу отправляется индикатор «печатает». Если ответ не готов через
+    PLACEHOLDER_DELAY секунд, появляется заглушка, и готовый ответ заменяет
+    ее редактированием, а не удалением и новым сообщением.
+    """
+
+    def __init__(self, message, placeholder: str, delay: float = PLACEHOLDER_DELAY):
+        self.message = message
+        self.placeholder = placeholder
+        self.delay = delay
+        self.placeholder_task: Optional[asyncio.Task] = None
+        self.placeholder_sending = False
+
+    async def __aenter__(self):
+        try:
+            await self.message.reply_chat_action(ChatAction.TYPING)
+        except TelegramError as e:
+            print(f"⚠️ Не удалось отправить индикатор набора: {e}")
+        self.placeholder_task = asyncio.create_task(self._send_placeholder())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.placeholder_task and not self.placeholder_sending:
+            self.placeholder_task.cancel()
+        return False
+
+    async def _send_placeholder(self):
+        await asyncio.sleep(self.delay)
+        self.placeholder_sending = True
+        return await self.message.reply_text(self.placeholder)
+
+    async def _take_placeholder(self):
+        """Заглушка, если она уже отправлена или отправляется; иначе отменяет ее"""
+        task = self.placeholder_task
+        self.placeholder_task = None
+        if task is None:
+            return None
+        if not self.placeholder_sending:
+            task.cancel()
+            return None
+        try:
+            return await task
+        except TelegramError:
+            return None
+
+    async def send(self, text: str):
+        """Отправляет ответ: редактирует заглушку или, если ее нет, отвечает на сообщение"""
+        placeholder = await self._take_placeholder()
+        if placeholder is not None:
+            try:
+                await placeholder.edit_text(text)
+                return
+            except TelegramError as e:
+                print(f"⚠️ Не удалось отредактировать заглушку: {e}")
+        await self.message.reply_text(text)
+
 # Команды
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    bot_username = (await context.bot.get_me()).username
+    bot_username = context.bot.username
     msg = (
         "Прывітанне! Я перакладаю з рускай на беларускую праз Skarnik 🎯\n\n"
         "📝 Спосабы выкарыстання:\n"
@@ -286,7 +662,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(msg)
 
 async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    bot_username = (await context.bot.get_me()).username
+    bot_username = context.bot.username
     await update.message.reply_text(
         "📝 Спосабы выкарыстання:\n\n"
         "1️⃣ Пераклад поўнага тэксту:\n"
@@ -314,6 +690,10 @@ async def status_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         msg = "❌ Skarnik перакладчык не даступны\n💡 Выкарыстоўваецца fallback перакладчык"
     
+    for backend, (count, found, total_time) in translation_stats.items():
+        msg += (f"\n⏱ {backend}: {count} перакладаў, знойдзена {found * 100 / count:.0f}%, "
+                f"у сярэднім {total_time * 1000 / count:.0f} мс")
+    
     await update.message.reply_text(msg)
 
 async def test_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -332,68 +712,50 @@ async def test_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"🎯 Тэст перакладу праз Skarnik:\n\nРускі: {test_text}\n\nПеракладаю...")
         
         try:
-            be = skarnik_tr.translate_ru_to_be(test_text)
-            await update.message.reply_text(f"Беларускі: {be}")
+            result = await asyncio.to_thread(skarnik_tr.translate_ru_to_be, test_text)
+            record_translation(result)
+            await update.message.reply_text(f"Беларускі: {result.text}")
         except Exception as e:
             await update.message.reply_text(f"❌ Памылка: {e}")
     else:
         await update.message.reply_text("❌ Skarnik перакладчык не даступны")
 
+async def profile_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Профилирует процесс N секунд и присылает результат файлом (только для админов)"""
+    if not is_admin(update.message.from_user.id):
+        await update.message.reply_text("❌ У вас нет прав администратора")
+        return
+    try:
+        kind, seconds = parse_profile_args(context.args)
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+    if running_profile():
+        await update.message.reply_text(f"⏳ Уже идет профилирование {running_profile()}, дождитесь результата")
+        return
+    await update.message.reply_text(f"🔬 Профилирование {kind} на {seconds:g} с, результат придет файлом")
+    # Обработчик не ждет профилирования: обновления продолжают обрабатываться
+    context.application.create_task(send_profile(update.message, kind, seconds))
+
 # Перевод обычных сообщений
 async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
-    bot_username = (await context.bot.get_me()).username
-    bot_id = (await context.bot.get_me()).id
     
     print(f"📨 ПОЛУЧЕНО СООБЩЕНИЕ: '{text}'")
-    print(f"🔍 Username бота: {bot_username}")
-    print(f"🔍 ID бота: {bot_id}")
     print(f"🔍 Chat ID: {update.message.chat_id}")
     print(f"🔍 Chat type: {update.message.chat.type}")
     
-    # Проверяем, есть ли упоминание бота через entities (для групп)
-    is_mentioned = False
-    phrase_after_mention = ""
+    # Ограничение частоты: один спамер не должен занимать Skarnik
+    decision = admission.admit(update.message.from_user.id, update.message.chat_id) if admission else None
+    if decision in (DROP, DROP_NOTIFY):
+        print("🚦 Сообщение пропущено из-за лимита")
+        if decision == DROP_NOTIFY:
+            await update.message.reply_text(THROTTLED_NOTICE)
+        return
     
-    if update.message.entities:
-        for entity in update.message.entities:
-            if entity.type == "mention":
-                # Извлекаем текст упоминания
-                mention_text = text[entity.offset:entity.offset + entity.length]
-                print(f"🔍 Найдено упоминание: '{mention_text}'")
-                
-                if f"@{bot_username}" in mention_text.lower():
-                    # Находим текст после упоминания
-                    text_after_mention = text[entity.offset + entity.length:].strip()
-                    if text_after_mention:
-                        phrase_after_mention = text_after_mention
-                        is_mentioned = True
-                        print(f"🔍 Текст после упоминания: '{phrase_after_mention}'")
-                        break
-    
-    # Если не нашли через entities, проверяем через регулярные выражения
-    if not is_mentioned:
-        # Проверяем, есть ли упоминание бота в тексте
-        mention_pattern = f"@{bot_username}\\s+(.+)"
-        import re
-        mention_match = re.search(mention_pattern, text, re.IGNORECASE)
-        
-        print(f"🔍 Паттерн с @: {mention_pattern}")
-        print(f"🔍 Найдено совпадение с @: {mention_match is not None}")
-        
-        # Также проверяем, есть ли упоминание без @ (для личных чатов)
-        simple_mention_pattern = f"{bot_username}\\s+(.+)"
-        simple_mention_match = re.search(simple_mention_pattern, text, re.IGNORECASE)
-        
-        print(f"🔍 Простой паттерн: {simple_mention_pattern}")
-        print(f"🔍 Найдено простое совпадение: {simple_mention_match is not None}")
-        
-        if mention_match:
-            phrase_after_mention = mention_match.group(1).strip()
-            is_mentioned = True
-        elif simple_mention_match:
-            phrase_after_mention = simple_mention_match.group(1).strip()
-            is_mentioned = True
+    # Упоминание бота: через entities (в группах) или по имени в тексте, одним проходом
+    phrase_after_mention = mention_matcher(context.bot.username).find(text, update.message.entities)
+    is_mentioned = phrase_after_mention is not None
     
     if is_mentioned:
         # Если есть упоминание, переводим только последнее слово из фразы
@@ -405,76 +767,55 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         skarnik_tr, fallback_tr = await ensure_translator()
         
-        try:
-            # Отправляем сообщение о том, что перевод в процессе
-            wait_message = await update.message.reply_text(f"🔍 Шукаю пераклад слова '{word_to_translate}' у Skarnik...")
-            
-            if skarnik_tr:
-                # Пробуем Skarnik переводчик
-                be = skarnik_tr.translate_ru_to_be(word_to_translate)
-                print(f"🔍 Результат Skarnik: '{be}'")
-                if be and not be.startswith("Памылка") and not be.startswith("Пераклад не знойдзены"):
-                    # Удаляем сообщение об ожидании и отправляем перевод
-                    try:
-                        await wait_message.delete()
-                    except:
-                        pass  # Игнорируем ошибки удаления сообщения
-                    print(f"✅ Отправляю перевод: '{word_to_translate}' → '{be}'")
-                    await update.message.reply_text(f"'{word_to_translate}' → '{be}'")
-                    return
-                else:
-                    print(f"❌ Skarnik не нашел перевод или ошибка: '{be}'")
-            
-            # Если Skarnik не сработал, используем fallback
-            be = fallback_tr.translate_ru_to_be(word_to_translate)
-            if not be or be.startswith("Пераклад не знойдзены"):
-                be = "пераклад не знойдзены"
-            
-            # Удаляем сообщение об ожидании и отправляем перевод
+        # Пока идет перевод — индикатор «печатает», заглушка только при долгом ожидании
+        async with DeferredReply(update.message, f"🔍 Шукаю пераклад слова '{word_to_translate}' у Skarnik...") as reply:
             try:
-                await wait_message.delete()
-            except:
-                pass  # Игнорируем ошибки удаления сообщения
-            await update.message.reply_text(f"'{word_to_translate}' → '{be}'")
-            
-        except Exception as e:
-            print(f"❌ Ошибка при обработке упоминания: {e}")
-            # Удаляем сообщение об ожидании и отправляем ошибку
-            try:
-                await wait_message.delete()
-            except:
-                pass  # Игнорируем ошибки удаления сообщения
-            await update.message.reply_text(f"Памылка перакладу: {e}")
+                if skarnik_tr:
+                    # Пробуем Skarnik переводчик
+                    term, result = await asyncio.to_thread(lookup_term, skarnik_tr, fallback_tr, word_to_translate)
+                    record_translation(result)
+                    if result.found:
+                        print(f"✅ Отправляю перевод: '{term}' → '{result.text}'")
+                        await reply.send(f"'{term}' → '{result.text}'")
+                        return
+                    else:
+                        print(f"❌ Skarnik не нашел перевод или ошибка: '{result.text}'")
+                
+                # Если Skarnik не сработал, используем fallback
+                result = fallback_tr.translate_ru_to_be(word_to_translate)
+                record_translation(result)
+                be = result.text if result.found else "пераклад не знойдзены"
+                
+                await reply.send(f"'{word_to_translate}' → '{be}'")
+                
+            except Exception as e:
+                print(f"❌ Ошибка при обработке упоминания: {e}")
+                await reply.send(f"Памылка перакладу: {e}")
     else:
         # Если нет упоминания, переводим весь текст как обычно
         skarnik_tr, fallback_tr = await ensure_translator()
         
-        # Отправляем сообщение о том, что перевод в процессе
-        wait_message = await update.message.reply_text("🔍 Шукаю пераклад у Skarnik...")
-        
-        try:
-            if skarnik_tr:
-                # Пробуем Skarnik переводчик
-                be = skarnik_tr.translate_ru_to_be(text)
-                if be and not be.startswith("Памылка") and not be.startswith("Пераклад не знойдзены"):
-                    # Удаляем сообщение об ожидании и отправляем перевод
-                    await wait_message.delete()
-                    await update.message.reply_text(be)
-                    return
-            
-            # Если Skarnik не сработал, используем fallback
-            be = fallback_tr.translate_ru_to_be(text)
-            if not be or be.startswith("Пераклад не знойдзены"):
-                be = "Пераклад не атрымаўся. Паспрабуйце іншы тэкст."
-            
-            # Удаляем сообщение об ожидании и отправляем перевод
-            await wait_message.delete()
-            await update.message.reply_text(be)
-            
-        except Exception as e:
-            # Удаляем сообщение об ожидании и отправляем ошибку
-            await wait_message.delete()
-            await update.message.reply_text(f"Памылка перакладу: {e}")
+        # Пока идет перевод — индикатор «печатает», заглушка только при долгом ожидании
+        async with DeferredReply(update.message, "🔍 Шукаю пераклад у Skarnik...") as reply:
+            try:
+                if skarnik_tr:
+                    # Пробуем Skarnik переводчик
+                    term, result = await asyncio.to_thread(lookup_term, skarnik_tr, fallback_tr, text)
+                    record_translation(result)
+                    if result.found:
+                        inline_index.add(term, result.text)
+                        await reply.send(result.text)
+                        return
+                
+                # Если Skarnik не сработал, используем fallback
+                result = fallback_tr.translate_ru_to_be(text)
+                record_translation(result)
+                be = result.text if result.found else "Пераклад не атрымаўся. Паспрабуйце іншы тэкст."
+                
+                await reply.send(be)
+                
+            except Exception as e:
+                await reply.send(f"Памылка перакладу: {e}")
 
 # Инлайн-режим: @BotName <русский текст>
 async def on_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -495,16 +836,50 @@ async def on_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.inline_query.answer(results, cache_time=0, is_personal=True)
         return
 
+    # Ограничение частоты для инлайн-запросов
+    decision = admission.admit(update.inline_query.from_user.id) if admission else None
+    if decision in (DROP, DROP_NOTIFY):
+        print("🚦 Инлайн-запрос пропущен из-за лимита")
+        if decision == DROP_NOTIFY:
+            results = [
+                InlineQueryResultArticle(
+                    id=str(uuid4()),
+                    title="Занадта шмат запытаў",
+                    input_message_content=InputTextMessageContent(THROTTLED_NOTICE),
+                    description="Пачакайце крыху і паспрабуйце зноў"
+                )
+            ]
+            await update.inline_query.answer(results, cache_time=0, is_personal=True)
+        return
+
     skarnik_tr, fallback_tr = await ensure_translator()
     print(f"🔍 Переводчик инициализирован: {skarnik_tr is not None}")
     
+    # Слово, которое уже искали в Skarnik, отвечается сразу из памяти вместе с подсказками
+    be = inline_index.get(query)
+    if be is not None:
+        inline_index.touch(query)
+        results = [
+            InlineQueryResultArticle(
+                id=str(uuid4()),
+                title="Пераклад на беларускую (Skarnik)",
+                input_message_content=InputTextMessageContent(be),
+                description=be[:120]
+            )
+        ] + inline_completion_results(query, fallback_tr)
+        print(f"⚡ Инлайн-ответ из памяти: '{query}'")
+        await update.inline_query.answer(results, cache_time=0, is_personal=True)
+        return
+    
     try:
         if skarnik_tr:
             # Пробуем Skarnik переводчик
-            be = skarnik_tr.translate_ru_to_be(query)
-            print(f"🔍 Результат Skarnik для инлайн: '{be}'")
-            if be and not be.startswith("Памылка") and not be.startswith("Пераклад не знойдзены"):
-                print(f"✅ Отправляю инлайн результат: '{query}' → '{be}'")
+            term, result = await asyncio.to_thread(lookup_term, skarnik_tr, fallback_tr, query)
+            record_translation(result)
+            be = result.text
+            if result.found:
+                print(f"✅ Отправляю инлайн результат: '{term}' → '{be}'")
+                inline_index.add(term, be)
                 results = [
                     InlineQueryResultArticle(
                         id=str(uuid4()),
@@ -512,16 +887,16 @@ async def on_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         input_message_content=InputTextMessageContent(be),
                         description=be[:120]
                     )
-                ]
+                ] + inline_completion_results(query, fallback_tr)
                 await update.inline_query.answer(results, cache_time=0, is_personal=True)
                 return
             else:
                 print(f"❌ Skarnik не нашел перевод для инлайн: '{be}'")
         
         # Если Skarnik не сработал, используем fallback
-        be = fallback_tr.translate_ru_to_be(query)
-        if not be or be.startswith("Пераклад не знойдзены"):
-            be = "Пераклад не атрымаўся"
+        result = fallback_tr.translate_ru_to_be(query)
+        record_translation(result)
+        be = result.text if result.found else "Пераклад не атрымаўся"
         
         results = [
             InlineQueryResultArticle(
@@ -530,7 +905,7 @@ async def on_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 input_message_content=InputTextMessageContent(be),
                 description=be[:120]
             )
-        ]
+        ] + inline_completion_results(query, fallback_tr)
         await update.inline_query.answer(results, cache_time=0, is_personal=True)
         
     except Exception as e:
@@ -544,24 +919,49 @@ async def on_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ]
         await update.inline_query.answer(results, cache_time=0, is_personal=True)
 
-def main():
+# Добавляем обработчик ошибок
+async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Логирует ошибки, вызванные обновлениями."""
+    print(f"Ошибка при обработке обновления: {context.error}")
+    
+    # Если это NetworkError, пробуем переподключиться
+    if "NetworkError" in str(context.error) or "httpx.ReadError" in str(context.error):
+        print("Обнаружена сетевая ошибка. Бот будет пытаться переподключиться...")
+        # Здесь можно добавить логику переподключения
+
+async def post_init(application: Application):
+    """До начала приема обновлений: подсказки из снимка и готовый переводчик"""
+    if state_file:
+        state = load_snapshot(state_file)
+        if state:
+            inline_index.restore(state.get("inline_index", []))
+            print(f"♻️ Из снимка восстановлено {len(inline_index)} инлайн-подсказок")
+    # Переводчик и словари создаются сейчас, а не на первом сообщении
+    await ensure_translator()
+
+async def post_stop(application: Application):
+    """Сохраняет кэш отсутствующих слов и снимок подсказок после остановки приема обновлений"""
+    if translator is not None and translator.missing is not None:
+        translator.missing.save()
+    if state_file:
+        save_snapshot(state_file, {"inline_index": inline_index.snapshot()})
+
+def build_application(args: argparse.Namespace) -> Application:
+    """Создает приложение с обработчиками; вызывается и в основном процессе, и в каждом воркере"""
     token = load_or_ask_token()
     
-    # Настройка с retry и обработкой ошибок
-    app = Application.builder().token(token).build()
+    global admission, state_file, admin_ids
+    admission = AdmissionController(args.user_rate, args.user_burst, args.chat_rate, args.chat_burst)
+    state_file = snapshot_path(args)
+    admin_ids = load_admin_ids()
     
-    print(f"🔧 Токен: {token[:10]}...")
-    print(f"🔧 Приложение создано")
+    # Каждый воркер получает свою долю общего лимита запросов к skarnik.by
+    if args.workers > 1:
+        skarnik_limiter.scale(1 / args.workers)
     
-    # Добавляем обработчик ошибок
-    async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Логирует ошибки, вызванные обновлениями."""
-        print(f"Ошибка при обработке обновления: {context.error}")
-        
-        # Если это NetworkError, пробуем переподключиться
-        if "NetworkError" in str(context.error) or "httpx.ReadError" in str(context.error):
-            print("Обнаружена сетевая ошибка. Бот будет пытаться переподключиться...")
-            # Здесь можно добавить логику переподключения
+    # Настройка с retry и обработкой ошибок
+    # Все ответы идут через очередь с лимитами Telegram
+    app = Application.builder().token(token).rate_limiter(SendQueue(args.workers)).post_init(post_init).post_stop(post_stop).build()
 
     app.add_error_handler(error_handler)
 
@@ -569,19 +969,77 @@ def main():
     app.add_handler(CommandHandler("help", help_cmd))
     app.add_handler(CommandHandler("status", status_cmd))
     app.add_handler(CommandHandler("test", test_cmd))
+    app.add_handler(CommandHandler("profile", profile_cmd))
     app.add_handler(InlineQueryHandler(on_inline_query))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, on_text))
+    return app
+
+def reparse_page_cache():
+    """Разбирает сохраненные страницы Skarnik текущим парсером, без обращения к сети"""
+    skarnik_tr = SkarnikTranslator()
+    if skarnik_tr.cache is None:
+        print("❌ Кэш страниц выключен (SKARNIK_CACHE=off)")
+        return
+    found = 0
+    total = 0
+    for term, html_content in skarnik_tr.cache.pages():
+        total += 1
+        translation = skarnik_tr._parse_skarnik_response(html_content, term)
+        if translation:
+            found += 1
+        print(f"{term}\t{translation or '—'}")
+    print(f"✅ Разобрано страниц: {total}, с переводом: {found}")
+    if skarnik_tr.missing is not None:
+        # После исправления парсера прежние «не найдено» могли стать переводами
+        skarnik_tr.missing.clear()
+        print(f"🚫 Кэш отсутствующих слов сброшен: {skarnik_tr.missing.path}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Telegram бот для перевода с русского на белорусский через Skarnik')
+    parser.add_argument('--reparse-cache', action='store_true',
+                        help='Разобрать сохраненные страницы Skarnik заново (без сети) и выйти')
+    add_webhook_arguments(parser)
+    add_worker_arguments(parser)
+    add_rate_limit_arguments(parser)
+    add_snapshot_arguments(parser, STATE_FILE)
+    args = parser.parse_args()
+    
+    if args.reparse_cache:
+        reparse_page_cache()
+        return
+
+    token = load_or_ask_token()
+    print(f"🔧 Токен: {token[:10]}...")
 
     print("🔍 Бот перакладу праз Skarnik запущен. Наберите Ctrl+C для остановки.")
     print("💡 Выкарыстоўваю онлайн-слоўнік Skarnik для перакладу...")
     
+    # Многопроцессный режим: супервизор раздает обновления воркерам по chat_id
+    if args.workers > 0:
+        run_supervisor(
+            build_application, args, token,
+            allowed_updates=["message", "inline_query"],
+            drop_pending_updates=True,
+        )
+        return
+
+    app = build_application(args)
+    print(f"🔧 Приложение создано")
+    
     # Запуск с retry логикой
     try:
-        app.run_polling(
-            close_loop=False,
-            drop_pending_updates=True,  # Игнорируем старые обновления
-            allowed_updates=["message", "inline_query"]  # Только нужные типы обновлений
-        )
+        if args.webhook:
+            run_webhook(
+                app, args,
+                allowed_updates=["message", "inline_query"],
+                drop_pending_updates=True,
+            )
+        else:
+            app.run_polling(
+                close_loop=False,
+                drop_pending_updates=True,  # Игнорируем старые обновления
+                allowed_updates=["message", "inline_query"]  # Только нужные типы обновлений
+            )
     except Exception as e:
         print(f"Критическая ошибка: {e}")
         print("Попробуйте перезапустить бота или проверить интернет-соединение")
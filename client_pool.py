@@ -0,0 +1,132 @@
+"""
+Пул независимых клиентов для переводчиков без собственного пула соединений.
+
+Один клиент googletrans на весь процесс — это одно соединение и одно
+внутреннее состояние (токены, cookies): одновременные переводы либо идут
+по очереди, либо портят друг другу это состояние. Пул держит до size
+отдельных клиентов, каждый в каждый момент используется одним переводом:
+
+    выдача          свободный клиент, новый (пока их меньше size) или ожидание
+                    свободного не дольше checkout_timeout секунд
+    сломанный       после max_failures ошибок подряд клиент закрывается и
+                    заменяется новым
+    старый          клиент старше max_age секунд тоже заменяется: состояние
+                    сервиса (токены, cookies) со временем устаревает
+
+Клиенты создаются по мере надобности, поэтому при малой нагрузке пул не
+открывает лишних соединений.
+"""
+
+import time
+import asyncio
+import inspect
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Optional
+
+DEFAULT_POOL_SIZE = 4
+CHECKOUT_TIMEOUT = 10.0     # Сколько секунд перевод ждет свободного клиента
+MAX_CLIENT_AGE = 30 * 60    # Через сколько секунд клиент заменяется новым
+MAX_FAILURES = 2            # После стольких ошибок подряд клиент считается сломанным
+
+class PoolTimeout(Exception):
+    """Все клиенты заняты дольше checkout_timeout"""
+
+class PooledClient:
+    __slots__ = ("client", "created_at", "failures")
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.created_at = time.monotonic()
+        self.failures = 0
+
+class ClientPool:
+    def __init__(self, factory: Callable[[], Any], size: int = DEFAULT_POOL_SIZE,
+                 checkout_timeout: float = CHECKOUT_TIMEOUT, max_age: float = MAX_CLIENT_AGE,
+                 max_failures: int = MAX_FAILURES, close: Optional[Callable[[Any], Any]] = None):
+        self.factory = factory
+        self.size = max(1, size)
+        self.checkout_timeout = checkout_timeout
+        self.max_age = max_age
+        self.max_failures = max_failures
+        self.close_client = close
+        self.idle: asyncio.Queue = asyncio.Queue()
+        self.created = 0
+        self.stats = {"checkouts": 0, "waits": 0, "timeouts": 0, "recycled": 0, "created": 0}
+
+    @property
+    def in_use(self) -> int:
+        return self.created - self.idle.qsize()
+
+    def describe(self) -> str:
+        """Короткая сводка для логов и /status"""
+        return (f"клиентов {self.created}/{self.size}, занято {self.in_use}, "
+                f"выдач {self.stats['checkouts']}, ожиданий {self.stats['waits']}, "
+                f"таймаутов {self.stats['timeouts']}, заменено {self.stats['recycled']}")
+
+    def _new_client(self) -> PooledClient:
+        self.stats["created"] += 1
+        return PooledClient(self.factory())
+
+    async def _checkout(self) -> PooledClient:
+        self.stats["checkouts"] += 1
+        if not self.idle.empty():
+            return self.idle.get_nowait()
+        if self.created < self.size:
+            self.created += 1
+            try:
+                return self._new_client()
+            except Exception:
+                self.created -= 1
+                raise
+        self.stats["waits"] += 1
+        try:
+            return await asyncio.wait_for(self.idle.get(), timeout=self.checkout_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise PoolTimeout(f"все {self.size} клиентов заняты дольше {self.checkout_timeout:g} с") from None
+
+    async def _close(self, entry: PooledClient):
+        if self.close_client is None:
+            return
+        try:
+            result = self.close_client(entry.client)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            print(f"⚠️ Ошибка закрытия клиента пула: {e}")
+
+    async def _checkin(self, entry: PooledClient):
+        broken = entry.failures >= self.max_failures
+        if broken or time.monotonic() - entry.created_at > self.max_age:
+            self.stats["recycled"] += 1
+            if broken:
+                print(f"♻️ Клиент пула сломан ({entry.failures} ошибок подряд), заменяю новым")
+            await self._close(entry)
+            try:
+                entry = self._new_client()
+            except Exception as e:
+                # Новый клиент создастся при следующей выдаче
+                print(f"⚠️ Не удалось создать клиента пула: {e}")
+                self.created -= 1
+                return
+        self.idle.put_nowait(entry)
+
+    @asynccontextmanager
+    async def client(self) -> AsyncIterator[Any]:
+        """async with pool.client() as client: ... — клиент только для этого перевода"""
+        entry = await self._checkout()
+        try:
+            yield entry.client
+        except Exception:
+            entry.failures += 1
+            raise
+        else:
+            entry.failures = 0
+        finally:
+            await self._checkin(entry)
+
+    async def close(self):
+        """Закрывает свободных клиентов (при остановке)"""
+        while not self.idle.empty():
+            await self._close(self.idle.get_nowait())
+            self.created -= 1
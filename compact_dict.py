@@ -0,0 +1,244 @@
+"""
+Компактный словарь ru→be на диске для fallback-переводчика.
+
+Формат файла:
+    заголовок   magic, число записей, размер блока, число блоков, макс. слов в ключе
+    смещения    по одному uint64 на блок
+    данные      блоки по block_size записей, ключи отсортированы по байтам UTF-8
+
+Внутри блока ключи хранятся с front coding: каждая запись — длина общего
+префикса с предыдущим ключом, остаток ключа и перевод (длины — varint).
+Первый ключ блока хранится целиком, поэтому поиск — бинарный поиск по
+первым ключам блоков и короткий проход внутри одного блока: O(log n).
+
+Файл открывается через mmap только для чтения: запуск занимает миллисекунды,
+а страницы словаря делятся между всеми процессами-воркерами через кэш ОС.
+
+Сборка из TSV (русский<TAB>белорусский, по строке на запись):
+    python compact_dict.py build words.tsv fallback_dict.bin [--fuzzy]
+    python compact_dict.py get fallback_dict.bin "добрый день"
+"""
+
+import os
+import sys
+import mmap
+import struct
+import argparse
+from typing import Optional, Dict, Iterator, Tuple
+
+from phrase_matcher import split_phrase
+
+MAGIC = b"RUBEDIC1"
+HEADER = struct.Struct("<8sIIII")  # magic, entries, block_size, blocks, max_words
+OFFSET = struct.Struct("<Q")
+DEFAULT_BLOCK_SIZE = 16
+DEFAULT_DICT_FILE = "fallback_dict.bin"
+
+def normalize_key(text: str) -> str:
+    """Ключи нормализуются так же, как слова в PhraseMatcher"""
+    return " ".join(split_phrase(text))
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(buffer, pos: int):
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def read_tsv(tsv_path: str) -> Dict[str, str]:
+    """Читает TSV в словарь с нормализованными ключами; при повторе ключа остается первый перевод"""
+    entries = {}
+    with open(tsv_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 2:
+                continue
+            key = normalize_key(parts[0])
+            value = parts[1].strip()
+            if key and value and key not in entries:
+                entries[key] = value
+    return entries
+
+def write_dictionary(entries: Dict[str, str], output_path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> int:
+    """Записывает словарь в компактном формате; возвращает число записей"""
+    items = sorted((key.encode("utf-8"), value.encode("utf-8")) for key, value in entries.items())
+    data = bytearray()
+    offsets = []
+    previous = b""
+    for i, (key, value) in enumerate(items):
+        if i % block_size == 0:
+            offsets.append(len(data))
+            previous = b""
+        shared = 0
+        limit = min(len(previous), len(key))
+        while shared < limit and previous[shared] == key[shared]:
+            shared += 1
+        _write_varint(data, shared)
+        _write_varint(data, len(key) - shared)
+        data += key[shared:]
+        _write_varint(data, len(value))
+        data += value
+        previous = key
+
+    max_words = max((key.count(b" ") + 1 for key, _ in items), default=0)
+    temp_path = output_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(items), block_size, len(offsets), max_words))
+        for offset in offsets:
+            f.write(OFFSET.pack(offset))
+        f.write(data)
+    os.replace(temp_path, output_path)  # Работающие процессы продолжают читать старый файл
+    return len(items)
+
+def build_dictionary(tsv_path: str, output_path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> int:
+    """Собирает словарь из TSV; возвращает число записей"""
+    return write_dictionary(read_tsv(tsv_path), output_path, block_size)
+
+def fallback_dict_path() -> str:
+    """Путь к словарю из FALLBACK_DICT в окружении/.env (по умолчанию fallback_dict.bin)"""
+    # Импорт здесь: сборщик словаря должен работать без python-telegram-bot
+    from webhook_server import read_env_setting
+    return read_env_setting("FALLBACK_DICT") or DEFAULT_DICT_FILE
+
+class CompactDictionary:
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.entries, self.block_size, self.blocks, self.max_words = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: не файл словаря")
+        self.offsets_start = HEADER.size
+        self.data_start = HEADER.size + self.blocks * OFFSET.size
+
+    def __len__(self) -> int:
+        return self.entries
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+    def _block_start(self, block: int) -> int:
+        return self.data_start + OFFSET.unpack_from(self.mm, self.offsets_start + block * OFFSET.size)[0]
+
+    def _first_key(self, block: int) -> bytes:
+        # Общий префикс у первого ключа блока всегда 0
+        pos = self._block_start(block) + 1
+        length, pos = _read_varint(self.mm, pos)
+        return self.mm[pos:pos + length]
+
+    def _find_block(self, target: bytes) -> int:
+        """Последний блок, первый ключ которого не больше искомого"""
+        lo, hi = 0, self.blocks - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._first_key(mid) <= target:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def get(self, key: str) -> Optional[str]:
+        """Перевод для нормализованного ключа (см. normalize_key) или None"""
+        if not self.entries:
+            return None
+        target = key.encode("utf-8")
+
+        lo = self._find_block(target)
+        pos = self._block_start(lo)
+        current = b""
+        for _ in range(min(self.block_size, self.entries - lo * self.block_size)):
+            shared, pos = _read_varint(self.mm, pos)
+            suffix_length, pos = _read_varint(self.mm, pos)
+            current = current[:shared] + self.mm[pos:pos + suffix_length]
+            pos += suffix_length
+            value_length, pos = _read_varint(self.mm, pos)
+            if current == target:
+                return self.mm[pos:pos + value_length].decode("utf-8")
+            if current > target:
+                return None
+            pos += value_length
+        return None
+
+    def iter_prefix(self, prefix: str) -> Iterator[Tuple[str, str]]:
+        """Записи (ключ, перевод), ключи которых начинаются с prefix, по порядку ключей"""
+        if not self.entries:
+            return
+        target = prefix.encode("utf-8")
+        lo = self._find_block(target)
+
+        # Ключи с префиксом идут подряд и могут продолжаться в следующих блоках
+        for block in range(lo, self.blocks):
+            pos = self._block_start(block)
+            current = b""
+            for _ in range(min(self.block_size, self.entries - block * self.block_size)):
+                shared, pos = _read_varint(self.mm, pos)
+                suffix_length, pos = _read_varint(self.mm, pos)
+                current = current[:shared] + self.mm[pos:pos + suffix_length]
+                pos += suffix_length
+                value_length, pos = _read_varint(self.mm, pos)
+                if current.startswith(target):
+                    yield current.decode("utf-8"), self.mm[pos:pos + value_length].decode("utf-8")
+                elif current > target:
+                    return
+                pos += value_length
+
+def open_fallback_dictionary() -> Optional[CompactDictionary]:
+    """Открывает словарь из FALLBACK_DICT (по умолчанию fallback_dict.bin), если он собран"""
+    path = fallback_dict_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        dictionary = CompactDictionary(path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Не удалось открыть словарь {path}: {e}")
+        return None
+    print(f"📖 Загружен словарь {path}: {len(dictionary)} записей")
+    return dictionary
+
+def main():
+    parser = argparse.ArgumentParser(description='Компактный словарь ru→be для fallback-переводчика')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='Собрать словарь из TSV (русский<TAB>белорусский)')
+    build.add_argument('tsv')
+    build.add_argument('output', nargs='?', default=DEFAULT_DICT_FILE)
+    build.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                       help=f'Записей в блоке (по умолчанию {DEFAULT_BLOCK_SIZE})')
+    build.add_argument('--fuzzy', action='store_true',
+                       help='Также собрать индекс удалений для поиска с опечатками (*.fuzzy.bin)')
+    get = commands.add_parser('get', help='Найти перевод в собранном словаре')
+    get.add_argument('dictionary')
+    get.add_argument('text')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        entries = read_tsv(args.tsv)
+        count = write_dictionary(entries, args.output, args.block_size)
+        print(f"✅ Словарь {args.output}: {count} записей, {os.path.getsize(args.output)} байт")
+        if args.fuzzy:
+            from fuzzy_index import build_fuzzy_index, fuzzy_index_path
+            fuzzy_path = fuzzy_index_path(args.output)
+            count = build_fuzzy_index(entries, fuzzy_path, args.block_size)
+            print(f"✅ Индекс опечаток {fuzzy_path}: {count} ключей, {os.path.getsize(fuzzy_path)} байт")
+    else:
+        dictionary = CompactDictionary(args.dictionary)
+        translation = dictionary.get(normalize_key(args.text))
+        if translation is None:
+            print("❌ Не найдено")
+            sys.exit(1)
+        print(translation)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Поиск слов с опечатками по индексу удалений (подход SymSpell).
+
+Для каждого слова словаря заранее сохраняются все варианты, получаемые
+удалением до max_distance букв из его первых prefix_length символов.
+Для запроса генерируются такие же удаления, и кандидаты — слова словаря,
+у которых есть общий вариант. Остается проверить расстояние Дамерау-Левенштейна
+у нескольких кандидатов, поэтому поиск занимает микросекунды, а не проход
+по всему словарю.
+
+Индекс для встроенного словаря строится в памяти. Для большого словаря он
+собирается заранее (python compact_dict.py build words.tsv --fuzzy) и
+открывается через mmap в том же формате, что и сам словарь.
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from compact_dict import CompactDictionary, write_dictionary, fallback_dict_path, DEFAULT_BLOCK_SIZE
+
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7  # Удаления только в начале слова: индекс в разы меньше, точность почти та же
+MIN_WORD_LENGTH = 4  # Короткие слова не исправляем: у них слишком много соседей
+CANDIDATE_SEPARATOR = "\t"
+
+def generate_deletes(word: str, max_distance: int = MAX_EDIT_DISTANCE,
+                     prefix_length: int = PREFIX_LENGTH) -> Set[str]:
+    """Все варианты префикса слова без 0..max_distance букв"""
+    key = word[:prefix_length]
+    result = {key}
+    frontier = {key}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for variant in frontier:
+            if len(variant) <= 1:
+                continue
+            for i in range(len(variant)):
+                next_frontier.add(variant[:i] + variant[i + 1:])
+        next_frontier -= result
+        result |= next_frontier
+        frontier = next_frontier
+    return result
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Расстояние Дамерау-Левенштейна (с перестановкой соседних букв); больше max_distance — max_distance + 1"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+def fuzzy_index_path(dictionary_path: str) -> str:
+    return os.path.splitext(dictionary_path)[0] + ".fuzzy.bin"
+
+def build_fuzzy_index(entries: Dict[str, str], output_path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> int:
+    """Собирает индекс удалений по однословным ключам словаря; возвращает число ключей индекса"""
+    index: Dict[str, List[str]] = {}
+    for word in entries:
+        if " " in word or len(word) < MIN_WORD_LENGTH:
+            continue
+        for variant in generate_deletes(word):
+            index.setdefault(variant, []).append(word)
+    return write_dictionary(
+        {variant: CANDIDATE_SEPARATOR.join(words) for variant, words in index.items()},
+        output_path, block_size,
+    )
+
+class SymSpellIndex:
+    def __init__(self, words: Iterable[str] = (), disk_index: Optional[CompactDictionary] = None,
+                 max_distance: int = MAX_EDIT_DISTANCE):
+        self.max_distance = max_distance
+        self.disk_index = disk_index
+        self.index: Dict[str, List[str]] = {}
+        for word in words:
+            if " " in word or len(word) < MIN_WORD_LENGTH:
+                continue
+            for variant in generate_deletes(word, max_distance):
+                self.index.setdefault(variant, []).append(word)
+
+    def _candidates(self, variant: str) -> List[str]:
+        candidates = self.index.get(variant, [])
+        if self.disk_index is not None:
+            stored = self.disk_index.get(variant)
+            if stored:
+                candidates = candidates + stored.split(CANDIDATE_SEPARATOR)
+        return candidates
+
+    def lookup(self, word: str) -> Optional[Tuple[str, int]]:
+        """Ближайшее слово словаря и расстояние до него, или None; расстояние 0 — слово известно"""
+        if len(word) < MIN_WORD_LENGTH:
+            return None
+        best: Optional[Tuple[str, int]] = None
+        seen = set()
+        for variant in generate_deletes(word, self.max_distance):
+            for candidate in self._candidates(variant):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = edit_distance(word, candidate, self.max_distance)
+                if distance > self.max_distance:
+                    continue
+                if distance == 0:
+                    return candidate, 0
+                # При равном расстоянии — по алфавиту, чтобы ответ не зависел от порядка обхода
+                if best is None or (distance, candidate) < (best[1], best[0]):
+                    best = (candidate, distance)
+        return best
+
+def open_fuzzy_index() -> Optional[CompactDictionary]:
+    """Открывает индекс опечаток рядом с большим словарем, если он собран (--fuzzy)"""
+    path = fuzzy_index_path(fallback_dict_path())
+    if not os.path.exists(path):
+        return None
+    try:
+        index = CompactDictionary(path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Не удалось открыть индекс опечаток {path}: {e}")
+        return None
+    print(f"🔤 Загружен индекс опечаток {path}: {len(index)} ключей")
+    return index
@@ -0,0 +1,112 @@
+"""
+Кэш HTML-страниц на диске для SkarnikTranslator.
+
+Страницы словаря почти не меняются, поэтому скачанная страница хранится
+в SQLite (тело сжато zlib) по нормализованному слову:
+    свежая (моложе ttl)   отдается без обращения к сети
+    устаревшая            перепроверяется запросом с If-None-Match /
+                          If-Modified-Since; ответ 304 без тела продлевает ее
+    сайт недоступен       отдается устаревшая копия, если она есть
+
+Хранятся исходные страницы, а не результат разбора, поэтому исправленный
+парсер сразу применяется ко всему кэшу (python bot_skarnik.py --reparse-cache).
+"""
+
+import time
+import zlib
+import sqlite3
+import threading
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+DEFAULT_CACHE_FILE = "skarnik_cache.db"
+DEFAULT_TTL = 30 * 24 * 3600  # Сколько секунд страница считается свежей
+COMPRESSION_LEVEL = 6
+
+class CachedPage(NamedTuple):
+    url: str
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+def normalize_term(term: str) -> str:
+    return " ".join(term.lower().split())
+
+class PageCache:
+    def __init__(self, path: str = DEFAULT_CACHE_FILE, ttl: float = DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        # Поиски идут из потоков asyncio.to_thread: одно соединение под замком
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL: воркеры (--workers) пишут в один файл, не блокируя чтение
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                term TEXT PRIMARY KEY,
+                url TEXT,
+                body BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                checked_at REAL
+            )
+        ''')
+        self.conn.commit()
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "stale": 0}
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def get(self, term: str) -> Optional[CachedPage]:
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT url, body, etag, last_modified, checked_at FROM pages WHERE term = ?',
+                (normalize_term(term),)
+            ).fetchone()
+        if row is None:
+            return None
+        url, body, etag, last_modified, checked_at = row
+        fresh = time.time() - checked_at < self.ttl
+        return CachedPage(url, zlib.decompress(body).decode("utf-8"), etag, last_modified, fresh)
+
+    @staticmethod
+    def conditional_headers(page: Optional[CachedPage]) -> Dict[str, str]:
+        """Заголовки для перепроверки устаревшей страницы"""
+        headers = {}
+        if page is not None:
+            if page.etag:
+                headers["If-None-Match"] = page.etag
+            if page.last_modified:
+                headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def store(self, term: str, url: str, body: str, etag: Optional[str] = None,
+              last_modified: Optional[str] = None):
+        now = time.time()
+        compressed = zlib.compress(body.encode("utf-8"), COMPRESSION_LEVEL)
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO pages (term, url, body, etag, last_modified, fetched_at, checked_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (normalize_term(term), url, compressed, etag, last_modified, now, now)
+            )
+            self.conn.commit()
+
+    def touch(self, term: str):
+        """Сервер подтвердил (304), что страница не изменилась"""
+        with self.lock:
+            self.conn.execute('UPDATE pages SET checked_at = ? WHERE term = ?', (time.time(), normalize_term(term)))
+            self.conn.commit()
+
+    def pages(self) -> Iterator[Tuple[str, str]]:
+        """Все сохраненные страницы (слово, HTML) — для повторного разбора без сети"""
+        with self.lock:
+            rows = self.conn.execute('SELECT term, body FROM pages ORDER BY term').fetchall()
+        for term, body in rows:
+            yield term, zlib.decompress(body).decode("utf-8")
@@ -0,0 +1,163 @@
+"""
+Быстрый лемматизатор русского языка на таблице окончаний.
+
+Skarnik ищет слова в словарной форме, а пользователи пишут «утра», «добрые»,
+«делаешь». Лемматизатор по окончанию слова предлагает несколько возможных
+начальных форм в порядке вероятности; SkarnikTranslator пробует их по очереди
+и останавливается на первой найденной.
+
+Таблица компилируется при импорте в словарь «окончание → варианты», поиск —
+несколько обращений к словарю по длине окончания. Результаты кэшируются.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+LEMMA_CACHE_SIZE = 10000
+MAX_LEMMA_CANDIDATES = 2  # Больше вариантов — больше лишних HTTP-запросов при промахе
+MIN_STEM_LENGTH = 2
+
+# Окончание словоформы → окончания начальной формы, от более вероятных к менее.
+# Более длинные окончания проверяются раньше коротких, поэтому правило с
+# последней буквой основы («чей», «ки») уточняет общее («ей», «и») и идет первым.
+# Запросов к Skarnik на промах не больше MAX_LEMMA_CANDIDATES, так что первым
+# должен идти самый частый вариант: мужской род («стола», «домами») чаще среднего.
+SUFFIX_RULES: List[Tuple[str, Tuple[str, ...]]] = [
+    # Прилагательные
+    ("ого", ("ый", "ой", "ий")),
+    ("его", ("ий", "ый")),
+    ("ому", ("ый", "ой")),
+    ("ему", ("ий",)),
+    ("ыми", ("ый",)),
+    ("ими", ("ий",)),
+    ("ая", ("ый", "ой")),
+    ("яя", ("ий",)),
+    ("ую", ("ый", "ой")),
+    ("юю", ("ий",)),
+    ("ое", ("ый", "ой")),
+    ("ее", ("ий",)),
+    ("ые", ("ый",)),
+    ("ие", ("ий", "ие")),
+    ("ых", ("ый",)),
+    ("их", ("ий",)),
+    ("ым", ("ый",)),
+    # Глаголы
+    ("аешь", ("ать",)),
+    ("яешь", ("ять",)),
+    ("ешь", ("ть", "ать")),
+    ("ишь", ("ить", "еть")),
+    ("ает", ("ать",)),
+    ("яет", ("ять",)),
+    ("ают", ("ать",)),
+    ("яют", ("ять",)),
+    ("аем", ("ать",)),
+    ("ала", ("ать",)),
+    ("али", ("ать",)),
+    ("ило", ("ить",)),
+    ("ила", ("ить",)),
+    ("или", ("ить",)),
+    ("ела", ("еть",)),
+    ("ели", ("еть",)),
+    ("ите", ("ить",)),
+    ("ете", ("ть",)),
+    ("ит", ("ить", "еть")),
+    ("ят", ("ить", "ять")),
+    ("ат", ("ать",)),
+    ("ал", ("ать",)),
+    ("ил", ("ить",)),
+    ("ел", ("еть",)),
+    ("аю", ("ать",)),
+    ("яю", ("ять",)),
+    # Существительные
+    ("ами", ("", "а")),
+    ("ями", ("я", "ь")),
+    ("иями", ("ия", "ие")),
+    ("ием", ("ие",)),
+    ("ией", ("ия",)),
+    ("иях", ("ия", "ие")),
+    ("ий", ("ие", "ия")),
+    ("ии", ("ия", "ие")),
+    ("ию", ("ия", "ие")),
+    ("ам", ("", "а")),
+    ("ям", ("я", "ь")),
+    ("ах", ("", "а")),
+    ("ях", ("я", "ь")),
+    ("ом", ("", "о")),
+    ("ем", ("ь", "е")),
+    ("ой", ("а", "ый", "ой")),
+    ("ей", ("ь", "я", "ий")),
+    # После шипящих мужской род без мягкого знака: «врачей», «ножей», «товарищей»
+    ("чей", ("ч", "чь")),
+    ("жей", ("ж", "жь")),
+    ("шей", ("ш", "шь")),
+    ("щей", ("щ", "щь")),
+    ("ов", ("", "о")),
+    ("ев", ("ь", "й")),
+    ("ью", ("ь",)),
+    ("а", ("", "о")),
+    ("я", ("е", "ь")),
+    ("у", ("", "а", "о")),
+    ("ю", ("ь", "я")),
+    ("ы", ("", "а")),
+    ("и", ("а", "ь", "я")),
+    # После г, к, х и шипящих «ы» не пишется: «уроки», «врачи» — мужской род
+    ("ги", ("г", "га")),
+    ("ки", ("к", "ка")),
+    ("хи", ("х", "ха")),
+    ("чи", ("ч", "ча", "чь")),
+    ("жи", ("ж", "жа", "жь")),
+    ("ши", ("ш", "ша", "шь")),
+    ("щи", ("щ", "ща", "щь")),
+    ("е", ("", "а", "о")),
+]
+
+REFLEXIVE_ENDINGS = ("ся", "сь")
+
+# Сочетания, невозможные в начальной форме: «хорошый», «книгь», «делаать», «зданиь»,
+# а также основы, которыми слово не кончается: «окн», «весн», «стекл» (это «окно», «весна», «стекло»)
+INVALID_LEMMA = re.compile(r"[гкхжшчщц]ы|[гкхжшчщц]я$|[гкхц]ь$|[аеиоуыэюя]ь|аа|яя|ьь"
+                           r"|[бвгдзклмпстфхжшчщ]н$|[бвгдзкптфхжшчщ]л$")
+
+def _compile_rules() -> Dict[str, Tuple[str, ...]]:
+    rules: Dict[str, Tuple[str, ...]] = {}
+    for ending, replacements in SUFFIX_RULES:
+        rules[ending] = rules.get(ending, ()) + replacements
+    return rules
+
+RULES_BY_ENDING = _compile_rules()
+ENDING_LENGTHS = sorted({len(ending) for ending in RULES_BY_ENDING}, reverse=True)
+
+def _candidates(word: str) -> List[str]:
+    result = []
+    for length in ENDING_LENGTHS:
+        if len(word) - length < MIN_STEM_LENGTH:
+            continue
+        replacements = RULES_BY_ENDING.get(word[-length:])
+        if not replacements:
+            continue
+        stem = word[:-length]
+        for replacement in replacements:
+            candidate = stem + replacement
+            if candidate != word and candidate not in result and not INVALID_LEMMA.search(candidate):
+                result.append(candidate)
+    return result
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemma_candidates(word: str, limit: int = MAX_LEMMA_CANDIDATES) -> Tuple[str, ...]:
+    """Возможные начальные формы слова (без самого слова), от более вероятных к менее"""
+    word = word.lower().replace("ё", "е")
+    if " " in word:
+        return ()
+
+    # Возвратные глаголы: «учится» → «учит» → «учить» → «учиться»
+    for ending in REFLEXIVE_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH + 1:
+            base = word[:-len(ending)]
+            verbs = [candidate + "ся" for candidate in _candidates(base) if candidate.endswith("ть")]
+            if base.endswith("ть"):
+                verbs.insert(0, word if ending == "ся" else base + "ся")
+            verbs = [verb for verb in verbs if verb != word]
+            return tuple(verbs[:limit])
+
+    return tuple(_candidates(word)[:limit])
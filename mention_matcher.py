@@ -0,0 +1,45 @@
+"""
+Поиск упоминания бота в сообщении: «Добрае @bot утро» → «утро».
+
+Имя бота известно после Application.initialize() (один get_me при запуске)
+и доступно в обработчиках как context.bot.username без запросов к Bot API.
+Регулярное выражение для имени собирается один раз и кэшируется; если имя
+бота сменится, для нового имени просто соберется новый матчер.
+"""
+
+import re
+from functools import lru_cache
+from typing import Optional, Sequence
+
+class MentionMatcher:
+    def __init__(self, username: str):
+        self.mention = "@" + username.lower()
+        # «@bot текст» или «bot текст» (в личных чатах имя иногда пишут без @)
+        self.pattern = re.compile(
+            rf"(?<![\w@])@?{re.escape(username)}(?!\w)\s+(.+)",
+            re.IGNORECASE | re.DOTALL,
+        )
+
+    def find(self, text: str, entities: Optional[Sequence] = None) -> Optional[str]:
+        """Текст после упоминания бота или None, если бота не упоминали"""
+        if entities:
+            encoded = None
+            for entity in entities:
+                if entity.type != "mention":
+                    continue
+                # Смещения сущностей Telegram считаются в единицах UTF-16
+                if encoded is None:
+                    encoded = text.encode("utf-16-le")
+                start = entity.offset * 2
+                end = start + entity.length * 2
+                if encoded[start:end].decode("utf-16-le").lower() == self.mention:
+                    after = encoded[end:].decode("utf-16-le").strip()
+                    if after:
+                        return after
+
+        match = self.pattern.search(text)
+        return match.group(1).strip() if match else None
+
+@lru_cache(maxsize=4)
+def mention_matcher(username: str) -> MentionMatcher:
+    return MentionMatcher(username)
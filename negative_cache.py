@@ -0,0 +1,232 @@
+"""
+Кэш отсутствующих в Skarnik слов: фильтр Блума и словарь сроков.
+
+bot_google.py использует тот же кэш для текстов, которые не перевел его
+основной переводчик (ключ — «бэкенд:текст»).
+
+Слова, которых нет в словаре, пользователи повторяют так же часто, как
+найденные, и каждое такое слово стоит нескольких запросов к сайту (исходная
+форма и начальные формы). Перед запросом слово проверяется по фильтру Блума:
+«точно не отсутствовало» отвечается за пару хешей. Положительный ответ фильтра
+подтверждается словарем «слово → срок»; ложное срабатывание фильтра или
+истекший срок просто ведут к обычному поиску.
+
+Фильтр и словарь сохраняются в файл (по умолчанию skarnik_missing.bin) и
+загружаются при запуске; истекшие записи при загрузке отбрасываются, и
+фильтр при необходимости пересобирается. Файл общий для всех воркеров:
+перед записью процесс объединяет свои записи с записанными другими.
+
+clear() (после --reparse-cache) сбрасывает кэш и записывает в файл время
+сброса: записи, добавленные раньше него, не возвращаются в файл и при
+объединении со старыми копиями в памяти других процессов.
+
+Формат файла:
+    заголовок   magic, число бит фильтра, число хешей, число записей, время сброса
+    фильтр      биты
+    записи      срок (double), длина слова (uint16), слово в UTF-8
+"""
+
+import os
+import math
+import time
+import struct
+import hashlib
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+from http_cache import normalize_term
+
+MAGIC = b"RUBENEG2"
+HEADER = struct.Struct("<8sIIId")  # magic, bits, hashes, entries, cleared_at
+ENTRY = struct.Struct("<dH")      # expires, term length
+DEFAULT_CACHE_FILE = "skarnik_missing.bin"
+DEFAULT_TTL = 7 * 24 * 3600       # Словарь пополняется редко, но не никогда
+DEFAULT_CAPACITY = 100000
+FALSE_POSITIVE_RATE = 0.01
+SAVE_INTERVAL = 60.0              # Не чаще раза в столько секунд при добавлении слов
+REBUILD_EXPIRED_SHARE = 0.25      # При такой доле истекших записей фильтр пересобирается
+PRUNE_KEEP_SHARE = 0.9            # При переполнении остается такая доля самых свежих записей
+
+class BloomFilter:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, error_rate: float = FALSE_POSITIVE_RATE):
+        bits = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.size = max(8, bits)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> Iterator[int]:
+        # Двойное хеширование: k позиций из двух 64-битных половин одного хеша
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class NegativeCache:
+    def __init__(self, path: str = DEFAULT_CACHE_FILE, ttl: float = DEFAULT_TTL,
+                 capacity: int = DEFAULT_CAPACITY):
+        self.path = path
+        self.ttl = ttl
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.bloom = BloomFilter(capacity)
+        self.expires: Dict[str, float] = {}
+        self.cleared_at = 0.0   # Записи, добавленные раньше, недействительны
+        self.dirty = False
+        self.last_save = time.monotonic()
+        self.stats = {"skipped": 0, "false_positives": 0, "expired": 0, "added": 0, "merged": 0}
+        if os.path.exists(path):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.expires)
+
+    def _valid(self, expires: float, now: float) -> bool:
+        # Время добавления — срок минус ttl: записи до сброса не нужны
+        return expires > now and expires - self.ttl > self.cleared_at
+
+    def _read_file(self) -> Optional[Tuple[int, int, float, bytes, Dict[str, float]]]:
+        """Фильтр и записи из файла: (бит, хешей, время сброса, биты фильтра, записи) или None"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            magic, bits, hashes, entries, cleared_at = HEADER.unpack_from(data, 0)
+            if magic != MAGIC:
+                raise ValueError("не файл кэша отсутствующих слов")
+            pos = HEADER.size
+            bloom_bytes = data[pos:pos + (bits + 7) // 8]
+            pos += len(bloom_bytes)
+            expires_by_term = {}
+            for _ in range(entries):
+                expires, length = ENTRY.unpack_from(data, pos)
+                pos += ENTRY.size
+                expires_by_term[data[pos:pos + length].decode("utf-8")] = expires
+                pos += length
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error, UnicodeDecodeError) as e:
+            print(f"⚠️ Не удалось загрузить {self.path}: {e}")
+            return None
+        return bits, hashes, cleared_at, bloom_bytes, expires_by_term
+
+    def _load(self):
+        stored = self._read_file()
+        if stored is None:
+            return
+        bits, hashes, self.cleared_at, bloom_bytes, entries = stored
+        now = time.time()
+        self.expires = {term: expires for term, expires in entries.items() if self._valid(expires, now)}
+
+        expired = len(entries) - len(self.expires)
+        if bits == self.bloom.size and hashes == self.bloom.hashes and expired <= len(entries) * REBUILD_EXPIRED_SHARE:
+            self.bloom.bits = bytearray(bloom_bytes)
+        else:
+            self._rebuild()
+        print(f"🚫 Загружено {len(self.expires)} отсутствующих слов из {self.path}")
+
+    def _rebuild(self):
+        self.bloom = BloomFilter(self.capacity)
+        for term in self.expires:
+            self.bloom.add(term)
+
+    def _merge(self, stored: Tuple[int, int, float, bytes, Dict[str, float]]):
+        """Объединяет записи в памяти с записанными в файл другими процессами (под self.lock)"""
+        _, _, cleared_at, _, entries = stored
+        now = time.time()
+        if cleared_at > self.cleared_at:
+            # Кэш сброшен в другом процессе: свои записи до сброса тоже отбрасываем
+            self.cleared_at = cleared_at
+            self.expires = {term: expires for term, expires in self.expires.items() if self._valid(expires, now)}
+            self._rebuild()
+        for term, expires in entries.items():
+            if self._valid(expires, now) and expires > self.expires.get(term, 0.0):
+                if term not in self.expires:
+                    self.bloom.add(term)
+                    self.stats["merged"] += 1
+                self.expires[term] = expires
+
+    def is_missing(self, term: str) -> bool:
+        """True — слово недавно не нашлось и искать его снова не нужно"""
+        key = normalize_term(term)
+        if key not in self.bloom:
+            return False
+        with self.lock:
+            expires = self.expires.get(key)
+            if expires is None:
+                self.stats["false_positives"] += 1
+                return False
+            if expires <= time.time():
+                del self.expires[key]
+                self.stats["expired"] += 1
+                return False
+            self.stats["skipped"] += 1
+            return True
+
+    def add(self, term: str):
+        """Запоминает, что слова нет в словаре"""
+        key = normalize_term(term)
+        with self.lock:
+            self.expires[key] = time.time() + self.ttl
+            self.bloom.add(key)
+            self.stats["added"] += 1
+            self.dirty = True
+            if len(self.expires) > self.capacity:
+                self._prune()
+            save = time.monotonic() - self.last_save > SAVE_INTERVAL
+        if save:
+            self.save()
+
+    def _prune(self):
+        now = time.time()
+        self.expires = {term: expires for term, expires in self.expires.items() if expires > now}
+        if len(self.expires) > self.capacity:
+            # Оставляем самые свежие записи с запасом, чтобы не чистить на каждом добавлении
+            newest = sorted(self.expires.items(), key=lambda item: item[1])[-int(self.capacity * PRUNE_KEEP_SHARE):]
+            self.expires = dict(newest)
+        self._rebuild()
+
+    def clear(self):
+        """Сбрасывает кэш (например, после исправления парсера) и записывает пустой файл"""
+        with self.lock:
+            self.expires = {}
+            self.cleared_at = time.time()
+            self._rebuild()
+            self.dirty = True
+        self.save()
+
+    def save(self):
+        """Объединяет записи с файлом и записывает результат (через временный файл)"""
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            self.last_save = time.monotonic()
+        # Файл читается вне замка: поиск слов не ждет диска
+        stored = self._read_file() if os.path.exists(self.path) else None
+        with self.lock:
+            if stored is not None:
+                self._merge(stored)
+            if len(self.expires) > self.capacity:
+                self._prune()
+            parts = [HEADER.pack(MAGIC, self.bloom.size, self.bloom.hashes, len(self.expires), self.cleared_at),
+                     bytes(self.bloom.bits)]
+            for term, expires in self.expires.items():
+                encoded = term.encode("utf-8")
+                parts.append(ENTRY.pack(expires, len(encoded)))
+                parts.append(encoded)
+        # У каждого воркера свой временный файл; между чтением и заменой файла
+        # другой воркер может успеть записать свой — его записи вернутся при следующем сохранении
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(b"".join(parts))
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Не удалось сохранить {self.path}: {e}")
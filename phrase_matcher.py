@@ -0,0 +1,171 @@
+"""
+Поиск фраз словаря в тексте за один проход (автомат Ахо-Корасик по словам).
+
+Используется FallbackTranslator в обоих ботах. Словарь компилируется в
+автомат один раз; перевод предложения выбирает самые длинные
+непересекающиеся совпадения слева направо и собирает предложение целиком:
+найденные фразы переведены, ненайденные слова помечены. Время работы
+линейно по длине текста и не зависит от размера словаря.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from lemmatizer import lemma_candidates
+
+WORD_PATTERN = re.compile(r"\w+(?:[-'’]\w+)*")
+UNMATCHED_MARK = "[{}]"  # Так помечаются слова, которых нет в словаре
+
+def normalize_word(word: str) -> str:
+    return word.lower().replace("ё", "е")
+
+def split_phrase(phrase: str) -> List[str]:
+    return [normalize_word(word) for word in WORD_PATTERN.findall(phrase)]
+
+class PhraseMatcher:
+    def __init__(self, phrases: Dict[str, str]):
+        # Состояние 0 — корень; переходы по целым словам
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # Для каждого состояния: фразы, заканчивающиеся в нем (длина в словах, перевод)
+        self.output: List[List[Tuple[int, str]]] = [[]]
+        # Однословные записи отдельно: по ним ищется слово, исправленное после опечатки
+        self.single_words: Dict[str, str] = {}
+
+        for phrase, translation in phrases.items():
+            words = split_phrase(phrase)
+            if words:
+                self._add(words, translation)
+        self._build_fail_links()
+
+    def _add(self, words: List[str], translation: str):
+        state = 0
+        for word in words:
+            next_state = self.goto[state].get(word)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][word] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        # Повторный ключ заменяет перевод, как в обычном словаре
+        self.output[state] = [(len(words), translation)]
+        if len(words) == 1:
+            self.single_words[words[0]] = translation
+
+    def _build_fail_links(self):
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for word, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(word, 0)
+                # Наследуем фразы-суффиксы, чтобы не ходить по fail-ссылкам при поиске
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def longest_matches(self, words: List[str]) -> List[Optional[Tuple[int, str]]]:
+        """Для каждой позиции — самая длинная фраза, начинающаяся с нее (длина, перевод)"""
+        best: List[Optional[Tuple[int, str]]] = [None] * len(words)
+        state = 0
+        for end, word in enumerate(words):
+            while state and word not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(word, 0)
+            for length, translation in self.output[state]:
+                start = end - length + 1
+                if best[start] is None or best[start][0] < length:
+                    best[start] = (length, translation)
+        return best
+
+    @staticmethod
+    def _fill_from_dictionary(words: List[str], best: List[Optional[Tuple[int, str]]], dictionary):
+        for start in range(len(words)):
+            if best[start] is not None:
+                continue
+            # Сначала самые длинные фразы; длина ограничена самым длинным ключом словаря
+            for length in range(min(dictionary.max_words, len(words) - start), 0, -1):
+                translation = dictionary.get(" ".join(words[start:start + length]))
+                if translation is not None:
+                    best[start] = (length, translation)
+                    break
+
+    def word_translation(self, word: str, dictionary=None) -> Optional[str]:
+        """Перевод слова или одной из его начальных форм (без исправления опечаток)"""
+        for candidate in (word,) + lemma_candidates(word):
+            translation = self.single_words.get(candidate)
+            if translation is None and dictionary is not None:
+                translation = dictionary.get(candidate)
+            if translation is not None:
+                return translation
+        return None
+
+    def _fill_from_lemmas(self, words: List[str], best: List[Optional[Tuple[int, str]]], dictionary):
+        # Словоформа известного слова («кота») — не опечатка: до исправления
+        # опечаток ищем ее начальные формы, иначе она «исправится» в другое слово
+        covered_until = 0
+        for start, word in enumerate(words):
+            if best[start] is not None:
+                covered_until = max(covered_until, start + best[start][0])
+                continue
+            if start < covered_until:
+                continue
+            translation = self.word_translation(word, dictionary)
+            if translation is not None:
+                best[start] = (1, translation)
+
+    def _fill_from_fuzzy(self, words: List[str], best: List[Optional[Tuple[int, str]]], dictionary, fuzzy):
+        covered_until = 0
+        for start, word in enumerate(words):
+            if best[start] is not None:
+                covered_until = max(covered_until, start + best[start][0])
+                continue
+            if start < covered_until:
+                continue
+            match = fuzzy.lookup(word)
+            if match is None:
+                continue
+            corrected = match[0]
+            translation = self.single_words.get(corrected)
+            if translation is None and dictionary is not None:
+                translation = dictionary.get(corrected)
+            if translation is not None:
+                best[start] = (1, translation)
+
+    def translate(self, text: str, dictionary=None, fuzzy=None) -> Tuple[str, int, int]:
+        """Переводит текст по словарю; возвращает (результат, переведено слов, всего слов).
+
+        dictionary — большой словарь на диске (CompactDictionary): в нем ищутся
+        фразы, начинающиеся со слов, для которых автомат ничего не нашел.
+        fuzzy — индекс опечаток (SymSpellIndex) для оставшихся ненайденных слов.
+        """
+        tokens = list(WORD_PATTERN.finditer(text))
+        words = [normalize_word(token.group()) for token in tokens]
+        best = self.longest_matches(words)
+        if dictionary is not None:
+            self._fill_from_dictionary(words, best, dictionary)
+        self._fill_from_lemmas(words, best, dictionary)
+        if fuzzy is not None:
+            self._fill_from_fuzzy(words, best, dictionary, fuzzy)
+
+        parts = []
+        position = 0
+        matched_words = 0
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            parts.append(text[position:token.start()])
+            if best[i]:
+                length, translation = best[i]
+                parts.append(translation)
+                matched_words += length
+                position = tokens[i + length - 1].end()
+                i += length
+            else:
+                parts.append(UNMATCHED_MARK.format(token.group()))
+                position = token.end()
+                i += 1
+        parts.append(text[position:])
+        return "".join(parts), matched_words, len(tokens)
@@ -0,0 +1,108 @@
+"""
+Мгновенные подсказки для инлайн-режима по уже известным переводам.
+
+Инлайн-запросы приходят на каждое нажатие клавиши. Индекс хранит
+нормализованные фразы в отсортированном списке: все фразы с данным
+префиксом лежат подряд и находятся двумя бинарными поисками. Из них
+выбираются самые популярные, а если их не хватает — добавляются заголовки
+большого словаря на диске (CompactDictionary.iter_prefix). Ответ строится
+за доли миллисекунды, без переводчика и сети.
+
+Вес фразы — сколько раз ее переводили и находили в кэше. Фразы с весом 0
+(заголовки встроенного словаря) служат только подсказками: точный перевод
+текста для них по-прежнему запрашивается у переводчика.
+"""
+
+import heapq
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from phrase_matcher import split_phrase
+
+MIN_PREFIX_LENGTH = 2       # С одной буквы подсказки бесполезны
+MAX_COMPLETIONS = 5
+MAX_SCAN = 2000             # Сколько фраз с префиксом просматривать при выборе популярных
+MAX_PHRASE_LENGTH = 100     # Длинные тексты подсказками не бывают
+DEFAULT_MAX_ENTRIES = 20000
+EVICT_FRACTION = 0.1        # Какую долю наименее популярных фраз удалять при переполнении
+
+def normalize_phrase(text: str) -> str:
+    return " ".join(split_phrase(text))
+
+class PrefixIndex:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.keys: List[str] = []
+        # Нормализованная фраза → [фраза как ее ввели, перевод, вес]
+        self.entries: Dict[str, list] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, phrase: str, translation: str, weight: int = 1):
+        """Добавляет перевод фразы; повторное добавление обновляет перевод и увеличивает вес"""
+        if len(phrase) > MAX_PHRASE_LENGTH:
+            return
+        key = normalize_phrase(phrase)
+        if not key:
+            return
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry[1] = translation
+            entry[2] += weight
+            return
+        insort(self.keys, key)
+        self.entries[key] = [phrase.strip(), translation, weight]
+        if len(self.keys) > self.max_entries:
+            self._evict()
+
+    def touch(self, phrase: str):
+        """Фразу снова перевели (попадание в кэш) — поднимаем ее в подсказках"""
+        entry = self.entries.get(normalize_phrase(phrase))
+        if entry is not None:
+            entry[2] += 1
+
+    def get(self, phrase: str) -> Optional[str]:
+        """Известный перевод фразы (только для уже переводившихся, с весом больше 0)"""
+        entry = self.entries.get(normalize_phrase(phrase))
+        if entry is None or entry[2] <= 0:
+            return None
+        return entry[1]
+
+    def snapshot(self) -> List[list]:
+        """Переводившиеся фразы [фраза, перевод, вес] для снимка состояния (заголовки словаря не входят)"""
+        return [list(entry) for entry in self.entries.values() if entry[2] > 0]
+
+    def restore(self, entries: List[list]):
+        """Возвращает фразы из снимка; веса складываются с уже накопленными"""
+        for phrase, translation, weight in entries:
+            self.add(phrase, translation, weight)
+
+    def _evict(self):
+        count = max(1, int(len(self.keys) * EVICT_FRACTION))
+        for key in heapq.nsmallest(count, self.entries, key=lambda key: self.entries[key][2]):
+            del self.entries[key]
+        self.keys = sorted(self.entries)
+
+    def complete(self, text: str, limit: int = MAX_COMPLETIONS, dictionary=None) -> List[Tuple[str, str]]:
+        """До limit продолжений текста (фраза, перевод), самые популярные первыми; сам текст не входит"""
+        exact = normalize_phrase(text)
+        # «добрый » — слово уже дописано, подсказываем только продолжения фразы
+        prefix = exact + " " if exact and text[-1:].isspace() else exact
+        if len(exact) < MIN_PREFIX_LENGTH:
+            return []
+
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + "\U0010ffff", start, min(len(self.keys), start + MAX_SCAN))
+        candidates = [key for key in self.keys[start:end] if key != exact]
+        # Популярные первыми, при равном весе — более короткие
+        best = heapq.nsmallest(limit, candidates, key=lambda key: (-self.entries[key][2], len(key), key))
+        results = [(self.entries[key][0], self.entries[key][1]) for key in best]
+
+        if dictionary is not None and len(results) < limit:
+            for key, translation in dictionary.iter_prefix(prefix):
+                if key != exact and key not in self.entries:
+                    results.append((key, translation))
+                    if len(results) >= limit:
+                        break
+        return results
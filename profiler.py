@@ -0,0 +1,179 @@
+"""
+Профилирование работающего бота по команде админа.
+
+Когда в проде растут задержки, перезапускать бота под профилировщиком
+долго, да и проблема может не повториться. Команда /profile включает
+профилирование в работающем процессе на N секунд и присылает результат
+файлом:
+
+    cpu     сэмплирующий профилировщик: отдельный поток каждые SAMPLE_INTERVAL
+            секунд снимает стеки всех потоков (sys._current_frames). Результат —
+            collapsed stacks («поток;файл:функция;... число»), их понимают
+            flamegraph.pl, speedscope и inferno
+    mem     tracemalloc: какие строки кода выделили память за это время и
+            до сих пор ее держат (топ TOP_ALLOCATIONS строк и трассировки
+            самых крупных)
+
+Пока профилирование выключено, ничего не работает: потока нет, tracemalloc
+остановлен. Одновременно идет не больше одного профилирования в процессе;
+в многопроцессном режиме (--workers) профилируется воркер, получивший команду.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+PROFILE_KINDS = ("cpu", "mem")
+DEFAULT_PROFILE_SECONDS = 30
+MAX_PROFILE_SECONDS = 300
+SAMPLE_INTERVAL = 0.005     # 200 снимков стеков в секунду
+MAX_STACK_DEPTH = 64
+MEMORY_FRAMES = 16          # Глубина трассировок tracemalloc
+TOP_ALLOCATIONS = 50
+TOP_TRACEBACKS = 10
+
+PROFILE_USAGE = (f"❌ Использование: /profile cpu|mem [секунды]\n"
+                 f"По умолчанию {DEFAULT_PROFILE_SECONDS} с, максимум {MAX_PROFILE_SECONDS} с")
+
+active_profile: Optional[str] = None  # Вид идущего профилирования
+
+def running_profile() -> Optional[str]:
+    """Вид идущего профилирования или None"""
+    return active_profile
+
+class ProfilerBusy(Exception):
+    """В процессе уже идет профилирование"""
+
+def parse_profile_args(args: List[str]) -> Tuple[str, float]:
+    """Вид профилирования и длительность из аргументов команды; ValueError — неверные аргументы"""
+    if not args or args[0].lower() not in PROFILE_KINDS:
+        raise ValueError(PROFILE_USAGE)
+    try:
+        seconds = float(args[1]) if len(args) > 1 else DEFAULT_PROFILE_SECONDS
+    except ValueError:
+        raise ValueError(PROFILE_USAGE) from None
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise ValueError(PROFILE_USAGE)
+    return args[0].lower(), seconds
+
+def frame_name(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+class StackSampler(threading.Thread):
+    """Поток, который снимает стеки остальных потоков, пока не остановлен"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+async def profile_cpu(seconds: float) -> Tuple[str, str]:
+    """Сэмплирует стеки seconds секунд; возвращает collapsed stacks и сводку"""
+    sampler = StackSampler()
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        sampler.stop()
+    elapsed = time.perf_counter() - started
+    summary = f"{sampler.samples} снимков за {elapsed:.1f} с, {len(sampler.stacks)} разных стеков"
+    return sampler.collapsed(), summary
+
+async def profile_memory(seconds: float) -> Tuple[str, str]:
+    """Следит за выделениями памяти seconds секунд; возвращает топ строк и сводку"""
+    # Если трассировка уже включена (PYTHONTRACEMALLOC), ее не выключаем
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start(MEMORY_FRAMES)
+    try:
+        await asyncio.sleep(seconds)
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    by_line = snapshot.statistics("lineno")
+    total = sum(stat.size for stat in by_line)
+    lines = [f"Выделено за {seconds:g} с и не освобождено: {total / 1024:.1f} КБ "
+             f"(сейчас {current / 1024:.1f} КБ, пик {peak / 1024:.1f} КБ)", "",
+             f"Топ {TOP_ALLOCATIONS} строк:"]
+    for i, stat in enumerate(by_line[:TOP_ALLOCATIONS], 1):
+        frame = stat.traceback[0]
+        lines.append(f"{i:3}. {stat.size / 1024:10.1f} КБ {stat.count:8} блоков  {frame.filename}:{frame.lineno}")
+
+    lines += ["", f"Трассировки {TOP_TRACEBACKS} крупнейших:"]
+    for i, stat in enumerate(snapshot.statistics("traceback")[:TOP_TRACEBACKS], 1):
+        lines.append(f"\n#{i}: {stat.size / 1024:.1f} КБ, {stat.count} блоков")
+        lines.extend(stat.traceback.format())
+    summary = f"{total / 1024:.1f} КБ в {sum(stat.count for stat in by_line)} блоках"
+    return "\n".join(lines) + "\n", summary
+
+async def run_profile(kind: str, seconds: float) -> Tuple[str, bytes, str]:
+    """Профилирует процесс; возвращает имя файла, его содержимое и сводку"""
+    global active_profile
+    if active_profile:
+        raise ProfilerBusy(active_profile)
+    active_profile = kind
+    print(f"🔬 Профилирование {kind} на {seconds:g} с")
+    try:
+        if kind == "cpu":
+            report, summary = await profile_cpu(seconds)
+            extension = "collapsed"
+        else:
+            report, summary = await profile_memory(seconds)
+            extension = "txt"
+    finally:
+        active_profile = None
+    print(f"🔬 Профилирование {kind} завершено: {summary}")
+    filename = f"{kind}-{os.getpid()}-{datetime.now():%Y%m%d-%H%M%S}.{extension}"
+    return filename, report.encode("utf-8"), summary
+
+async def send_profile(message, kind: str, seconds: float):
+    """Профилирует процесс и отправляет результат файлом в ответ на message"""
+    try:
+        filename, data, summary = await run_profile(kind, seconds)
+    except ProfilerBusy as e:
+        await message.reply_text(f"⏳ Уже идет профилирование {e}, дождитесь результата")
+        return
+    except Exception as e:
+        print(f"❌ Ошибка профилирования: {e}")
+        await message.reply_text(f"❌ Ошибка профилирования: {e}")
+        return
+    # sendDocument идет в очередь отправки с низким приоритетом (BULK)
+    await message.reply_document(document=data, filename=filename, caption=f"🔬 {kind}, {seconds:g} с: {summary}")
@@ -0,0 +1,130 @@
+"""
+Ограничение входящих запросов: token bucket на пользователя и на чат.
+
+Каждый пользователь и каждый групповой чат получают свое ведро на burst
+запросов, которое пополняется со скоростью rate запросов в минуту. Запрос
+проходит, только если токен есть и в ведре пользователя, и в ведре чата.
+Пока ведра не пусты, накладные расходы — пара сравнений на сообщение.
+
+Ведра хранятся в словарях и удаляются, когда простаивают дольше времени
+полного пополнения: такое ведро ничем не отличается от нового.
+"""
+
+import time
+import argparse
+from typing import Dict, Optional, Tuple
+
+from webhook_server import read_env_setting
+
+DEFAULT_USER_RATE = 20.0    # Запросов в минуту на пользователя
+DEFAULT_USER_BURST = 5
+DEFAULT_CHAT_RATE = 60.0    # Запросов в минуту на групповой чат
+DEFAULT_CHAT_BURST = 15
+SWEEP_INTERVAL = 60.0       # Как часто удалять простаивающие ведра, секунд
+
+# Решения AdmissionController.admit()
+ADMIT = "admit"              # Обрабатывать как обычно
+COALESCE = "coalesce"        # Заменить свое сообщение сверх лимита в уже запланированном переводе, не создавая нового запроса
+DROP = "drop"                # Пропустить молча
+DROP_NOTIFY = "drop_notify"  # Пропустить и один раз сообщить об ограничении
+
+THROTTLED_NOTICE = "⏳ Занадта шмат запытаў. Пачакайце крыху — пакуль новыя паведамленні не перакладаюцца."
+
+def add_rate_limit_arguments(parser: argparse.ArgumentParser):
+    """Добавляет параметры ограничения; значения по умолчанию берутся из RATE_LIMIT_* в окружении/.env"""
+    group = parser.add_argument_group('rate limit', 'Ограничение частоты запросов (0 — без ограничения)')
+    group.add_argument('--user-rate', type=float,
+                       default=float(read_env_setting("RATE_LIMIT_USER_PER_MINUTE") or DEFAULT_USER_RATE),
+                       help=f'Запросов в минуту на пользователя (RATE_LIMIT_USER_PER_MINUTE, по умолчанию {DEFAULT_USER_RATE:g})')
+    group.add_argument('--user-burst', type=int,
+                       default=int(read_env_setting("RATE_LIMIT_USER_BURST") or DEFAULT_USER_BURST),
+                       help=f'Запросов подряд без паузы (RATE_LIMIT_USER_BURST, по умолчанию {DEFAULT_USER_BURST})')
+    group.add_argument('--chat-rate', type=float,
+                       default=float(read_env_setting("RATE_LIMIT_CHAT_PER_MINUTE") or DEFAULT_CHAT_RATE),
+                       help=f'Запросов в минуту на групповой чат (RATE_LIMIT_CHAT_PER_MINUTE, по умолчанию {DEFAULT_CHAT_RATE:g})')
+    group.add_argument('--chat-burst', type=int,
+                       default=int(read_env_setting("RATE_LIMIT_CHAT_BURST") or DEFAULT_CHAT_BURST),
+                       help=f'Запросов подряд в чате (RATE_LIMIT_CHAT_BURST, по умолчанию {DEFAULT_CHAT_BURST})')
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated", "notified")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.notified = False  # Уведомление об ограничении уже отправлено
+
+class RateLimiter:
+    """Набор ведер с одинаковыми параметрами, по одному на ключ"""
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self.enabled = self.rate > 0
+        # Через это время простоя ведро гарантированно полное
+        self.idle_ttl = self.burst / self.rate if self.enabled else 0
+        self.buckets: Dict[int, TokenBucket] = {}
+
+    def bucket(self, key: int, now: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        return bucket
+
+    def sweep(self, now: float):
+        idle = [key for key, bucket in self.buckets.items() if now - bucket.updated > self.idle_ttl]
+        for key in idle:
+            del self.buckets[key]
+
+class AdmissionController:
+    """Решает, пропускать ли запрос пользователя user_id в чате chat_id"""
+
+    def __init__(self, user_rate: float, user_burst: int, chat_rate: float, chat_burst: int,
+                 cost: float = 1.0):
+        # Для дорогих бэкендов (cost > 1) ведра пополняются медленнее
+        self.users = RateLimiter(user_rate / cost, user_burst)
+        self.chats = RateLimiter(chat_rate / cost, chat_burst)
+        self.last_sweep = time.monotonic()
+        self.stats = {"allowed": 0, "coalesced": 0, "dropped": 0}
+
+    def check(self, user_id: int, chat_id: Optional[int] = None) -> Tuple[bool, bool]:
+        """Возвращает (пропустить, отправить_уведомление); уведомление — одно на эпизод ограничения"""
+        now = time.monotonic()
+        if now - self.last_sweep > SWEEP_INTERVAL:
+            self.users.sweep(now)
+            self.chats.sweep(now)
+            self.last_sweep = now
+
+        buckets = []
+        if self.users.enabled:
+            buckets.append(self.users.bucket(user_id, now))
+        # В личном чате chat_id совпадает с user_id — второе ведро не нужно
+        if self.chats.enabled and chat_id is not None and chat_id != user_id:
+            buckets.append(self.chats.bucket(chat_id, now))
+
+        empty = [bucket for bucket in buckets if bucket.tokens < 1]
+        if not empty:
+            for bucket in buckets:
+                bucket.tokens -= 1
+                bucket.notified = False
+            self.stats["allowed"] += 1
+            return True, False
+
+        notify = not any(bucket.notified for bucket in empty)
+        for bucket in empty:
+            bucket.notified = True
+        return False, notify
+
+    def admit(self, user_id: int, chat_id: Optional[int] = None, has_pending: bool = False) -> str:
+        """Решение для входящего запроса; has_pending — для чата уже запланирован отложенный перевод"""
+        allowed, notify = self.check(user_id, chat_id)
+        if allowed:
+            return ADMIT
+        if has_pending:
+            self.stats["coalesced"] += 1
+            return COALESCE
+        self.stats["dropped"] += 1
+        return DROP_NOTIFY if notify else DROP
@@ -0,0 +1,240 @@
+"""
+Очередь исходящих запросов к Bot API с учетом лимитов Telegram.
+
+Подключается к Application через .rate_limiter(...): все ответы, правки,
+инлайн-ответы и файлы проходят через очередь, обработчики не меняются.
+
+    глобально      не больше 30 сообщений в секунду на бота
+    личный чат     в среднем не больше 1 сообщения в секунду
+    группа         не больше 20 сообщений в минуту
+
+Диспетчер выпускает запросы по приоритету: сначала инлайн-ответы (их ждет
+пользователь, набирающий текст), затем ответы в чатах, последними —
+массовые отправки (файлы, rate_limit_args=BULK). Запрос в чат, исчерпавший
+свой лимит, не задерживает запросы в другие чаты.
+
+RetryAfter приостанавливает чат (или всю очередь, если чат неизвестен) на
+указанное время, после чего запрос повторяется. Сетевые сбои повторяются
+с экспоненциальной паузой. Длина очереди и время ожидания — в stats.
+"""
+
+import time
+import heapq
+import asyncio
+import itertools
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+from telegram.ext import BaseRateLimiter
+
+from rate_limit import RateLimiter
+
+GLOBAL_RATE = 30.0          # Сообщений в секунду на бота
+PRIVATE_CHAT_RATE = 60.0    # Сообщений в минуту в личный чат
+PRIVATE_CHAT_BURST = 3      # Короткие всплески Telegram допускает (заглушка и ее правка, части длинного ответа)
+GROUP_CHAT_RATE = 20.0      # Сообщений в минуту в группу
+GROUP_CHAT_BURST = 3
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5          # Пауза перед первым повтором после сетевой ошибки, секунд
+
+# Приоритеты: меньше — раньше
+INLINE = 0
+REPLY = 1
+BULK = 2
+
+# Запросы, которые Telegram ограничивает; остальные (getMe, setWebhook...) идут сразу
+QUEUED_ENDPOINTS = {
+    "answerInlineQuery", "sendMessage", "editMessageText", "sendChatAction",
+    "sendDocument", "sendPhoto", "deleteMessage", "copyMessage", "forwardMessage",
+}
+# Отправки, которые считаются в лимит чата
+CHAT_LIMITED_ENDPOINTS = {"sendMessage", "editMessageText", "sendDocument", "sendPhoto", "copyMessage", "forwardMessage"}
+# Повтор после таймаута безопасен: второе сообщение не появится
+RETRY_ON_TIMEOUT = {"answerInlineQuery", "editMessageText", "sendChatAction", "deleteMessage"}
+BULK_ENDPOINTS = {"sendDocument", "sendPhoto"}
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """retry_after — число секунд или timedelta, в зависимости от версии библиотеки"""
+    value = error.retry_after
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+class SendQueue(BaseRateLimiter[int]):
+    def __init__(self, workers: int = 0, max_retries: int = MAX_RETRIES):
+        # Воркеры делят общий лимит бота поровну; чаты закреплены за воркерами
+        share = 1.0 / max(1, workers)
+        self.global_limit = RateLimiter(GLOBAL_RATE * 60 * share, max(1, int(GLOBAL_RATE * share)))
+        self.private_chats = RateLimiter(PRIVATE_CHAT_RATE, PRIVATE_CHAT_BURST)
+        self.group_chats = RateLimiter(GROUP_CHAT_RATE, GROUP_CHAT_BURST)
+        self.max_retries = max_retries
+
+        # Ожидающие запросы: (приоритет, номер, chat_id, future)
+        self.heap: List[Tuple[int, int, Optional[int], asyncio.Future]] = []
+        self.counter = itertools.count()
+        self.paused_until = 0.0
+        self.chat_paused_until: Dict[int, float] = {}
+        self.wakeup: Optional[asyncio.Event] = None
+        self.dispatcher: Optional[asyncio.Task] = None
+        self.stats = {
+            "sent": 0, "retried": 0, "failed": 0, "retry_after": 0,
+            "waits": 0, "wait_total": 0.0, "wait_max": 0.0,
+        }
+
+    @property
+    def depth(self) -> int:
+        return len(self.heap)
+
+    def describe(self) -> str:
+        """Короткая сводка для логов и /status"""
+        average = self.stats["wait_total"] / self.stats["waits"] if self.stats["waits"] else 0.0
+        return (f"в очереди {self.depth}, отправлено {self.stats['sent']}, "
+                f"ожидание {average:.2f}/{self.stats['wait_max']:.2f} с (сред./макс.), "
+                f"повторов {self.stats['retried']}, RetryAfter {self.stats['retry_after']}, "
+                f"ошибок {self.stats['failed']}")
+
+    async def initialize(self) -> None:
+        self.wakeup = asyncio.Event()
+        self.dispatcher = asyncio.create_task(self._dispatch(), name="send-queue")
+
+    async def shutdown(self) -> None:
+        if self.dispatcher:
+            self.dispatcher.cancel()
+            self.dispatcher = None
+        for _, _, _, future in self.heap:
+            if not future.done():
+                future.cancel()
+        self.heap.clear()
+        print(f"📤 Очередь отправки: {self.describe()}")
+
+    def _chat_limiter(self, chat_id: int) -> RateLimiter:
+        # У групп и каналов отрицательные id
+        return self.group_chats if chat_id < 0 else self.private_chats
+
+    def _chat_wait(self, chat_id: Optional[int], now: float) -> float:
+        """Сколько секунд чат еще не может получить сообщение"""
+        if chat_id is None:
+            return 0.0
+        wait = self.chat_paused_until.get(chat_id, 0.0) - now
+        limiter = self._chat_limiter(chat_id)
+        bucket = limiter.bucket(chat_id, now)
+        if bucket.tokens < 1:
+            wait = max(wait, (1 - bucket.tokens) / limiter.rate)
+        return max(0.0, wait)
+
+    async def _dispatch(self):
+        last_sweep = time.monotonic()
+        while True:
+            if not self.heap:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            if now - last_sweep > 60:
+                self.private_chats.sweep(now)
+                self.group_chats.sweep(now)
+                self.chat_paused_until = {chat: until for chat, until in self.chat_paused_until.items() if until > now}
+                last_sweep = now
+
+            # Общий лимит бота: ждем, пока появится токен или закончится пауза
+            bucket = self.global_limit.bucket(0, now)
+            wait = max(self.paused_until - now, (1 - bucket.tokens) / self.global_limit.rate if bucket.tokens < 1 else 0)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            # Самый приоритетный запрос, чат которого может получить сообщение сейчас
+            skipped = []
+            chosen = None
+            soonest = None
+            while self.heap:
+                entry = heapq.heappop(self.heap)
+                if entry[3].done():
+                    continue  # Ожидавший запрос отменен
+                chat_wait = self._chat_wait(entry[2], now)
+                if chat_wait <= 0:
+                    chosen = entry
+                    break
+                skipped.append(entry)
+                soonest = chat_wait if soonest is None else min(soonest, chat_wait)
+            for entry in skipped:
+                heapq.heappush(self.heap, entry)
+
+            if chosen is None:
+                # Все ожидающие чаты на лимите: ждем ближайший или новый запрос
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=soonest)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            bucket.tokens -= 1
+            if chosen[2] is not None:
+                self._chat_limiter(chosen[2]).bucket(chosen[2], now).tokens -= 1
+            chosen[3].set_result(None)
+
+    async def _wait_turn(self, priority: int, chat_id: Optional[int]):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.heap, (priority, next(self.counter), chat_id, future))
+        self.wakeup.set()
+        started = time.monotonic()
+        await future
+        waited = time.monotonic() - started
+        self.stats["waits"] += 1
+        self.stats["wait_total"] += waited
+        self.stats["wait_max"] = max(self.stats["wait_max"], waited)
+
+    def _priority(self, endpoint: str, rate_limit_args: Optional[int]) -> int:
+        if rate_limit_args is not None:
+            return rate_limit_args
+        if endpoint == "answerInlineQuery":
+            return INLINE
+        if endpoint in BULK_ENDPOINTS:
+            return BULK
+        return REPLY
+
+    async def process_request(self, callback, args: Any, kwargs: Dict[str, Any], endpoint: str,
+                              data: Dict[str, Any], rate_limit_args: Optional[int]):
+        if endpoint not in QUEUED_ENDPOINTS or self.wakeup is None:
+            return await callback(*args, **kwargs)
+
+        priority = self._priority(endpoint, rate_limit_args)
+        chat_id = data.get("chat_id") if endpoint in CHAT_LIMITED_ENDPOINTS else None
+        if not isinstance(chat_id, int):
+            chat_id = None  # @channelusername или сообщение по inline_message_id
+
+        for attempt in range(self.max_retries + 1):
+            await self._wait_turn(priority, chat_id)
+            try:
+                result = await callback(*args, **kwargs)
+                self.stats["sent"] += 1
+                return result
+            except RetryAfter as e:
+                seconds = retry_after_seconds(e)
+                self.stats["retry_after"] += 1
+                print(f"🚫 Telegram просит подождать {seconds:g} с ({endpoint}, чат {chat_id})")
+                until = time.monotonic() + seconds
+                if chat_id is None:
+                    self.paused_until = max(self.paused_until, until)
+                else:
+                    self.chat_paused_until[chat_id] = max(self.chat_paused_until.get(chat_id, 0.0), until)
+                error = e
+            except BadRequest:
+                self.stats["failed"] += 1
+                raise
+            except TimedOut as e:
+                if endpoint not in RETRY_ON_TIMEOUT:
+                    self.stats["failed"] += 1
+                    raise  # Сообщение могло дойти — повтор дал бы дубликат
+                error = e
+                await asyncio.sleep(BACKOFF_BASE * 2 ** attempt)
+            except NetworkError as e:
+                error = e
+                await asyncio.sleep(BACKOFF_BASE * 2 ** attempt)
+            if attempt < self.max_retries:
+                self.stats["retried"] += 1
+        self.stats["failed"] += 1
+        raise error
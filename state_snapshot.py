@@ -0,0 +1,142 @@
+"""
+Снимок состояния при перезапуске: кэши и отложенные переводы переживают деплой.
+
+При остановке прием обновлений прекращается, отложенные (дебаунс) переводы
+выполняются сразу, не дожидаясь таймера, и на это дается не больше
+--shutdown-deadline секунд. Не успевшие переводы отменяются и вместе с
+горячими кэшами записываются в файл снимка (JSON, через временный файл).
+
+При запуске снимок читается до начала приема обновлений: кэши заполняются
+сразу, а невыполненные переводы ставятся в очередь, как только приложение
+запущено. Файл после чтения удаляется, чтобы перевод не выполнился дважды;
+отложенные переводы из слишком старого снимка отбрасываются.
+
+В многопроцессном режиме (--workers) у каждого воркера свой файл:
+<state-file>.<номер слота>.
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telegram.ext import Application
+
+from webhook_server import read_env_setting
+
+SNAPSHOT_VERSION = 1
+DEFAULT_SHUTDOWN_DEADLINE = 10.0
+PENDING_MAX_AGE = 10 * 60   # Отложенные переводы из более старого снимка не выполняются
+
+def add_snapshot_arguments(parser: argparse.ArgumentParser, default_path: str, drain: bool = False):
+    """Добавляет --state-file (BOT_STATE_FILE) и, если есть отложенные задачи, --shutdown-deadline"""
+    group = parser.add_argument_group('снимок состояния при перезапуске')
+    group.add_argument('--state-file', default=read_env_setting("BOT_STATE_FILE") or default_path,
+                       help=f'Файл снимка кэшей и отложенных переводов (BOT_STATE_FILE, по умолчанию {default_path}; off — не сохранять)')
+    if drain:
+        group.add_argument('--shutdown-deadline', type=float,
+                           default=float(read_env_setting("SHUTDOWN_DEADLINE") or DEFAULT_SHUTDOWN_DEADLINE),
+                           help=f'Секунд на доработку отложенных переводов при остановке (SHUTDOWN_DEADLINE, по умолчанию {DEFAULT_SHUTDOWN_DEADLINE:g})')
+
+def snapshot_path(args: argparse.Namespace) -> Optional[str]:
+    """Путь к файлу снимка этого процесса или None, если снимки выключены"""
+    path = args.state_file
+    if not path or path.lower() == "off":
+        return None
+    slot = getattr(args, "worker_slot", None)
+    return f"{path}.{slot}" if slot is not None else path
+
+def save_snapshot(path: str, state: Dict[str, Any]):
+    state = dict(state, version=SNAPSHOT_VERSION, saved_at=time.time())
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"⚠️ Не удалось сохранить снимок состояния {path}: {e}")
+        return
+    print(f"💾 Снимок состояния сохранен: {path}")
+
+def load_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    """Читает снимок и удаляет файл; None, если снимка нет или он не подходит"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Не удалось прочитать снимок состояния {path}: {e}")
+        return None
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    if not isinstance(state, dict) or state.get("version") != SNAPSHOT_VERSION:
+        print(f"⚠️ Снимок состояния {path} другой версии, пропускаю")
+        return None
+    age = time.time() - state.get("saved_at", 0)
+    if age > PENDING_MAX_AGE and state.get("pending"):
+        print(f"⚠️ Снимок сделан {age / 60:.0f} мин назад, отложенные переводы устарели")
+        state["pending"] = []
+    return state
+
+class ShutdownDrain:
+    """Отложенные задачи, которые при остановке выполняются сразу, а не по таймеру"""
+
+    def __init__(self):
+        self.stopping = asyncio.Event()
+        # Задача → данные, по которым ее можно повторить после перезапуска
+        self.pending: Dict[asyncio.Task, Any] = {}
+
+    def track(self, task: asyncio.Task, payload: Any):
+        self.pending[task] = payload
+        task.add_done_callback(lambda done: self.pending.pop(done, None))
+
+    async def debounce(self, delay: float):
+        """Пауза дебаунса; при остановке заканчивается сразу"""
+        if self.stopping.is_set():
+            return
+        try:
+            await asyncio.wait_for(self.stopping.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def drain(self, deadline: float) -> List[Any]:
+        """Дает задачам до deadline секунд; возвращает данные отмененных (не успевших) задач"""
+        self.stopping.set()
+        tasks = list(self.pending)
+        if not tasks:
+            return []
+        print(f"⏳ Дорабатываю {len(tasks)} отложенных переводов (не дольше {deadline:g} с)")
+        _, not_done = await asyncio.wait(tasks, timeout=deadline)
+        leftovers = [self.pending[task] for task in not_done if task in self.pending]
+        for task in not_done:
+            task.cancel()
+        if leftovers:
+            print(f"⏱ Не успели {len(leftovers)} переводов, они будут выполнены после перезапуска")
+        return leftovers
+
+Hook = Callable[[Application], Awaitable[None]]
+
+class SnapshotApplication(Application):
+    """Application с хуками: on_start — после запуска, on_stop — до остановки, пока можно отправлять"""
+
+    def __init__(self, on_start: Optional[Hook] = None, on_stop: Optional[Hook] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.on_start = on_start
+        self.on_stop = on_stop
+
+    async def start(self) -> None:
+        await super().start()
+        if self.on_start:
+            await self.on_start(self)
+
+    async def stop(self) -> None:
+        if self.on_stop and self.running:
+            await self.on_stop(self)
+        await super().stop()
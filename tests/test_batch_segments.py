@@ -0,0 +1,80 @@
+import asyncio
+
+import bot_google
+from translation_result import TranslationResult, TranslationStatus
+
+TEXTS = ["привет", "как дела\nу тебя", "пока"]
+
+def batch(text, status=TranslationStatus.OK):
+    return TranslationResult(text, status, "deepseek", attempts=1)
+
+def test_segments_split_back_by_number():
+    joined = bot_google.join_segments(TEXTS)
+    results = bot_google.split_segments(TEXTS, batch(joined.upper()))
+    assert [result.text for result in results] == ["ПРИВЕТ", "КАК ДЕЛА\nУ ТЕБЯ", "ПОКА"]
+
+def texts_of(results):
+    return [result and result.text for result in results]
+
+def test_moved_line_is_not_misattributed():
+    # Число строк то же, но вторая строка второго текста ушла в третий
+    assert texts_of(bot_google.split_segments(TEXTS, batch("[1] а\n[2] б\n[3] в\nг"))) == ["а", None, None]
+
+def test_reordered_or_missing_numbers_fail():
+    assert texts_of(bot_google.split_segments(TEXTS, batch("[1] а\n[3] б\nв\n[2] г"))) == [None, None, None]
+    assert texts_of(bot_google.split_segments(TEXTS, batch("[1] а\n[2] б\nв"))) == ["а", None, None]
+
+def test_shifted_numbers_fail():
+    # Перевод первого текста ушел до номеров, номера сдвинулись
+    assert texts_of(bot_google.split_segments(TEXTS, batch("а\n[1] б\nв\n[2] г"))) == [None, None, None]
+
+def test_truncated_translation_keeps_complete_segments():
+    joined = bot_google.join_segments(TEXTS)
+    results = bot_google.split_segments(TEXTS, batch(joined.upper(), TranslationStatus.PARTIAL))
+    assert texts_of(results) == ["ПРИВЕТ", "КАК ДЕЛА\nУ ТЕБЯ", None]
+
+class EchoTranslator:
+    """LLM-переводчик без translate_many: переводит заглавными буквами"""
+
+    def __init__(self):
+        self.requests = []
+
+    async def translate_ru_to_be(self, text, max_len=512):
+        self.requests.append(text)
+        return batch(text.upper())
+
+def test_llm_batches_stay_within_limit():
+    translator = EchoTranslator()
+    texts = [f"текст {i} " * 20 for i in range(6)]
+    results = asyncio.run(bot_google.translate_batch(translator, texts))
+    assert [result.text for result in results] == [text.strip().upper() for text in texts]
+    assert all(len(request) <= bot_google.LLM_BATCH_TEXT_LIMIT for request in translator.requests)
+
+class MergingTranslator(EchoTranslator):
+    """Пакетный переводчик, который в первом ответе сливает второй текст с третьим"""
+
+    async def translate_ru_to_be(self, text, max_len=512):
+        self.requests.append(text)
+        if len(self.requests) == 1:
+            return batch(text.upper().replace("\n[3] ", " "))
+        return batch(text.upper())
+
+def test_unsplit_texts_are_retried_in_one_request():
+    translator = MergingTranslator()
+    texts = ["привет", "как дела", "пока", "до завтра"]
+    results = asyncio.run(bot_google.translate_segments(translator.translate_ru_to_be, texts))
+    assert [result.text for result in results] == ["ПРИВЕТ", "КАК ДЕЛА", "ПОКА", "ДО ЗАВТРА"]
+    # Второй и третий слились, а у четвертого перед номером уже не третий
+    assert translator.requests[1] == bot_google.join_segments(["как дела", "пока", "до завтра"])
+    assert len(translator.requests) == 2
+
+def test_texts_failing_twice_become_errors():
+    class Garbling(EchoTranslator):
+        async def translate_ru_to_be(self, text, max_len=512):
+            self.requests.append(text)
+            return batch("перевод без номеров")
+
+    translator = Garbling()
+    results = asyncio.run(bot_google.translate_segments(translator.translate_ru_to_be, TEXTS))
+    assert [result.status for result in results] == [TranslationStatus.ERROR] * len(TEXTS)
+    assert len(translator.requests) == 2
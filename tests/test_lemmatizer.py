@@ -0,0 +1,55 @@
+import pytest
+
+from lemmatizer import MAX_LEMMA_CANDIDATES, lemma_candidates
+
+# Словоформа → начальная форма, которая должна быть первым вариантом
+FIRST_CANDIDATE = [
+    ("кота", "кот"),
+    ("стола", "стол"),
+    ("окна", "окно"),
+    ("стекла", "стекло"),
+    ("весны", "весна"),
+    ("домами", "дом"),
+    ("столами", "стол"),
+    ("столы", "стол"),
+    ("врачей", "врач"),
+    ("врачи", "врач"),
+    ("уроки", "урок"),
+    ("делаешь", "делать"),
+    ("думают", "думать"),
+    ("говорит", "говорить"),
+    ("сделала", "сделать"),
+    ("добрые", "добрый"),
+    ("красного", "красный"),
+    ("хорошие", "хороший"),
+    ("учится", "учиться"),
+]
+
+# Словоформа → начальная форма, которая должна попасть в пробуемые варианты
+ANY_CANDIDATE = [
+    ("утра", "утро"),
+    ("книгами", "книга"),
+    ("книги", "книга"),
+    ("руки", "рука"),
+    ("задачи", "задача"),
+]
+
+@pytest.mark.parametrize("word, lemma", FIRST_CANDIDATE)
+def test_most_likely_lemma_comes_first(word, lemma):
+    assert lemma_candidates(word)[0] == lemma
+
+@pytest.mark.parametrize("word, lemma", ANY_CANDIDATE)
+def test_lemma_is_among_tried_candidates(word, lemma):
+    assert lemma in lemma_candidates(word)
+
+@pytest.mark.parametrize("word", ["окна", "весны", "стекла"])
+def test_impossible_stems_are_rejected(word):
+    assert word[:-1] not in lemma_candidates(word)
+
+def test_candidates_are_limited():
+    for word, _ in FIRST_CANDIDATE + ANY_CANDIDATE:
+        assert len(lemma_candidates(word)) <= MAX_LEMMA_CANDIDATES
+
+def test_phrases_and_lemmas_are_not_lemmatized():
+    assert lemma_candidates("добрый день") == ()
+    assert "стол" not in lemma_candidates("стол")
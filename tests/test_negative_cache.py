@@ -0,0 +1,25 @@
+import time
+
+from negative_cache import NegativeCache
+
+def test_workers_merge_entries_on_save(tmp_path):
+    path = str(tmp_path / "missing.bin")
+    first, second = NegativeCache(path), NegativeCache(path)
+    first.add("альфа")
+    second.add("бета")
+    first.save()
+    second.save()
+    assert sorted(NegativeCache(path).expires) == ["альфа", "бета"]
+
+def test_clear_is_not_undone_by_other_workers(tmp_path):
+    path = str(tmp_path / "missing.bin")
+    worker = NegativeCache(path)
+    worker.add("альфа")
+    worker.save()
+    time.sleep(0.01)
+    NegativeCache(path).clear()
+    worker.add("бета")
+    worker.save()
+    cache = NegativeCache(path)
+    assert sorted(cache.expires) == ["бета"]
+    assert not cache.is_missing("альфа")
@@ -0,0 +1,65 @@
+import pytest
+
+import bot_skarnik
+from compact_dict import CompactDictionary, write_dictionary
+from fuzzy_index import build_fuzzy_index
+from translation_result import TranslationResult, TranslationStatus
+
+HEADWORDS = {
+    "кот": "кот",
+    "код": "код",
+    "кода": "кода",
+    "стол": "стол",
+    "стала": "стала",
+    "окно": "акно",
+}
+
+@pytest.fixture
+def fallback(tmp_path, monkeypatch):
+    """FallbackTranslator с большим словарем и индексом опечаток на диске"""
+    dict_path = str(tmp_path / "dict.bin")
+    fuzzy_path = str(tmp_path / "dict.fuzzy.bin")
+    write_dictionary(HEADWORDS, dict_path)
+    build_fuzzy_index(HEADWORDS, fuzzy_path)
+    monkeypatch.setattr(bot_skarnik, "open_fallback_dictionary", lambda: CompactDictionary(dict_path))
+    monkeypatch.setattr(bot_skarnik, "open_fuzzy_index", lambda: CompactDictionary(fuzzy_path))
+    return bot_skarnik.FallbackTranslator()
+
+@pytest.fixture
+def skarnik(monkeypatch):
+    """SkarnikTranslator без сети и кэшей: находит только слова из HEADWORDS"""
+    monkeypatch.setenv("SKARNIK_CACHE", "off")
+    monkeypatch.setenv("SKARNIK_MISSING_CACHE", "off")
+    translator = bot_skarnik.SkarnikTranslator()
+    translator.lookups = []
+
+    def lookup(text):
+        translator.lookups.append(text)
+        if text in HEADWORDS:
+            return TranslationResult(HEADWORDS[text], TranslationStatus.OK, "skarnik", attempts=1)
+        return TranslationResult(f"Пераклад не знойдзены для: {text}", TranslationStatus.NOT_FOUND,
+                                 "skarnik", attempts=1)
+
+    translator._lookup = lookup
+    return translator
+
+@pytest.mark.parametrize("word", ["кота", "стола", "окна"])
+def test_inflected_headwords_are_not_corrected(fallback, word):
+    assert fallback.correct_term(word) == word
+
+def test_typo_is_corrected(fallback):
+    assert fallback.correct_term("кдоа") == "кода"
+
+def test_lookup_tries_word_and_lemmas_before_correction(skarnik, fallback):
+    term, result = bot_skarnik.lookup_term(skarnik, fallback, "кота")
+    assert (term, result.text) == ("кота", "кот")
+    assert skarnik.lookups == ["кота", "кот"]
+
+def test_lookup_corrects_typo_after_miss(skarnik, fallback):
+    term, result = bot_skarnik.lookup_term(skarnik, fallback, "кдоа")
+    assert (term, result.text) == ("кода", "кода")
+    assert skarnik.lookups[0] == "кдоа"
+    assert result.attempts == len(skarnik.lookups)
+
+def test_fallback_translates_inflected_form_by_lemma(fallback):
+    assert fallback.translate_ru_to_be("кота").text == "кот"
@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+from webhook_server import WebhookServer
+
+async def post(reader, writer, body: bytes) -> bytes:
+    writer.write(b"POST /telegram HTTP/1.1\r\nHost: test\r\n"
+                 b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    while await reader.readline() not in (b"\r\n", b""):
+        pass
+    await reader.readexactly(len(status_line.split(b" ", 2)[2].strip()))
+    return status_line
+
+def serve(handler, scenario):
+    async def run():
+        server = WebhookServer(handler, "127.0.0.1", 0, "/telegram")
+        await server.start()
+        port = server.server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            return await scenario(server, reader, writer)
+        finally:
+            writer.close()
+            await server.stop()
+    return asyncio.run(run())
+
+def test_bad_json_and_unparsable_update_get_response():
+    async def handler(data):
+        raise KeyError("message")
+
+    async def scenario(server, reader, writer):
+        statuses = [await post(reader, writer, b"{not json"),
+                    await post(reader, writer, json.dumps({"update_id": 1}).encode())]
+        return statuses, server.stats["invalid"]
+
+    statuses, invalid = serve(handler, scenario)
+    assert [line.split()[1] for line in statuses] == [b"400", b"200"]
+    assert invalid == 2
+
+def test_negative_content_length_is_rejected():
+    async def handler(data):
+        return True
+
+    async def scenario(server, reader, writer):
+        writer.write(b"POST /telegram HTTP/1.1\r\nHost: test\r\nContent-Length: -5\r\n\r\n")
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), 1)
+        return response.split(b"\r\n", 1)[0], b"Connection: close" in response
+
+    assert serve(handler, scenario) == (b"HTTP/1.1 411 Length Required", True)
+
+def test_stop_closes_idle_keep_alive_connections():
+    async def handler(data):
+        return True
+
+    async def scenario(server, reader, writer):
+        assert (await post(reader, writer, json.dumps({"update_id": 1}).encode())).split()[1] == b"200"
+        await asyncio.wait_for(server.stop(), 1)
+        return await asyncio.wait_for(reader.read(), 1)
+
+    assert serve(handler, scenario) == b""
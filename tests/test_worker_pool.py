@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import threading
+import time
+
+import pytest
+
+import worker_pool
+from worker_pool import Supervisor
+
+class FakeCounter:
+    value = 0
+
+class FakeProcess:
+    exitcode = 1
+
+    def __init__(self, alive=True):
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+class FakeConnection:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def close(self):
+        pass
+
+class StalledConnection(FakeConnection):
+    """Воркер, который перестал читать канал: send висит, пока не отпустят"""
+    def __init__(self):
+        super().__init__()
+        self.released = threading.Event()
+
+    def send(self, data):
+        self.released.wait()
+        super().send(data)
+
+@pytest.fixture(autouse=True)
+def fast_checks(monkeypatch):
+    monkeypatch.setattr(worker_pool, "WORKER_CHECK_INTERVAL", 0.01)
+    monkeypatch.setattr(worker_pool, "WORKER_RESTART_DELAY", 0.01)
+
+def fake_supervisor(workers: int = 1) -> Supervisor:
+    """Supervisor с поддельными процессами; started — запущенные воркеры"""
+    supervisor = Supervisor(None, argparse.Namespace(workers=workers), asyncio.Event())
+    supervisor.started = []
+    supervisor.crash_on_start = False
+
+    def start_worker(slot):
+        supervisor.started.append((FakeProcess(not supervisor.crash_on_start), FakeConnection(), FakeCounter()))
+        supervisor.processes[slot], supervisor.connections[slot], supervisor.received[slot] = supervisor.started[-1]
+        supervisor.started_at[slot] = time.monotonic()
+        supervisor.sent[slot].clear()
+        supervisor.sent_count[slot] = 0
+
+    supervisor._start_worker = start_worker
+    return supervisor
+
+@pytest.fixture
+def supervisor():
+    return fake_supervisor()
+
+def stop(supervisor):
+    supervisor.stopping = True
+    for task in supervisor.tasks:
+        task.cancel()
+
+def test_unread_updates_are_resent_after_restart(supervisor):
+    async def run():
+        supervisor.start()
+        for update_id in range(1, 4):
+            await supervisor.route({"update_id": update_id})
+        await asyncio.sleep(0.05)
+        # Воркер прочитал одно обновление из трех и упал
+        process, _, received = supervisor.started[0]
+        received.value = 1
+        process.alive = False
+        await asyncio.sleep(0.1)
+        # Непрочитанные уходят новому процессу сразу, не дожидаясь новых обновлений
+        assert [data["update_id"] for data in supervisor.started[1][1].sent] == [2, 3]
+        await supervisor.route({"update_id": 4})
+        await asyncio.sleep(0.05)
+        stop(supervisor)
+
+    asyncio.run(run())
+    assert [data["update_id"] for data in supervisor.started[1][1].sent] == [2, 3, 4]
+
+def test_quick_crashes_back_off_and_stop_supervisor(supervisor, monkeypatch):
+    monkeypatch.setattr(worker_pool, "WORKER_MAX_QUICK_FAILURES", 3)
+    supervisor.crash_on_start = True
+
+    async def run():
+        supervisor.start()
+        await asyncio.wait_for(supervisor.stop_event.wait(), 2)
+        stop(supervisor)
+
+    asyncio.run(run())
+    assert supervisor.failed
+    # Первый запуск и три перезапуска с паузами 0.01, 0.02, 0.04 с
+    assert len(supervisor.started) == 4
+    assert supervisor.quick_failures[0] == 4
+
+def test_stalled_worker_does_not_block_polling(monkeypatch):
+    monkeypatch.setattr(worker_pool, "WORKER_QUEUE_SIZE", 2)
+    supervisor = fake_supervisor(workers=2)
+    stalled = StalledConnection()
+
+    async def run():
+        supervisor.start()
+        supervisor.connections[0] = stalled
+        chats = {slot: [chat for chat in range(1000) if supervisor.ring.get(chat) == slot][:1] for slot in (0, 1)}
+
+        def update(update_id, slot):
+            return {"update_id": update_id, "message": {"chat": {"id": chats[slot][0]}}}
+
+        try:
+            # Очередь застрявшего слота переполняется, но route не ждет
+            for update_id in range(1, 11):
+                await asyncio.wait_for(supervisor.route(update(update_id, 0)), 0.5)
+            await asyncio.wait_for(supervisor.route(update(11, 1)), 0.5)
+            await asyncio.sleep(0.05)
+            assert [data["update_id"] for data in supervisor.connections[1].sent] == [11]
+            assert supervisor.overflow[0]
+        finally:
+            stalled.released.set()
+        await asyncio.sleep(0.1)
+        stop(supervisor)
+
+    asyncio.run(run())
+    assert [data["update_id"] for data in stalled.sent] == list(range(1, 11))
@@ -0,0 +1,79 @@
+"""
+Результат перевода: текст и сведения о том, как он получен.
+
+Переводчики возвращают TranslationResult вместо строки, поэтому вызывающему
+коду не нужно распознавать ошибки по началу текста («Памылка...»,
+«Пераклад не знойдзены...»): успех проверяется по result.found, а в логи
+и статистику попадают бэкенд, состояние кэша, число попыток и время фаз:
+
+    queue     ожидание очереди или лимита запросов к сервису
+    network   запрос к сервису (все попытки)
+    parse     разбор ответа, поиск по словарю
+    cache     поиск в кэше переводов
+
+Для неудачных результатов text — сообщение для пользователя, а причина
+ошибки — в error.
+"""
+
+import time
+from contextlib import contextmanager
+from enum import Enum
+from typing import Dict, Iterator, Optional
+
+class TranslationStatus(Enum):
+    OK = "ok"
+    PARTIAL = "partial"          # Переведена только часть слов (словарь)
+    NOT_FOUND = "not_found"
+    ERROR = "error"
+
+class CacheStatus(Enum):
+    NONE = "none"                # Кэш не используется
+    MISS = "miss"
+    HIT = "hit"
+    REVALIDATED = "revalidated"  # Устаревшая копия подтверждена сервером (304)
+    STALE = "stale"              # Сервис недоступен, отдана устаревшая копия
+    NEGATIVE = "negative"        # Слово недавно не нашлось, сервис не спрашивали
+
+class TranslationResult:
+    __slots__ = ("text", "status", "backend", "cache", "attempts", "timings", "error")
+
+    def __init__(self, text: str, status: TranslationStatus, backend: str,
+                 cache: CacheStatus = CacheStatus.NONE, attempts: int = 0,
+                 timings: Optional[Dict[str, float]] = None, error: Optional[str] = None):
+        self.text = text
+        self.status = status
+        self.backend = backend
+        self.cache = cache
+        self.attempts = attempts
+        self.timings = timings if timings is not None else {}
+        self.error = error
+
+    @property
+    def found(self) -> bool:
+        """Есть перевод (полный или частичный), который можно показать"""
+        return self.status is TranslationStatus.OK or self.status is TranslationStatus.PARTIAL
+
+    @property
+    def total_time(self) -> float:
+        return sum(self.timings.values())
+
+    def describe(self) -> str:
+        """Короткая сводка для логов: бэкенд, статус, кэш, попытки и время фаз"""
+        phases = ", ".join(f"{phase} {seconds * 1000:.0f}" for phase, seconds in self.timings.items())
+        return (f"{self.backend} {self.status.value}, кэш {self.cache.value}, попыток {self.attempts}, "
+                f"{self.total_time * 1000:.0f} мс ({phases or '—'})")
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __repr__(self) -> str:
+        return f"TranslationResult({self.text[:40]!r}, {self.describe()})"
+
+@contextmanager
+def timed(timings: Dict[str, float], phase: str) -> Iterator[None]:
+    """Добавляет время выполнения блока к фазе phase (повторы суммируются)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - started
@@ -0,0 +1,336 @@
+"""
+Встроенный HTTP-сервер для приема обновлений Telegram через webhook.
+
+Используется обоими ботами (bot_google.py и bot_skarnik.py) вместо long polling.
+Сервер написан на asyncio без внешних зависимостей: принимает POST с JSON
+обновления, проверяет секретный токен из заголовка
+X-Telegram-Bot-Api-Secret-Token и передает обновление в очередь Application.
+Очередь ограничена: при переполнении сервер отвечает 503, и Telegram
+повторит доставку позже. Обновление, которое не удалось разобрать,
+отбрасывается с ответом 200: повторная доставка его не исправит.
+
+Локальная проверка без Telegram:
+    python bot_skarnik.py --webhook --webhook-port 8443 --webhook-secret test
+    curl -X POST http://127.0.0.1:8443/telegram \\
+         -H "X-Telegram-Bot-Api-Secret-Token: test" \\
+         -H "Content-Type: application/json" -d @update.json
+"""
+
+import os
+import json
+import hmac
+import signal
+import asyncio
+import secrets
+import argparse
+import contextlib
+from typing import Optional, Dict, List, Set, Callable, Awaitable
+
+from telegram import Update
+from telegram.ext import Application
+
+ENV_PATH = ".env"
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+MAX_BODY_SIZE = 1024 * 1024  # Обновления Telegram намного меньше мегабайта
+HEADER_TIMEOUT = 30  # Секунд на чтение заголовков, чтобы не держать зависшие соединения
+BODY_UNREAD_STATUSES = (411, 413)  # Тело не дочитано — соединение дальше не использовать
+
+DEFAULT_WEBHOOK_LISTEN = "0.0.0.0"
+DEFAULT_WEBHOOK_PORT = 8443
+DEFAULT_WEBHOOK_PATH = "/telegram"
+DEFAULT_WEBHOOK_QUEUE_SIZE = 1000
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+# Обработчик принятого обновления: получает JSON, возвращает False, если очередь полна;
+# исключение — обновление не удалось разобрать
+UpdateHandler = Callable[[dict], Awaitable[bool]]
+
+def read_env_setting(name: str) -> Optional[str]:
+    """Читает настройку из переменных окружения или из .env файла"""
+    value = os.environ.get(name)
+    if value:
+        return value.strip()
+
+    if os.path.exists(ENV_PATH):
+        with open(ENV_PATH, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(f"{name}="):
+                    value = line.split("=", 1)[1].strip()
+                    if value:
+                        return value
+    return None
+
+def add_webhook_arguments(parser: argparse.ArgumentParser):
+    """Добавляет параметры webhook-режима; значения по умолчанию берутся из WEBHOOK_* в окружении/.env"""
+    enabled = (read_env_setting("WEBHOOK_ENABLED") or "").lower() in ("1", "true", "yes")
+    group = parser.add_argument_group('webhook', 'Прием обновлений через встроенный HTTP-сервер вместо polling')
+    group.add_argument('--webhook', action='store_true', default=enabled,
+                       help='Включить webhook-режим (или WEBHOOK_ENABLED=1)')
+    group.add_argument('--webhook-url', default=read_env_setting("WEBHOOK_URL"),
+                       help='Публичный HTTPS URL; если указан, бот сам вызовет setWebhook (WEBHOOK_URL)')
+    group.add_argument('--webhook-listen', default=read_env_setting("WEBHOOK_LISTEN") or DEFAULT_WEBHOOK_LISTEN,
+                       help=f'Адрес для прослушивания (WEBHOOK_LISTEN, по умолчанию {DEFAULT_WEBHOOK_LISTEN})')
+    group.add_argument('--webhook-port', type=int,
+                       default=int(read_env_setting("WEBHOOK_PORT") or DEFAULT_WEBHOOK_PORT),
+                       help=f'Порт (WEBHOOK_PORT, по умолчанию {DEFAULT_WEBHOOK_PORT})')
+    group.add_argument('--webhook-path', default=read_env_setting("WEBHOOK_PATH") or DEFAULT_WEBHOOK_PATH,
+                       help=f'Путь, на который Telegram шлет обновления (WEBHOOK_PATH, по умолчанию {DEFAULT_WEBHOOK_PATH})')
+    group.add_argument('--webhook-secret', default=read_env_setting("WEBHOOK_SECRET"),
+                       help='Секретный токен для заголовка X-Telegram-Bot-Api-Secret-Token (WEBHOOK_SECRET)')
+    group.add_argument('--webhook-queue-size', type=int,
+                       default=int(read_env_setting("WEBHOOK_QUEUE_SIZE") or DEFAULT_WEBHOOK_QUEUE_SIZE),
+                       help=f'Максимум необработанных обновлений в очереди (WEBHOOK_QUEUE_SIZE, по умолчанию {DEFAULT_WEBHOOK_QUEUE_SIZE})')
+
+class WebhookServer:
+    """Минимальный HTTP/1.1 сервер на asyncio, принимающий только POST с обновлениями"""
+
+    def __init__(self, handler: UpdateHandler, listen: str, port: int, path: str,
+                 secret_token: Optional[str] = None):
+        self.handler = handler
+        self.listen = listen
+        self.port = port
+        self.path = "/" + path.lstrip("/")
+        self.secret_token = secret_token
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.idle_writers: Set[asyncio.StreamWriter] = set()  # Соединения в ожидании следующего запроса
+        self.closing = False
+        self.stats = {"accepted": 0, "rejected": 0, "queue_full": 0, "invalid": 0}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+        print(f"🌐 Webhook сервер слушает http://{self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self.server:
+            self.closing = True
+            self.server.close()
+            # Простаивающие keep-alive соединения закрываем сразу, иначе wait_closed()
+            # ждет их до HEADER_TIMEOUT; занятые закроются после ответа
+            for writer in list(self.idle_writers):
+                writer.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def _check_secret(self, headers: Dict[str, str]) -> bool:
+        if not self.secret_token:
+            return True
+        received = headers.get(SECRET_HEADER, "")
+        return hmac.compare_digest(received.encode(), self.secret_token.encode())
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Telegram держит соединение открытым, поэтому обрабатываем запросы в цикле
+        try:
+            while not self.closing:
+                self.idle_writers.add(writer)
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), HEADER_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                finally:
+                    self.idle_writers.discard(writer)
+                if not request_line:
+                    break
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    await self._respond(writer, 400, keep_alive=False)
+                    break
+                method, target, version = parts
+
+                headers = await self._read_headers(reader)
+                if headers is None:
+                    break
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                status = await self._handle_request(method, target, headers, reader)
+                keep_alive = keep_alive and not self.closing and status not in BODY_UNREAD_STATUSES
+                await self._respond(writer, status, keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_headers(self, reader: asyncio.StreamReader) -> Optional[Dict[str, str]]:
+        headers = {}
+        while True:
+            try:
+                line = await asyncio.wait_for(reader.readline(), HEADER_TIMEOUT)
+            except asyncio.TimeoutError:
+                return None
+            if not line:
+                return None
+            line = line.decode("latin-1").rstrip("\r\n")
+            if not line:
+                return headers
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    async def _handle_request(self, method: str, target: str, headers: Dict[str, str],
+                              reader: asyncio.StreamReader) -> int:
+        # Тело нужно дочитать в любом случае, иначе сломается следующий запрос в соединении
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            return 411
+        if length < 0:
+            return 411
+        if length > MAX_BODY_SIZE:
+            return 413
+        body = await reader.readexactly(length) if length else b""
+
+        if target.split("?", 1)[0] != self.path:
+            return 404
+        if method != "POST":
+            return 405
+        if not self._check_secret(headers):
+            self.stats["rejected"] += 1
+            print("🚫 Webhook: неверный секретный токен")
+            return 403
+
+        try:
+            data = json.loads(body)
+        except (ValueError, RecursionError):
+            self.stats["invalid"] += 1
+            print("⚠️ Webhook: тело запроса — не JSON")
+            return 400
+        if not isinstance(data, dict) or "update_id" not in data:
+            self.stats["invalid"] += 1
+            return 400
+
+        try:
+            accepted = await self.handler(data)
+        except Exception as e:
+            # Повторная доставка не поможет: отвечаем 200, чтобы Telegram не слал обновление снова
+            self.stats["invalid"] += 1
+            print(f"⚠️ Webhook: не удалось разобрать обновление {data.get('update_id')}, отброшено: {e}")
+            return 200
+        if not accepted:
+            self.stats["queue_full"] += 1
+            print(f"⚠️ Webhook: очередь заполнена, отклонено обновление {data.get('update_id')}")
+            return 503
+
+        self.stats["accepted"] += 1
+        return 200
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, keep_alive: bool):
+        body = HTTP_REASONS.get(status, "").encode()
+        head = (
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: text/plain; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode() + body)
+        await writer.drain()
+
+def application_update_handler(application: Application, queue_size: int) -> UpdateHandler:
+    """Передает обновления в очередь Application, не давая ей вырасти больше queue_size"""
+    async def handle(data: dict) -> bool:
+        if application.update_queue.qsize() >= queue_size:
+            return False
+        await application.update_queue.put(Update.de_json(data, application.bot))
+        return True
+    return handle
+
+def stop_event_on_signals() -> asyncio.Event:
+    """Возвращает событие, которое выставляется по SIGINT/SIGTERM"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: останавливаемся по KeyboardInterrupt
+    return stop_event
+
+@contextlib.asynccontextmanager
+async def running_application(application: Application):
+    """Повторяет жизненный цикл run_polling(): initialize/post_init/start ... stop/post_stop/shutdown"""
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    try:
+        await application.start()
+        yield application
+    finally:
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+def resolve_secret_token(args: argparse.Namespace) -> Optional[str]:
+    """Секрет из настроек; если webhook регистрируем мы сами, а секрета нет — генерируем его"""
+    secret_token = args.webhook_secret
+    if args.webhook_url and not secret_token:
+        secret_token = secrets.token_urlsafe(32)
+    if not secret_token:
+        print("⚠️ Webhook запущен без секретного токена — принимаются любые запросы")
+    return secret_token
+
+async def register_webhook(bot, args: argparse.Namespace, server: WebhookServer,
+                           allowed_updates: Optional[List[str]], drop_pending_updates: bool):
+    """Вызывает setWebhook, если задан публичный URL"""
+    if not args.webhook_url:
+        return
+    url = args.webhook_url.rstrip("/") + server.path
+    await bot.set_webhook(
+        url,
+        secret_token=server.secret_token,
+        allowed_updates=allowed_updates,
+        drop_pending_updates=drop_pending_updates,
+    )
+    print(f"✅ Webhook зарегистрирован: {url}")
+
+def print_webhook_stats(server: WebhookServer):
+    print(f"📊 Webhook: принято {server.stats['accepted']}, отклонено {server.stats['rejected']}, "
+          f"некорректных {server.stats['invalid']}, очередь переполнялась {server.stats['queue_full']} раз")
+
+async def serve_webhook(application: Application, args: argparse.Namespace,
+                        allowed_updates: Optional[List[str]] = None,
+                        drop_pending_updates: bool = False):
+    """Запускает приложение в webhook-режиме и работает до SIGINT/SIGTERM"""
+    server = WebhookServer(
+        application_update_handler(application, args.webhook_queue_size),
+        args.webhook_listen, args.webhook_port, args.webhook_path, resolve_secret_token(args),
+    )
+
+    stop_event = stop_event_on_signals()
+    async with running_application(application):
+        await server.start()
+        try:
+            await register_webhook(application.bot, args, server, allowed_updates, drop_pending_updates)
+            await stop_event.wait()
+        finally:
+            print("\n🛑 Остановка webhook сервера...")
+            await server.stop()
+            print_webhook_stats(server)
+
+def run_webhook(application: Application, args: argparse.Namespace,
+                allowed_updates: Optional[List[str]] = None,
+                drop_pending_updates: bool = False):
+    """Синхронная обертка для main(), аналог application.run_polling()"""
+    try:
+        asyncio.run(serve_webhook(application, args, allowed_updates, drop_pending_updates))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,374 @@
+"""
+Многопроцессный режим: супервизор и N воркеров.
+
+Супервизор сам не обрабатывает сообщения. Он получает обновления (через
+webhook или long polling) и отдает каждое в очередь одного из воркеров.
+Воркер выбирается консистентным хешированием по chat_id, а для инлайн-запросов
+по from_user.id. Поэтому все сообщения одного чата попадают в один процесс, и
+отложенный перевод (schedule_translation / schedule_inline_translation)
+работает так же, как в одном процессе.
+
+Очереди принадлежат супервизору и привязаны к номеру слота, а не к процессу.
+Упавший воркер перезапускается в том же слоте с новым каналом (Pipe) и
+получает накопившиеся обновления, поэтому маршрутизация не меняется.
+Воркер считает прочитанные из канала обновления (общий счетчик), а
+супервизор помнит отправленные: то, что осталось непрочитанным в канале
+упавшего процесса, отправляется новому первым. Обновления, которые воркер
+уже прочитал, повторно не отправляются — их обработка могла начаться.
+Воркер, который падает сразу после запуска (ошибка импорта, фабрики),
+перезапускается с растущей паузой; после WORKER_MAX_QUICK_FAILURES таких
+падений подряд супервизор останавливается с кодом 1.
+Общую multiprocessing.Queue не используем: процесс, убитый во время get(),
+оставляет ее блокировку захваченной, и новый воркер зависает.
+"""
+
+import os
+import time
+import bisect
+import signal
+import asyncio
+import hashlib
+import argparse
+import multiprocessing
+from collections import deque
+from typing import Optional, List, Deque, Callable
+
+from telegram import Bot, Update
+from telegram.error import TelegramError
+from telegram.ext import Application
+
+from webhook_server import (
+    WebhookServer, read_env_setting, stop_event_on_signals, running_application,
+    resolve_secret_token, register_webhook, print_webhook_stats,
+)
+
+HASH_RING_REPLICAS = 100  # Виртуальных узлов на воркер — для равномерного распределения
+WORKER_QUEUE_SIZE = 1000
+WORKER_OVERFLOW_SIZE = 10 * WORKER_QUEUE_SIZE  # Polling: сверх очереди слота копим в памяти, потом ждем
+WORKER_CHECK_INTERVAL = 1.0  # Как часто супервизор проверяет, живы ли воркеры
+WORKER_STOP_TIMEOUT = 10.0
+WORKER_RESTART_DELAY = 1.0       # Пауза перед перезапуском после первого быстрого падения
+WORKER_RESTART_MAX_DELAY = 60.0  # Пауза растет вдвое с каждым падением подряд, но не больше
+WORKER_STABLE_UPTIME = 60.0      # Проработавший дольше воркер падал не «сразу»: счетчик сбрасывается
+WORKER_MAX_QUICK_FAILURES = 5    # Столько быстрых падений подряд — останавливаем супервизор
+POLL_TIMEOUT = 30
+POLL_RETRY_DELAY = 5.0
+WAKE_FEEDER = {}  # Метка в очереди слота: будит _feed, чтобы он отправил pending
+
+# Фабрика приложения: вызывается в каждом воркере с аргументами командной строки
+ApplicationFactory = Callable[[argparse.Namespace], Application]
+
+def add_worker_arguments(parser: argparse.ArgumentParser):
+    """Добавляет параметр --workers (или BOT_WORKERS в окружении/.env)"""
+    parser.add_argument('--workers', type=int, default=int(read_env_setting("BOT_WORKERS") or 0),
+                        help='Запустить супервизор и N процессов-воркеров (BOT_WORKERS; 0 — один процесс)')
+
+class HashRing:
+    """Консистентное хеширование ключей на слоты воркеров"""
+
+    def __init__(self, slots: int, replicas: int = HASH_RING_REPLICAS):
+        self.ring = []
+        for slot in range(slots):
+            for replica in range(replicas):
+                self.ring.append((self._hash(f"{slot}:{replica}"), slot))
+        self.ring.sort()
+        self.keys = [h for h, _ in self.ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+    def get(self, key) -> int:
+        index = bisect.bisect(self.keys, self._hash(str(key))) % len(self.keys)
+        return self.ring[index][1]
+
+def routing_key(data: dict):
+    """Ключ маршрутизации: чат для сообщений, пользователь для инлайн-запросов"""
+    for field in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        if field in data:
+            return data[field]["chat"]["id"]
+    for field in ("inline_query", "chosen_inline_result", "callback_query"):
+        if field in data:
+            return data[field]["from"]["id"]
+    return data.get("update_id", 0)
+
+def _worker_main(slot: int, updates, received, factory: ApplicationFactory, args: argparse.Namespace):
+    """Точка входа процесса-воркера"""
+    # Ctrl+C получает вся группа процессов; останавливает воркеров супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Номер слота нужен приложению для своих файлов (например, снимка состояния)
+    args.worker_slot = slot
+    application = factory(args)
+    asyncio.run(_serve_worker(slot, application, updates, received))
+
+async def _serve_worker(slot: int, application: Application, updates, received):
+    loop = asyncio.get_running_loop()
+    async with running_application(application):
+        print(f"👷 Воркер {slot} запущен (pid {os.getpid()})")
+        while True:
+            try:
+                data = await loop.run_in_executor(None, updates.recv)
+            except EOFError:
+                break  # Супервизор завершился
+            if data is None:
+                break
+            received.value += 1
+            await application.update_queue.put(Update.de_json(data, application.bot))
+    print(f"👷 Воркер {slot} остановлен")
+
+class Supervisor:
+    """Запускает воркеров, раздает им обновления и перезапускает упавших"""
+
+    def __init__(self, factory: ApplicationFactory, args: argparse.Namespace,
+                 stop_event: Optional[asyncio.Event] = None):
+        self.factory = factory
+        self.args = args
+        self.workers = args.workers
+        self.context = multiprocessing.get_context("spawn")
+        self.ring = HashRing(self.workers)
+        self.queues = [asyncio.Queue(WORKER_QUEUE_SIZE) for _ in range(self.workers)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * self.workers
+        self.connections = [None] * self.workers
+        # Отправленные текущему процессу слота и счетчик прочитанных им обновлений
+        self.sent: List[Deque[Optional[dict]]] = [deque(maxlen=WORKER_QUEUE_SIZE) for _ in range(self.workers)]
+        self.sent_count = [0] * self.workers
+        self.received = [None] * self.workers
+        # Обновления, которые нужно отправить раньше очереди (после перезапуска воркера)
+        self.pending: List[Deque[Optional[dict]]] = [deque() for _ in range(self.workers)]
+        # Polling: обновления, не поместившиеся в очередь слота (остальные слоты при этом не ждут)
+        self.overflow: List[Deque[Optional[dict]]] = [deque() for _ in range(self.workers)]
+        self.restarts = [0] * self.workers
+        self.started_at = [0.0] * self.workers
+        self.quick_failures = [0] * self.workers
+        self.restart_at: List[Optional[float]] = [None] * self.workers  # Когда перезапустить упавший воркер
+        self.tasks: List[asyncio.Task] = []
+        self.stop_event = stop_event  # Выставляется, если воркер не удается запустить
+        self.failed = False
+        self.stopping = False
+
+    def _start_worker(self, slot: int):
+        if self.connections[slot] is not None:
+            self.connections[slot].close()
+        receiver, sender = self.context.Pipe(duplex=False)
+        received = self.context.RawValue("Q", 0)  # Без блокировки: процесс могут убить в любой момент
+        process = self.context.Process(
+            target=_worker_main,
+            args=(slot, receiver, received, self.factory, self.args),
+            name=f"bot-worker-{slot}",
+            daemon=True,
+        )
+        process.start()
+        receiver.close()
+        self.processes[slot] = process
+        self.started_at[slot] = time.monotonic()
+        self.connections[slot] = sender
+        self.received[slot] = received
+        self.sent[slot].clear()
+        self.sent_count[slot] = 0
+
+    def start(self):
+        for slot in range(self.workers):
+            self._start_worker(slot)
+            self.tasks.append(asyncio.create_task(self._feed(slot)))
+        self.tasks.append(asyncio.create_task(self._monitor()))
+        print(f"🧭 Супервизор запустил {self.workers} воркеров")
+
+    async def _feed(self, slot: int):
+        """Передает обновления слота текущему процессу-воркеру"""
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.pending[slot]:
+                data = self.pending[slot].popleft()
+            else:
+                data = await self.queues[slot].get()
+                self._refill(slot)
+                if self.pending[slot]:
+                    # Пока ждали очередь, воркер перезапустился: сначала непрочитанные им обновления
+                    if data is not WAKE_FEEDER:
+                        self.pending[slot].append(data)
+                    continue
+                if data is WAKE_FEEDER:
+                    continue
+            # Запоминаем до отправки: если воркер упадет во время send, _monitor вернет обновление в pending
+            connection = self.connections[slot]
+            self.sent[slot].append(data)
+            self.sent_count[slot] += 1
+            try:
+                await loop.run_in_executor(None, connection.send, data)
+            except (OSError, ValueError):
+                # Воркер упал — ждем перезапуска и отправляем то же обновление новому процессу
+                if self.stopping:
+                    return
+                if connection is self.connections[slot]:
+                    self.sent[slot].pop()
+                    self.sent_count[slot] -= 1
+                    self.pending[slot].appendleft(data)
+                await asyncio.sleep(WORKER_CHECK_INTERVAL)
+                continue
+            if data is None:
+                return
+
+    def _refill(self, slot: int):
+        """Переносит накопившиеся при polling обновления в освободившуюся очередь слота"""
+        overflow = self.overflow[slot]
+        while overflow and not self.queues[slot].full():
+            self.queues[slot].put_nowait(overflow.popleft())
+
+    def _take_unreceived(self, slot: int):
+        """Возвращает в pending обновления, которые упавший воркер не успел прочитать из канала"""
+        unreceived = self.sent_count[slot] - self.received[slot].value
+        if unreceived <= 0:
+            return
+        resend = list(self.sent[slot])[-unreceived:]
+        self.pending[slot].extendleft(reversed(resend))
+        if self.queues[slot].empty():
+            self.queues[slot].put_nowait(WAKE_FEEDER)
+        lost = unreceived - len(resend)
+        print(f"📨 Воркер {slot}: {len(resend)} непрочитанных обновлений отправим новому процессу"
+              + (f", {lost} потеряно" if lost else ""))
+
+    async def _monitor(self):
+        while not self.stopping:
+            await asyncio.sleep(WORKER_CHECK_INTERVAL)
+            for slot, process in enumerate(self.processes):
+                if process is None or process.is_alive() or self.stopping:
+                    continue
+                now = time.monotonic()
+                if self.restart_at[slot] is None:
+                    self._schedule_restart(slot, process.exitcode, now)
+                    if self.failed:
+                        return
+                if now >= self.restart_at[slot]:
+                    self.restart_at[slot] = None
+                    self._take_unreceived(slot)
+                    self._start_worker(slot)
+
+    def _schedule_restart(self, slot: int, exitcode, now: float):
+        """Назначает перезапуск упавшего воркера; при частых падениях подряд останавливает супервизор"""
+        if now - self.started_at[slot] >= WORKER_STABLE_UPTIME:
+            self.quick_failures[slot] = 0
+        self.quick_failures[slot] += 1
+        if self.quick_failures[slot] > WORKER_MAX_QUICK_FAILURES:
+            print(f"❌ Воркер {slot} падает сразу после запуска {WORKER_MAX_QUICK_FAILURES} раз подряд "
+                  f"(код {exitcode}), останавливаю супервизор")
+            self.failed = True
+            if self.stop_event is not None:
+                self.stop_event.set()
+            return
+        delay = min(WORKER_RESTART_DELAY * 2 ** (self.quick_failures[slot] - 1), WORKER_RESTART_MAX_DELAY)
+        self.restart_at[slot] = now + delay
+        self.restarts[slot] += 1
+        print(f"♻️ Воркер {slot} завершился (код {exitcode}), перезапуск №{self.restarts[slot]} через {delay:g} с")
+
+    def route_nowait(self, data: dict) -> bool:
+        """Для webhook: не ждет, при полной очереди возвращает False (ответ 503)"""
+        slot = self.ring.get(routing_key(data))
+        if self.overflow[slot]:
+            return False
+        try:
+            self.queues[slot].put_nowait(data)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def route(self, data: dict):
+        """Для polling: при полной очереди слота копит обновления в памяти, не задерживая другие слоты
+
+        Получение обновлений притормаживается, только когда переполнение слота
+        дорастет до WORKER_OVERFLOW_SIZE.
+        """
+        slot = self.ring.get(routing_key(data))
+        await self._enqueue(slot, data)
+
+    async def _enqueue(self, slot: int, data: Optional[dict]):
+        overflow = self.overflow[slot]
+        if not overflow:
+            try:
+                self.queues[slot].put_nowait(data)
+                return
+            except asyncio.QueueFull:
+                print(f"⚠️ Очередь воркера {slot} заполнена, обновления копятся в памяти")
+        while len(overflow) >= WORKER_OVERFLOW_SIZE:
+            await asyncio.sleep(WORKER_CHECK_INTERVAL)
+        overflow.append(data)
+
+    async def stop(self):
+        # Воркеры дорабатывают свои очереди и получают None как сигнал остановки
+        for slot in range(self.workers):
+            await self._enqueue(slot, None)
+        feeders = self.tasks[:self.workers]
+        await asyncio.wait(feeders, timeout=WORKER_STOP_TIMEOUT)
+        self.stopping = True
+        for task in self.tasks:
+            task.cancel()
+
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        print("🧭 Все воркеры остановлены")
+
+async def _poll_updates(bot: Bot, supervisor: Supervisor, allowed_updates: Optional[List[str]],
+                        drop_pending_updates: bool):
+    """Long polling в супервизоре: getUpdates и раздача воркерам"""
+    await bot.delete_webhook(drop_pending_updates=drop_pending_updates)
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=POLL_TIMEOUT,
+                                            allowed_updates=allowed_updates)
+        except TelegramError as e:
+            print(f"Ошибка получения обновлений: {e}")
+            await asyncio.sleep(POLL_RETRY_DELAY)
+            continue
+        for update in updates:
+            offset = update.update_id + 1
+            await supervisor.route(update.to_dict())
+
+async def _serve_supervisor(factory: ApplicationFactory, args: argparse.Namespace, token: str,
+                            allowed_updates: Optional[List[str]], drop_pending_updates: bool):
+    stop_event = stop_event_on_signals()
+    supervisor = Supervisor(factory, args, stop_event)
+    supervisor.start()
+
+    async def route_handler(data: dict) -> bool:
+        return supervisor.route_nowait(data)
+
+    bot = Bot(token)
+    server = None
+    intake_task = None
+    try:
+        async with bot:
+            if args.webhook:
+                server = WebhookServer(route_handler, args.webhook_listen, args.webhook_port,
+                                       args.webhook_path, resolve_secret_token(args))
+                await server.start()
+                await register_webhook(bot, args, server, allowed_updates, drop_pending_updates)
+            else:
+                intake_task = asyncio.create_task(
+                    _poll_updates(bot, supervisor, allowed_updates, drop_pending_updates)
+                )
+            await stop_event.wait()
+    finally:
+        print("\n🛑 Остановка супервизора...")
+        if server:
+            await server.stop()
+            print_webhook_stats(server)
+        if intake_task:
+            intake_task.cancel()
+        await supervisor.stop()
+    return not supervisor.failed
+
+def run_supervisor(factory: ApplicationFactory, args: argparse.Namespace, token: str,
+                   allowed_updates: Optional[List[str]] = None,
+                   drop_pending_updates: bool = False):
+    """Синхронная обертка для main(): супервизор работает до SIGINT/SIGTERM или отказа воркеров"""
+    try:
+        ok = asyncio.run(_serve_supervisor(factory, args, token, allowed_updates, drop_pending_updates))
+    except KeyboardInterrupt:
+        return
+    if not ok:
+        raise SystemExit(1)